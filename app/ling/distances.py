@@ -0,0 +1,146 @@
+from django.conf import settings
+
+from app.ling.map import get_map_version
+from app.ling.word_matrix import PRECISION, WordMatrix
+from app.models import Language
+
+import numpy as np
+
+import os.path
+import threading
+
+
+BERG_PATH = os.path.join(settings.BASE_DIR, 'app/fixtures/berg.tsv')
+
+
+
+class DistancesIndex:
+	"""
+	In-memory index of a .tsv file, meant for serving the built-in berg.tsv.
+	Keeps both the parsed word matrix and the adjacency dict of the real
+	distances: {language: {other language: distance}}, with the languages as
+	ISO codes the way these are written in the file.
+	"""
+	
+	def __init__(self, file_path):
+		"""
+		Constructor. Parses the file; raises ValueError if it does not conform
+		to the expected format.
+		"""
+		self.file_path = file_path
+		self.mtime = os.path.getmtime(file_path)
+		
+		self.matrix = WordMatrix()
+		with open(file_path, 'r') as f:
+			self.matrix.load_raw(f)
+		
+		self.adjacency = {}
+		for (code_one, code_two), (global_d, real_d) in self.matrix.d.items():
+			self.adjacency.setdefault(code_one, {})[code_two] = real_d
+			self.adjacency.setdefault(code_two, {})[code_one] = real_d
+	
+	
+	def is_fresh(self):
+		"""
+		Tells whether the file has not been modified since it was parsed.
+		"""
+		try:
+			return os.path.getmtime(self.file_path) == self.mtime
+		except OSError:
+			return False
+	
+	
+	def get_distances(self, code):
+		"""
+		Returns {other language: real distance} for the language given.
+		"""
+		return self.adjacency.get(code, {})
+	
+	
+	def get_submatrix(self, codes):
+		"""
+		Returns the condensed matrix of the real distances between the
+		languages given: the float64 numpy array of the distances of the pairs
+		(codes[i], codes[j]) with i < j, in row-major order (as scipy's pdist
+		does it). Missing pairs are NaN. Raises KeyError if a language is not
+		in the index.
+		"""
+		ids = np.array([self.matrix.ids[code] for code in codes], dtype=np.intp)
+		
+		rows, cols = np.triu_indices(len(ids), 1)
+		real_d = self.matrix.real_d[ids[rows], ids[cols]]
+		
+		return np.round(real_d.astype(np.float64), PRECISION)
+
+
+
+class LanguageCodes:
+	"""
+	The ISO codes of all the languages in the database, loaded in one query.
+	* iso_639_1: {ISO 639-3 code: ISO 639-1 code or None};
+	* iso_639_3: {ISO code as found in .tsv files: ISO 639-3 code}.
+	"""
+	
+	def __init__(self):
+		"""
+		Constructor.
+		"""
+		self.iso_639_1 = {}
+		self.iso_639_3 = {}
+		
+		for iso_639_3, iso_639_1 in Language.objects.values_list('iso_639_3', 'iso_639_1'):
+			self.iso_639_1[iso_639_3] = iso_639_1
+			self.iso_639_3[iso_639_3] = iso_639_3
+			if iso_639_1:
+				self.iso_639_3[iso_639_1] = iso_639_3
+	
+	
+	def get_tsv_codes(self, iso_639_3):
+		"""
+		Returns the codes which can stand for the language in a .tsv file.
+		"""
+		codes = [iso_639_3]
+		
+		if self.iso_639_1.get(iso_639_3):
+			codes.append(self.iso_639_1[iso_639_3])
+		
+		return codes
+
+
+
+"""
+The process-wide index and codes. The index is reparsed when the file's mtime
+changes, the codes are reloaded when the languages change (see app.ling.map).
+"""
+_shared = {'index': None, 'codes': None, 'version': None}
+_shared_lock = threading.Lock()
+
+
+def get_index(file_path=BERG_PATH):
+	"""
+	Returns the shared DistancesIndex of berg.tsv.
+	"""
+	with _shared_lock:
+		index = _shared['index']
+		
+		if index is None or index.file_path != file_path or not index.is_fresh():
+			index = _shared['index'] = DistancesIndex(file_path)
+		
+		return index
+
+
+def get_codes():
+	"""
+	Returns the shared LanguageCodes instance.
+	"""
+	version = get_map_version()
+	
+	with _shared_lock:
+		if _shared['codes'] is None or version is None or _shared['version'] != version:
+			_shared['codes'] = LanguageCodes()
+			_shared['version'] = version
+		
+		return _shared['codes']
+
+
+
@@ -0,0 +1,170 @@
+from math import atan, degrees, exp, isfinite, log, pi, radians, sin, tan
+
+
+
+def wrap(longitude):
+	"""
+	Returns the longitude given wrapped into [-180, 180).
+	"""
+	return (longitude + 180) % 360 - 180
+
+
+
+class HexGrid:
+	"""
+	The honeycomb grid the way the frontend lays it out over the map's
+	viewport, in Web Mercator pixels (256 × 2^zoom per world width, as
+	Leaflet has it). With the flat orientation the hexagons form rows which
+	are h = sin(60°)·side apart, the cells in a row are 3·side apart, and the
+	odd rows are shifted by 1.5·side to the left; the pointy orientation is
+	the same with the axes swapped. The spec:
+	* north, west: the coords of the viewport's top left corner;
+	* zoom: the map's zoom level;
+	* width, height: the viewport's size in pixels;
+	* side: the hexagon side in pixels;
+	* orientation: flat or pointy.
+	"""
+	
+	ORIENTATIONS = ('flat', 'pointy')
+	
+	def __init__(self, spec):
+		"""
+		Constructor. Raises ValueError if the spec is invalid.
+		"""
+		try:
+			assert type(spec) is dict
+			assert set(spec.keys()) == set([
+				'north', 'west', 'zoom', 'width', 'height', 'side', 'orientation'
+			])
+		except AssertionError:
+			raise ValueError('Invalid grid.')
+		
+		try:
+			self.north = float(spec['north'])
+			self.west = float(spec['west'])
+			self.zoom = float(spec['zoom'])
+			self.width = float(spec['width'])
+			self.height = float(spec['height'])
+			self.side = float(spec['side'])
+			assert -90 <= self.north <= 90
+			assert isfinite(self.west)
+			assert 0 <= self.zoom <= 30
+			assert 0 < self.width <= 100000
+			assert 0 < self.height <= 100000
+			assert self.side >= 1
+		except (AssertionError, TypeError, ValueError):
+			raise ValueError('Invalid grid.')
+		
+		try:
+			assert spec['orientation'] in HexGrid.ORIENTATIONS
+		except AssertionError:
+			raise ValueError('Invalid grid orientation.')
+		
+		self.orientation = spec['orientation']
+		self.scale = 256 * 2 ** self.zoom
+		
+		"""
+		Leaflet does not clamp the viewport's corner: when the map is dragged
+		past the poles, the corner is beyond ±85.05°, which is still a point of
+		the (unclamped) projection; and after panning around the globe, the
+		longitude is beyond ±180°, which is wrapped.
+		"""
+		self.north = min(max(self.north, -90 + 1e-9), 90 - 1e-9)
+		self.west = wrap(self.west)
+		
+		self.origin = self.project(self.north, self.west)
+	
+	
+	def project(self, latitude, longitude):
+		"""
+		Returns the (x, y) world pixel of the coords given, as Leaflet's
+		spherical Mercator does it, though without clamping the latitude.
+		"""
+		return (
+			self.scale * (0.5 + longitude / 360),
+			self.scale * (0.5 - log(tan(pi / 4 + radians(latitude) / 2)) / (2 * pi))
+		)
+	
+	
+	def unproject(self, x, y):
+		"""
+		Returns the (latitude, longitude) of the world pixel given.
+		"""
+		return (
+			degrees(2 * atan(exp(pi * (1 - 2 * y / self.scale))) - pi / 2),
+			(x / self.scale - 0.5) * 360
+		)
+	
+	
+	def get_lines(self):
+		"""
+		Returns (positions, offsets) of the grid's lines (rows if flat, columns
+		if pointy): the positions of the lines across and the offsets of the
+		cells along an even and along an odd line. The arithmetic is the
+		frontend's, so that the cells are the very same.
+		"""
+		a = self.side
+		h = sin(pi / 3) * a
+		
+		if self.orientation == 'flat':
+			along, across = self.width, self.height
+		else:
+			along, across = self.height, self.width
+		
+		offsets = []
+		for start in (0, -3/2*a):
+			line = []
+			x = start
+			while True:
+				line.append(x)
+				x += 3*a
+				if x > along + 3*a:
+					break
+			offsets.append(line)
+		
+		positions = []
+		line = 0
+		while True:
+			y = line*h
+			positions.append(y)
+			line += 1
+			if y > across:
+				break
+		
+		return positions, offsets
+	
+	
+	def count_cells(self):
+		"""
+		Returns the number of cells in the grid.
+		"""
+		positions, offsets = self.get_lines()
+		
+		return sum([len(offsets[key % 2]) for key in range(len(positions))])
+	
+	
+	def get_cells(self):
+		"""
+		Returns the list of the cells' [latitude, longitude] in the frontend's
+		order: line by line, along each line. The longitudes are wrapped into
+		[-180, 180).
+		"""
+		positions, offsets = self.get_lines()
+		origin_x, origin_y = self.origin
+		
+		cells = []
+		
+		for key, position in enumerate(positions):
+			for offset in offsets[key % 2]:
+				if self.orientation == 'flat':
+					x, y = offset, position
+				else:
+					x, y = position, offset
+				
+				latitude, longitude = self.unproject(origin_x + x, origin_y + y)
+				cells.append([latitude, wrap(longitude)])
+		
+		return cells
+
+
+
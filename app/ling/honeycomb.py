@@ -1,5 +1,170 @@
-from app.ling.map import Map, MapError
-from app.ling.math import get_correlation
+from django.conf import settings
+
+from app.ling.map import Map, MapError, get_map, get_map_version
+from app.ling.math import SlidingCorrelation, get_correlations
+from app.ling.word_matrix import PRECISION
+
+from utils.lru import LruCache
+
+import numpy as np
+
+from math import pi
+import multiprocessing
+import sys
+import threading
+
+
+
+def get_on_circles(planet, word_matrix, cells, radius):
+	"""
+	Returns the list of the swadeshness values of the cells given, calculated
+	using the circles method. Cells with less than 6 relevant languages have
+	swadeshness of 0.
+	"""
+	temperatures = []
+	
+	"""
+	The languages of all the cells are looked up in one go: neighbouring
+	cells share their candidates.
+	"""
+	circles = planet.get_in_radius_cached([cell[:2] for cell in cells], radius)
+	
+	"""
+	Adjacent cells' circles overlap for the most part, so the pairs of the
+	previous cell are kept and only these of the languages which have entered
+	or left the circle are added or removed; if most of the languages have
+	changed, the pairs are gathered anew.
+	"""
+	correlation = SlidingCorrelation(PRECISION)
+	current = set()
+	
+	for languages in circles:
+		ids = set(word_matrix.get_ids(languages).tolist())
+		
+		entered, left = ids - current, current - ids
+		
+		if len(entered) + len(left) < len(ids):
+			if left:
+				correlation.remove(*word_matrix.gather_between(
+					sorted(left), sorted(current - left)
+				)[2:])
+				correlation.remove(*word_matrix.gather(np.array(sorted(left), dtype=np.intp))[2:])
+			
+			if entered:
+				correlation.add(*word_matrix.gather_between(
+					sorted(entered), sorted(ids - entered)
+				)[2:])
+				correlation.add(*word_matrix.gather(np.array(sorted(entered), dtype=np.intp))[2:])
+		
+		elif entered or left:
+			correlation.reset()
+			correlation.add(*word_matrix.gather(np.array(sorted(ids), dtype=np.intp))[2:])
+		
+		current = ids
+		
+		if len(languages) < 6:
+			temperatures.append(0)
+			continue
+		
+		temperatures.append(correlation.get_correlation())
+	
+	return temperatures
+
+
+def get_on_neighbourhoods(planet, word_matrix, cells, k):
+	"""
+	Returns the list of the swadeshness values of the cells given, calculated
+	using the neighbourhood method. Cells with less than 6 relevant languages
+	have swadeshness of 0.
+	"""
+	groups_global, groups_local = [], []
+	
+	for cell in cells:
+		global_d, local_d = [], []
+		groups_global.append(global_d)
+		groups_local.append(local_d)
+		
+		try:
+			languages = planet.get_nearest_cached(cell[0], cell[1], k+1)
+		except MapError:
+			continue
+		
+		if len(languages) < 6:
+			continue
+		
+		origin = languages[0]
+		languages = languages[1:]
+		
+		for language in languages:
+			distance_pair = word_matrix.get_distances(origin, language)
+			if distance_pair is not None:
+				global_d.append(distance_pair[0])
+				local_d.append(distance_pair[1])
+	
+	"""
+	Cells left with empty populations get 0.
+	"""
+	return get_correlations(groups_global, groups_local)
+
+
+METHODS = {
+	'circle': get_on_circles,
+	'neighbourhood': get_on_neighbourhoods,
+}
+
+
+"""
+The approximate size in bytes of a cached cell's key and of its entry in the
+cache, see get_cell_size().
+"""
+CELL_OVERHEAD = 300
+
+
+def get_cell_size(temperature):
+	"""
+	Returns the approximate size in bytes of a cached cell. The matrix id and
+	the map version in the key are shared by all the cells, so only the rest
+	of the key, the temperature, and the overhead are counted.
+	"""
+	return sys.getsizeof(temperature) + CELL_OVERHEAD
+
+
+"""
+The cells computed for previous requests, so that panning and zooming back
+and forth do not recompute them. The keys are (matrix id, map version,
+method, parameter, quantised latitude, quantised longitude) tuples and the
+sizes are in bytes.
+"""
+cell_cache = LruCache(settings.HONEYCOMB_CACHE_BYTES, get_size=get_cell_size)
+
+
+"""
+What the pool workers need to know. It is only ever set in the workers, by
+_init_worker(); the parent process passes it as the pool's initargs, which
+the forked workers inherit (copy-on-write) instead of having them pickled.
+"""
+_task = {}
+
+
+def _init_worker(method, planet, word_matrix, parameter):
+	"""
+	Pool worker's initialiser.
+	"""
+	_task.update({
+		'method': method,
+		'planet': planet,
+		'word_matrix': word_matrix,
+		'parameter': parameter
+	})
+
+
+def _calculate_chunk(cells):
+	"""
+	Pool worker's entry point.
+	"""
+	return METHODS[_task['method']](
+		_task['planet'], _task['word_matrix'], cells, _task['parameter']
+	)
 
 
 
@@ -7,6 +172,15 @@ class Honeycomb:
 	"""
 	Calculates the swadeshness of each honeycomb cell.
 	Unlike class Point, Honeycomb should not raise errors.
+	The cells are calculated along a space-filling curve, whatever their
+	order, and the results are returned in the order given.
+	If the HONEYCOMB_WORKERS setting is greater than 1, the cells are split
+	into chunks of (at most) HONEYCOMB_CHUNK_SIZE cells which are calculated by
+	a pool of that many forked processes. Forking is only safe from the main
+	thread (another thread could be holding a lock the child would inherit),
+	so the cells are calculated serially elsewhere, e.g. in the jobs' threads.
+	If the word matrix has a storage id, the results are also cached, with the
+	cells' coords rounded to HONEYCOMB_CACHE_PRECISION decimal places.
 	"""
 	
 	def __init__(self, cells):
@@ -21,33 +195,10 @@ class Honeycomb:
 		Calculates the swadeshness of each cell using the circles method.
 		Cells with less than 6 relevant languages have swadeshness of 0.
 		"""
-		planet = Map()
+		temperatures = self.calculate('circle', word_matrix, radius)
 		
-		for cell in self.cells:
-			try:
-				languages = planet.get_in_radius(cell[0], cell[1], radius)
-			except MapError:
-				cell.append(0)
-				continue
-			
-			if len(languages) < 6:
-				cell.append(0)
-				continue
-			
-			global_d, local_d = [], []
-			
-			for lang_a in languages:
-				for lang_b in languages:
-					if lang_a >= lang_b:
-						continue
-					
-					if (lang_a, lang_b) not in word_matrix.d:
-						continue
-					
-					global_d.append(word_matrix.d[(lang_a, lang_b)][0])
-					local_d.append(word_matrix.d[(lang_a, lang_b)][1])
-			
-			cell.append(get_correlation(global_d, local_d))
+		for cell, temperature in zip(self.cells, temperatures):
+			cell.append(temperature)
 		
 		return self.cells
 	
@@ -57,32 +208,214 @@ class Honeycomb:
 		Calculates the swadeshness of each cell using the neighbourhood method.
 		Cells with less than 6 relevant languages have swadeshness of 0.
 		"""
-		planet = Map()
+		temperatures = self.calculate('neighbourhood', word_matrix, k)
+		
+		for cell, temperature in zip(self.cells, temperatures):
+			cell.append(temperature)
+		
+		return self.cells
+	
+	
+	def iter_on_circles(self, word_matrix, radius):
+		"""
+		Generator version of calculate_on_circles().
+		"""
+		return self.iter_calculate('circle', word_matrix, radius)
+	
+	
+	def iter_on_neighbourhoods(self, word_matrix, k):
+		"""
+		Generator version of calculate_on_neighbourhoods().
+		"""
+		return self.iter_calculate('neighbourhood', word_matrix, k)
+	
+	
+	def iter_calculate(self, method, word_matrix, parameter):
+		"""
+		Calculates the cells in batches of (at most) HONEYCOMB_STREAM_BATCH_SIZE
+		cells, from the centre of the cells' bounding box outward, yielding each
+		batch's cells (with their swadeshness appended) once it is done.
+		"""
+		batch_size = settings.HONEYCOMB_STREAM_BATCH_SIZE
+		order = self.get_order()
 		
-		for cell in self.cells:
-			try:
-				languages = planet.get_nearest(cell[0], cell[1], k+1)
-			except MapError:
-				cell.append(0)
-				continue
+		for i in range(0, len(order), batch_size):
+			cells = [self.cells[key] for key in order[i:i+batch_size]]
 			
-			if len(languages) < 6:
-				cell.append(0)
-				continue
+			temperatures = self.calculate(method, word_matrix, parameter, cells)
 			
-			origin = languages[0]
-			languages = languages[1:]
+			for cell, temperature in zip(cells, temperatures):
+				cell.append(temperature)
 			
-			global_d, local_d = [], []
-			for language in languages:
-				distance_pair = word_matrix.get_distances(origin, language)
-				if distance_pair is not None:
-					global_d.append(distance_pair[0])
-					local_d.append(distance_pair[1])
+			yield cells
+	
+	
+	def get_order(self):
+		"""
+		Returns the list of the cells' indices sorted by the cells' distance
+		from the centre of their bounding box, which may cross the antimeridian.
+		"""
+		try:
+			coords = np.radians(np.array([cell[:2] for cell in self.cells], dtype=np.float64))
+			assert coords.shape == (len(self.cells), 2)
+		except (AssertionError, TypeError, ValueError):
+			return list(range(len(self.cells)))
+		
+		"""
+		The bounding box's longitudes are these around the largest gap between
+		the cells' longitudes, which may be the one across the antimeridian or
+		not: a grid on both sides of the latter is centred on it.
+		"""
+		longitudes = np.sort(coords[:, 1])
+		gaps = np.diff(np.append(longitudes, longitudes[:1] + 2 * pi))
+		gap = int(np.argmax(gaps))
+		
+		centre = np.array([
+			(coords[:, 0].min() + coords[:, 0].max()) / 2,
+			longitudes[(gap + 1) % len(longitudes)] + (2 * pi - gaps[gap]) / 2
+		])
+		
+		distances = Map.haversine(
+			centre[0], centre[1], np.cos(centre[0]),
+			coords[:, 0], coords[:, 1], np.cos(coords[:, 0])
+		)
+		
+		return np.argsort(distances, kind='mergesort').tolist()
+	
+	
+	def calculate(self, method, word_matrix, parameter, cells=None):
+		"""
+		Returns the list of the swadeshness values of the cells given (all the
+		cells by default), in their order.
+		The method is one of the keys of METHODS.
+		Only the cells which are not in the results cache are calculated.
+		"""
+		if cells is None:
+			cells = self.cells
+		
+		if word_matrix.storage_id is None:
+			return self.calculate_cells(cells, method, word_matrix, parameter)
+		
+		group = (word_matrix.storage_id, get_map_version(), method, parameter)
+		precision = settings.HONEYCOMB_CACHE_PRECISION
+		
+		keys = [
+			group + (round(cell[0], precision), round(cell[1], precision))
+			for cell in cells
+		]
+		
+		temperatures = [cell_cache.get(key) for key in keys]
+		missing = [i for i, temperature in enumerate(temperatures) if temperature is None]
+		
+		if missing:
+			calculated = self.calculate_cells(
+				[cells[i] for i in missing], method, word_matrix, parameter
+			)
 			
-			cell.append(get_correlation(global_d, local_d))
+			for i, temperature in zip(missing, calculated):
+				temperatures[i] = temperature
+				cell_cache.set(keys[i], temperature)
 		
-		return self.cells
+		return temperatures
+	
+	
+	@staticmethod
+	def get_curve_order(cells, bits=16):
+		"""
+		Returns the list of the cells' indices sorted along the Hilbert curve
+		of order bits over the (longitude, latitude) plane, so that the cells
+		which are next to each other in the list are next to each other on the
+		map as well. Falls back to the order given if the coords are not such.
+		"""
+		try:
+			coords = np.array([cell[:2] for cell in cells], dtype=np.float64)
+			assert coords.shape == (len(cells), 2)
+		except (AssertionError, TypeError, ValueError):
+			return list(range(len(cells)))
+		
+		n = 1 << bits
+		coords = np.nan_to_num(coords)
+		
+		y = np.clip((coords[:, 0] + 90) / 180 * n, 0, n - 1).astype(np.int64)
+		x = np.clip((coords[:, 1] + 180) / 360 * n, 0, n - 1).astype(np.int64)
+		
+		"""
+		The classic xy2d: for each bit from the top, the quadrant's position
+		along the curve, then the quadrant is rotated into the canonical one.
+		"""
+		d = np.zeros(len(cells), dtype=np.int64)
+		s = n >> 1
+		
+		while s > 0:
+			rx = (x & s) > 0
+			ry = (y & s) > 0
+			d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+			
+			flip = rx & ~ry
+			x = np.where(flip, n - 1 - x, x)
+			y = np.where(flip, n - 1 - y, y)
+			x, y = np.where(ry, x, y), np.where(ry, y, x)
+			
+			s >>= 1
+		
+		return np.argsort(d, kind='mergesort').tolist()
+	
+	
+	def calculate_cells(self, cells, method, word_matrix, parameter):
+		"""
+		Returns the list of the swadeshness values of the cells given, in their
+		order. The cells are calculated in the order of get_curve_order(), so
+		that consecutive cells share most of their languages (and the chunks
+		of the process pool are compact patches of the map).
+		"""
+		order = Honeycomb.get_curve_order(cells)
+		
+		calculated = self.calculate_chunks(
+			[cells[key] for key in order], method, word_matrix, parameter
+		)
+		
+		temperatures = [0] * len(cells)
+		for key, temperature in zip(order, calculated):
+			temperatures[key] = temperature
+		
+		return temperatures
+	
+	
+	def calculate_chunks(self, cells, method, word_matrix, parameter):
+		"""
+		Returns the list of the swadeshness values of the cells given, in their
+		order, using the process pool if so configured.
+		"""
+		planet = get_map()
+		
+		workers = settings.HONEYCOMB_WORKERS
+		chunk_size = settings.HONEYCOMB_CHUNK_SIZE
+		
+		if workers <= 1 or len(cells) <= 1:
+			return METHODS[method](planet, word_matrix, cells, parameter)
+		
+		if threading.current_thread() is not threading.main_thread():
+			return METHODS[method](planet, word_matrix, cells, parameter)
+		
+		chunk_size = max(1, min(chunk_size, -(-len(cells) // workers)))
+		chunks = [
+			cells[i:i+chunk_size]
+			for i in range(0, len(cells), chunk_size)
+		]
+		
+		try:
+			context = multiprocessing.get_context('fork')
+		except ValueError:  # no fork on this platform
+			return METHODS[method](planet, word_matrix, cells, parameter)
+		
+		with context.Pool(
+			min(workers, len(chunks)),
+			initializer = _init_worker,
+			initargs = (method, planet, word_matrix, parameter)
+		) as pool:
+			results = pool.map(_calculate_chunk, chunks)
+		
+		return [temperature for result in results for temperature in result]
 
 
 
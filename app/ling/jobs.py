@@ -0,0 +1,183 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from app.ling.honeycomb import Honeycomb
+from app.ling.map import get_map
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import uuid
+
+
+PREFIX = 'honeycomb_job_'
+
+logger = logging.getLogger('kalakukko.error')
+
+
+"""
+The local pool of threads in which the jobs run; there is no broker, so a job
+is run by the process which has accepted it. The pool is created on demand.
+"""
+_executor = {'pool': None}
+
+
+
+class HoneycombJob:
+	"""
+	Calculates a honeycomb in the background, in batches of (at most)
+	HONEYCOMB_JOB_BATCH_SIZE cells, checking between the batches whether it has
+	been cancelled. The job's state lives in the Django cache:
+	* PREFIX + id: {status, total, done, batch_size}, where the status is one
+	  of running, done, cancelled, and failed;
+	* PREFIX + id + '_' + n: the cells of the n-th finished batch, as
+	  [latitude, longitude, temperature], in the order given;
+	* PREFIX + id + '_cancel': set when the job is cancelled.
+	Thus each update stores one batch and the small state dict, however many
+	cells the job has.
+	"""
+	
+	def __init__(self, job_id):
+		"""
+		Constructor.
+		"""
+		self.job_id = job_id
+		self.key = PREFIX + job_id
+		self.cancel_key = self.key + '_cancel'
+	
+	
+	@staticmethod
+	def submit(word_matrix, cells, method, parameter):
+		"""
+		Creates a job and schedules it to run; returns the job.
+		The method is either circle or neighbourhood.
+		"""
+		job = HoneycombJob(uuid.uuid4().hex)
+		
+		state = {
+			'status': 'running',
+			'total': len(cells),
+			'done': 0,
+			'batch_size': settings.HONEYCOMB_JOB_BATCH_SIZE
+		}
+		job.set_state(state)
+		
+		"""
+		The map is made ready now, so that the job does not hit the database
+		from its thread.
+		"""
+		get_map()
+		
+		if _executor['pool'] is None:
+			_executor['pool'] = ThreadPoolExecutor(settings.HONEYCOMB_JOB_WORKERS)
+		
+		job.future = _executor['pool'].submit(
+			job.run, state, word_matrix, cells, method, parameter
+		)
+		
+		return job
+	
+	
+	def get_state(self):
+		"""
+		Returns the job's state dict or None if there is no such job.
+		"""
+		return cache.get(self.key)
+	
+	
+	def set_state(self, state):
+		"""
+		Stores the job's state dict.
+		"""
+		cache.set(self.key, state, settings.HONEYCOMB_JOB_TIMEOUT)
+	
+	
+	def get_batch_key(self, batch):
+		"""
+		Returns the cache key of the n-th batch's cells.
+		"""
+		return '{}_{}'.format(self.key, batch)
+	
+	
+	def get_cells(self, state, since=0):
+		"""
+		Returns the list of the finished cells from the since-th on, gathered
+		from the keys of the batches. Should a batch have expired (as a job
+		which runs longer than HONEYCOMB_JOB_TIMEOUT would have its first
+		ones), the cells stop short of it.
+		"""
+		batch_size = state['batch_size']
+		first = since // batch_size
+		
+		keys = [
+			self.get_batch_key(batch)
+			for batch in range(first, -(-state['done'] // batch_size))
+		]
+		batches = cache.get_many(keys)
+		
+		cells = []
+		for key in keys:
+			if key not in batches:
+				break
+			cells.extend(batches[key])
+		
+		return cells[since - first * batch_size:]
+	
+	
+	def cancel(self):
+		"""
+		Asks the job to stop. Returns False if there is no such job.
+		"""
+		if self.get_state() is None:
+			return False
+		
+		cache.set(self.cancel_key, True, settings.HONEYCOMB_JOB_TIMEOUT)
+		return True
+	
+	
+	def is_cancelled(self):
+		"""
+		Tells whether the job has been asked to stop.
+		"""
+		return cache.get(self.cancel_key, False)
+	
+	
+	def run(self, state, word_matrix, cells, method, parameter):
+		"""
+		Calculates the cells batch by batch, updating the job's state after each.
+		"""
+		batch_size = state['batch_size']
+		
+		try:
+			for i in range(0, len(cells), batch_size):
+				if self.is_cancelled():
+					state['status'] = 'cancelled'
+					break
+				
+				honeycomb = Honeycomb([list(cell) for cell in cells[i:i+batch_size]])
+				
+				if method == 'circle':
+					honeycomb.calculate_on_circles(word_matrix, parameter)
+				else:
+					honeycomb.calculate_on_neighbourhoods(word_matrix, parameter)
+				
+				cache.set(
+					self.get_batch_key(i // batch_size), honeycomb.cells,
+					settings.HONEYCOMB_JOB_TIMEOUT
+				)
+				state['done'] += len(honeycomb.cells)
+				
+				self.set_state(state)
+			else:
+				state['status'] = 'done'
+		
+		except Exception:
+			logger.exception('Honeycomb job failed.')
+			state['status'] = 'failed'
+		
+		finally:
+			self.set_state(state)
+			connection.close()
+
+
+
@@ -0,0 +1,191 @@
+import heapq
+
+
+
+class KdTree:
+	"""
+	A k-d tree of points in the three-dimensional space; meant to hold the
+	(x, y, z) points of the unit sphere, so that the Euclidean (chord) distance
+	between two points grows together with the great circle distance.
+	node: {'axis': 0, 'value': 0.42, 'left': node, 'right': node,
+		'lower': (x, y, z), 'upper': (x, y, z)}
+	leaf: {'points': [] of (x, y, z), 'items': [] of items, 'ranks': [] of int,
+		'lower': (x, y, z), 'upper': (x, y, z)}
+	The lower and upper corners make up the node's bounding box. The ranks are
+	the leaves' positions in the input and are used to break distance ties.
+	"""
+	
+	LEAF_SIZE = 8
+	
+	
+	def __init__(self, d):
+		"""
+		Constructor. Expects [] of ((x, y, z), item) tuples.
+		"""
+		try:
+			leaves = [
+				(tuple(map(float, point)), item, rank)
+				for rank, (point, item) in enumerate(d)
+			]
+			assert all([len(leaf[0]) == 3 for leaf in leaves])
+		except (AssertionError, TypeError, ValueError):
+			raise ValueError('Invalid points.')
+		
+		if len(leaves) == 0:
+			raise ValueError('No values.')
+		
+		self.tree = KdTree.create_tree(leaves)
+	
+	
+	@staticmethod
+	def create_tree(leaves):
+		"""
+		Recursively create a tree out of the leaves given, each time splitting
+		at the median of the axis along which the points are most spread.
+		The leaves must be [] of ((x, y, z), item, rank,) tuples.
+		"""
+		lower = tuple([min([leaf[0][axis] for leaf in leaves]) for axis in range(3)])
+		upper = tuple([max([leaf[0][axis] for leaf in leaves]) for axis in range(3)])
+		
+		if len(leaves) <= KdTree.LEAF_SIZE:
+			return {
+				'points': [leaf[0] for leaf in leaves],
+				'items': [leaf[1] for leaf in leaves],
+				'ranks': [leaf[2] for leaf in leaves],
+				'lower': lower,
+				'upper': upper
+			}
+		
+		spreads = [upper[axis] - lower[axis] for axis in range(3)]
+		axis = spreads.index(max(spreads))
+		
+		leaves = sorted(leaves, key=lambda leaf: leaf[0][axis])
+		half = int(len(leaves) / 2)
+		
+		return {
+			'axis': axis,
+			'value': leaves[half][0][axis],
+			'left': KdTree.create_tree(leaves[:half]),
+			'right': KdTree.create_tree(leaves[half:]),
+			'lower': lower,
+			'upper': upper
+		}
+	
+	
+	@staticmethod
+	def distance(a, b):
+		"""
+		Returns the square of the Euclidean distance between the points given.
+		"""
+		return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+	
+	
+	@staticmethod
+	def box_distance(tree, point):
+		"""
+		Returns the square of the Euclidean distance between the point given
+		and the nearest point of the node's bounding box.
+		"""
+		d = 0
+		
+		for axis in range(3):
+			if point[axis] < tree['lower'][axis]:
+				d += (tree['lower'][axis] - point[axis]) ** 2
+			elif point[axis] > tree['upper'][axis]:
+				d += (point[axis] - tree['upper'][axis]) ** 2
+		
+		return d
+	
+	
+	@staticmethod
+	def search_tree(tree, centre, r, found):
+		"""
+		Recursively search the tree for the items within distance r of the
+		centre given; these are added to the found set.
+		"""
+		if 'points' in tree:
+			for point, item in zip(tree['points'], tree['items']):
+				if KdTree.distance(point, centre) <= r ** 2:
+					found.add(item)
+			return
+		
+		if centre[tree['axis']] - r <= tree['value']:
+			KdTree.search_tree(tree['left'], centre, r, found)
+		
+		if centre[tree['axis']] + r >= tree['value']:
+			KdTree.search_tree(tree['right'], centre, r, found)
+	
+	
+	@staticmethod
+	def nearest_tree(tree, centre, k, bound):
+		"""
+		Best-first search for the k items nearest to the centre given, ignoring
+		those with squared distance greater than bound. The nodes are visited
+		in the order of their bounding boxes' distance to the centre, and the
+		search stops as soon as the nearest unvisited box is further than the
+		k-th item found so far. The latter are kept in a bounded max-heap of
+		(-squared distance, -rank, item) tuples.
+		Returns [] of (squared distance, item) tuples, nearest first.
+		"""
+		best = []
+		queue = [(KdTree.box_distance(tree, centre), 0, tree)]
+		count = 1
+		
+		while queue:
+			d, _, node = heapq.heappop(queue)
+			
+			if d > bound:
+				break
+			if len(best) == k and d > -best[0][0]:
+				break
+			
+			if 'points' in node:
+				for point, item, rank in zip(node['points'], node['items'], node['ranks']):
+					d = KdTree.distance(point, centre)
+					
+					if d > bound:
+						continue
+					
+					if len(best) < k:
+						heapq.heappush(best, (-d, -rank, item))
+					elif (-d, -rank) > best[0][:2]:
+						heapq.heapreplace(best, (-d, -rank, item))
+				continue
+			
+			for child in (node['left'], node['right']):
+				heapq.heappush(queue, (KdTree.box_distance(child, centre), count, child))
+				count += 1
+		
+		best.sort(reverse=True)
+		return [(-entry[0], entry[2]) for entry in best]
+	
+	
+	def search(self, centre, r):
+		"""
+		Returns the set of items within distance r of the centre given.
+		"""
+		found = set()
+		
+		if r < 0:
+			return found
+		
+		KdTree.search_tree(self.tree, centre, r, found)
+		return found
+	
+	
+	def nearest(self, centre, k, r=None):
+		"""
+		Returns the list of the k items nearest to the centre given, nearest
+		first; equidistant items keep their input order. If r is given, items
+		further than r are left out. Fewer than k items are returned only if
+		the tree (or the r-ball) does not hold as many.
+		"""
+		if k <= 0 or (r is not None and r < 0):
+			return []
+		
+		bound = float('inf') if r is None else r ** 2
+		
+		return [item for d, item in KdTree.nearest_tree(self.tree, centre, k, bound)]
+
+
+
@@ -1,9 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
 from geopy.distance import EARTH_RADIUS
 
+from app.ling.kd_tree import KdTree
 from app.ling.range_tree import RangeTree
 from app.models import Language
 
-from math import pi, sin, cos, acos, degrees, radians
+from utils.lru import LruCache
+
+from math import pi, sin, cos, acos, asin, sqrt, degrees, radians, floor, isfinite
+
+import numpy as np
+
+import sys
+import threading
+import uuid
+
+
+VERSION_KEY = 'map_version'
+
+"""
+The approximate size in bytes of a cached lookup's key and of its entry in the
+cache, see get_lookup_size().
+"""
+LOOKUP_OVERHEAD = 400
+
+
+
+def get_lookup_size(lookup):
+	"""
+	Returns the approximate size in bytes of a cached lookup, a tuple or a
+	frozenset of ISO codes. The codes are the map's own strings, so only the
+	container and the overhead are counted.
+	"""
+	return sys.getsizeof(lookup) + LOOKUP_OVERHEAD
 
 
 
@@ -25,20 +59,44 @@ class Map:
 		order to avoid unnecessary database calls.
 		"""
 		self.languages = {}
+		self.codes = []
 		
 		latitudes = []
 		longitudes = []
+		points = []
 		
 		for lang in Language.objects.all():
 			if lang.latitude is None or lang.longitude is None:
 				continue
 			
 			self.languages[lang.iso_code] = (lang.latitude, lang.longitude,)
+			self.codes.append(lang.iso_code)
 			latitudes.append((lang.latitude, lang.iso_code))
 			longitudes.append((lang.longitude, lang.iso_code))
+			points.append((
+				Map.to_cartesian(lang.latitude, lang.longitude), lang.iso_code
+			))
 		
 		self.latitude_tree = RangeTree(latitudes)
 		self.longitude_tree = RangeTree(longitudes)
+		self.sphere_tree = KdTree(points)
+		
+		"""
+		The coords in radians and the cosines of the latitudes, in the order of
+		self.codes; these are used for the batch distance calculations.
+		"""
+		self.index = {iso_code: key for key, iso_code in enumerate(self.codes)}
+		self.radians = np.radians(np.array(
+			[self.languages[iso_code] for iso_code in self.codes], dtype=np.float64
+		).reshape(-1, 2))
+		self.cos_latitudes = np.cos(self.radians[:, 0])
+		
+		"""
+		The results of the cached lookups, see get_cache_key(). As the instance
+		is replaced when the language locations change, so is the cache. The
+		sizes are in bytes.
+		"""
+		self.candidates = LruCache(settings.MAP_CACHE_SIZE, get_size=get_lookup_size)
 	
 	
 	@staticmethod
@@ -46,12 +104,69 @@ class Map:
 		"""
 		Calculates the great circle distance between the points given.
 		The distance returned is in kilometres.
+		Uses the haversine formula, which is well-conditioned for small
+		distances, including identical points.
 		"""
-		d = acos(
-			sin(radians(A[0])) * sin(radians(B[0]))
-			+ cos(radians(A[0])) * cos(radians(B[0])) * cos(radians(abs(A[1] - B[1])))
+		h = (
+			sin(radians(B[0] - A[0]) / 2) ** 2
+			+ cos(radians(A[0])) * cos(radians(B[0])) * sin(radians(B[1] - A[1]) / 2) ** 2
 		)
-		return d * EARTH_RADIUS
+		return 2 * asin(sqrt(min(max(h, 0), 1))) * EARTH_RADIUS
+	
+	
+	@staticmethod
+	def haversine(lat_a, lon_a, cos_a, lat_b, lon_b, cos_b):
+		"""
+		Vectorised great circle distance. Expects numpy arrays of coords in
+		radians (and of the cosines of the latitudes) which broadcast against
+		each other. The distances returned are in kilometres.
+		"""
+		h = (
+			np.sin((lat_b - lat_a) / 2) ** 2
+			+ cos_a * cos_b * np.sin((lon_b - lon_a) / 2) ** 2
+		)
+		return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+	
+	
+	@staticmethod
+	def to_cartesian(latitude, longitude):
+		"""
+		Returns the (x, y, z) point of the unit sphere at the coords given.
+		"""
+		return (
+			cos(radians(latitude)) * cos(radians(longitude)),
+			cos(radians(latitude)) * sin(radians(longitude)),
+			sin(radians(latitude))
+		)
+	
+	
+	@staticmethod
+	def to_chord(x):
+		"""
+		Returns the length of the chord of the unit sphere which corresponds to
+		the great circle distance x (in kilometres).
+		"""
+		if x >= pi * EARTH_RADIUS:
+			return 2.0
+		
+		return 2 * sin(x / (2 * EARTH_RADIUS))
+	
+	
+	@staticmethod
+	def check_coords(latitude, longitude):
+		"""
+		Raises MapError unless the coords given are finite and within range.
+		"""
+		try:
+			assert isfinite(latitude) and isfinite(longitude)
+			assert -180 <= longitude <= 180
+		except (AssertionError, TypeError):
+			raise MapError('Invalid coords.')
+		
+		try:
+			assert -90 <= latitude <= 90
+		except AssertionError:
+			raise MapError('Avoid the (ant)arctic chill.')
 	
 	
 	@staticmethod
@@ -98,8 +213,6 @@ class Map:
 		* the perpendicular between its centre and each of its sides is h (km).
 		Encapsulates the search call to the class' range trees.
 		"""
-		centre = (latitude, longitude)
-		
 		tetragon = Map.make_tetragon(latitude, longitude, h)
 		
 		south_north = self.latitude_tree.search(tetragon['south'], tetragon['north'])
@@ -120,81 +233,273 @@ class Map:
 		return south_north.intersection(west_east)
 	
 	
-	def get_nearest(self, latitude, longitude, k):
+	def get_in_bounds(self, south, west, north, east):
 		"""
-		Returns list of the nearest k languages to the coords given.
-		Assumes that nearest languages do not lie further than 2000 kilometers.
+		Returns set of languages located within the bounding box given in
+		degrees. If west > east, the box is taken to cross the antimeridian.
+		Encapsulates the search call to the class' range trees.
 		"""
-		origin = (latitude, longitude,)
+		try:
+			assert -90 <= south <= north <= 90
+			assert -180 <= west <= 180 and -180 <= east <= 180
+		except AssertionError:
+			raise MapError('Invalid bounds.')
 		
-		possible_lang = self.get_in_radius(latitude, longitude, 2000)
+		south_north = self.latitude_tree.search(south, north)
 		
-		languages = []
-		distances = []
+		if west <= east:
+			west_east = self.longitude_tree.search(west, east)
+		else:
+			west_east = self.longitude_tree.search(west, 180)
+			west_east = west_east.union(self.longitude_tree.search(-180, east))
 		
-		for iso_code in possible_lang:
-			coords = self.languages[iso_code]
-			d = Map.great_circle(origin, coords)
-			
-			if len(distances) < k or d < distances[-1]:
-				for i, j in enumerate(distances):
-					if d < j:
-						distances.insert(i, d)
-						languages.insert(i, iso_code)
-						break
-				else:
-					if len(distances) < k:
-						distances.append(d)
-						languages.append(iso_code)
-				
-				if len(distances) > k:
-					del distances[-1]
-					del languages[-1]
-			
-		return languages
+		return south_north.intersection(west_east)
+	
+	
+	def get_nearest(self, latitude, longitude, k):
+		"""
+		Returns list of the nearest k languages to the coords given, nearest
+		first, regardless of how far these are. The list is shorter than k only
+		if there are less than k languages on the map.
+		Raises MapError if the coords are invalid.
+		"""
+		Map.check_coords(latitude, longitude)
+		
+		centre = Map.to_cartesian(latitude, longitude)
+		
+		return self.sphere_tree.nearest(centre, k)
 	
 	
 	def get_single_nearest(self, latitude, longitude, radius=2000):
 		"""
 		Returns the nearest language (if such) within the radius given.
 		The radius is measured in kilometers.
-		Assumes that nearest languages do not lie further than 2000 kilometers.
+		Raises MapError if the coords are invalid.
 		"""
-		origin = (latitude, longitude)
+		Map.check_coords(latitude, longitude)
 		
-		possible_lang = self.get_in_radius(latitude, longitude, radius)
+		centre = Map.to_cartesian(latitude, longitude)
 		
-		nearest_lang = None
-		smallest_dist = None
+		nearest = self.sphere_tree.nearest(
+			centre, 1, Map.to_chord(radius) * (1 + 1e-9)
+		)
 		
-		for iso_code in possible_lang:
-			coords = self.languages[iso_code]
-			d = Map.great_circle(origin, coords)
-			
-			if smallest_dist is None or d < smallest_dist:
-				smallest_dist = d
-				nearest_lang = iso_code
+		if nearest:
+			d = Map.great_circle((latitude, longitude), self.languages[nearest[0]])
+			if d <= radius:
+				return nearest[0]
 		
-		return nearest_lang
+		return None
 	
 	
 	def get_in_radius(self, latitude, longitude, radius):
 		"""
 		Returns set of the languages within radius r of the coords given.
 		The radius is measured in kilometres.
+		Unlike get_in_tetragon(), this works near the poles as well.
+		Raises MapError if the coords are invalid.
 		"""
-		origin = (latitude, longitude,)
+		Map.check_coords(latitude, longitude)
 		
-		possible_lang = self.get_in_tetragon(latitude, longitude, radius)
+		centre = Map.to_cartesian(latitude, longitude)
 		
-		s = set()
+		"""
+		The tree finds the candidates using a slightly bigger chord, so that
+		rounding errors do not leave out languages right on the circle; the
+		exact check is then done in one go for all of them.
+		"""
+		possible_lang = list(self.sphere_tree.search(
+			centre, Map.to_chord(radius) * (1 + 1e-9)
+		))
 		
-		for iso_code in possible_lang:
-			coords = self.languages[iso_code]
-			if Map.great_circle(origin, coords) <= radius:
-				s.add(iso_code)
+		distances = self.get_distances([(latitude, longitude)], possible_lang)[0]
 		
-		return s
+		return set([
+			iso_code for iso_code, d in zip(possible_lang, distances) if d <= radius
+		])
+	
+	
+	def get_in_radius_all(self, origins, radius, block_size=1.0):
+		"""
+		Batched get_in_radius(): returns the list of the sets of the languages
+		within radius r of each of the origins, [] of (latitude, longitude).
+		Unlike get_in_radius(), this does not raise: invalid origins get empty
+		sets.
+		The origins are grouped into blocks of block_size × block_size degrees
+		and the tree is searched once per block, for the candidates within r
+		plus the block's spread of the block's first origin; the exact check
+		is then done for the whole block in one go.
+		"""
+		origins = np.array(origins, dtype=np.float64).reshape(-1, 2)
+		
+		results = [set() for origin in origins]
+		
+		"""
+		Invalid origins (see check_coords()) are within no radius of anything.
+		"""
+		blocks = {}
+		for key, (latitude, longitude) in enumerate(origins.tolist()):
+			try:
+				Map.check_coords(latitude, longitude)
+			except MapError:
+				continue
+			
+			blocks.setdefault((
+				floor(latitude / block_size), floor(longitude / block_size)
+			), []).append(key)
+		
+		for block in blocks.values():
+			latitude, longitude = origins[block[0]]
+			
+			spread = self.haversine(
+				radians(latitude), radians(longitude), cos(radians(latitude)),
+				np.radians(origins[block, 0]), np.radians(origins[block, 1]),
+				np.cos(np.radians(origins[block, 0]))
+			).max()
+			
+			possible_lang = list(self.sphere_tree.search(
+				Map.to_cartesian(latitude, longitude),
+				Map.to_chord(radius + spread) * (1 + 1e-9)
+			))
+			
+			distances = self.get_distances(origins[block], possible_lang)
+			
+			for key, row in zip(block, distances.tolist()):
+				results[key] = set([
+					iso_code for iso_code, d in zip(possible_lang, row) if d <= radius
+				])
+		
+		return results
+	
+	
+	def get_cache_key(self, latitude, longitude, *args):
+		"""
+		Returns the key of a cached lookup: the coords rounded to
+		MAP_CACHE_PRECISION decimal places, followed by the args given.
+		"""
+		precision = settings.MAP_CACHE_PRECISION
+		
+		return (round(latitude, precision), round(longitude, precision)) + args
+	
+	
+	def get_nearest_cached(self, latitude, longitude, k):
+		"""
+		Cached get_nearest(); returns a tuple.
+		"""
+		key = self.get_cache_key(latitude, longitude, 'nearest', k)
+		nearest = self.candidates.get(key)
+		
+		if nearest is None:
+			nearest = tuple(self.get_nearest(latitude, longitude, k))
+			self.candidates.set(key, nearest)
+		
+		return nearest
+	
+	
+	def get_in_radius_cached(self, origins, radius):
+		"""
+		Cached get_in_radius_all(); returns the list of frozensets. Only the
+		origins which are not in the cache are looked up, in one batch.
+		"""
+		keys = [
+			self.get_cache_key(latitude, longitude, 'radius', radius)
+			for latitude, longitude in origins
+		]
+		
+		circles = [self.candidates.get(key) for key in keys]
+		missing = [i for i, circle in enumerate(circles) if circle is None]
+		
+		if missing:
+			found = self.get_in_radius_all([origins[i] for i in missing], radius)
+			
+			for i, circle in zip(missing, found):
+				circles[i] = frozenset(circle)
+				self.candidates.set(keys[i], circles[i])
+		
+		return circles
+	
+	
+	def get_distances(self, origins, iso_codes=None):
+		"""
+		Returns the great circle distances (in kilometres) between each of the
+		origins, [] of (latitude, longitude), and each of the languages given
+		(all the languages in self.codes if None) as a numpy array of shape
+		(len(origins), len(iso_codes)).
+		"""
+		origins = np.radians(np.array(origins, dtype=np.float64).reshape(-1, 2))
+		
+		if iso_codes is None:
+			ids = slice(None)
+		else:
+			ids = np.array([self.index[iso_code] for iso_code in iso_codes], dtype=np.intp)
+		
+		return Map.haversine(
+			origins[:, 0:1], origins[:, 1:2], np.cos(origins[:, 0:1]),
+			self.radians[ids, 0], self.radians[ids, 1], self.cos_latitudes[ids]
+		)
+
+
+
+"""
+The process-wide map. Building a Map instance means querying the whole
+languages table and building the indices, so each worker process does that
+once and shares the result between requests. The version stamp lives in the
+cache so that changes made by other processes (e.g. the harvest commands) are
+also picked up.
+"""
+_shared = {'map': None, 'version': None}
+_shared_lock = threading.Lock()
+
+
+def get_map_version():
+	"""
+	Returns the current version stamp of the language locations.
+	"""
+	version = cache.get(VERSION_KEY)
+	
+	if version is None:
+		cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+		version = cache.get(VERSION_KEY)
+	
+	return version
+
+
+def get_map():
+	"""
+	Returns the shared Map instance, (re)building it if the language locations
+	have changed since it was built. The instance must be treated as read-only.
+	"""
+	version = get_map_version()
+	
+	with _shared_lock:
+		if _shared['map'] is None or version is None or _shared['version'] != version:
+			_shared['map'] = Map()
+			_shared['version'] = version
+		
+		return _shared['map']
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def invalidate_map(sender, **kwargs):
+	"""
+	Marks the shared map of each process as outdated, once the transaction
+	commits: before that, the other processes would rebuild their maps out of
+	the old rows and keep these under the new version.
+	Note that queryset.update() and bulk_create() do not send these signals.
+	"""
+	transaction.on_commit(_bump_map_version)
+
+
+def _bump_map_version():
+	"""
+	Replaces the version stamp and drops this process' shared map.
+	"""
+	cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+	
+	with _shared_lock:
+		_shared['map'] = None
+		_shared['version'] = None
 
 
 
@@ -1,3 +1,5 @@
+import numpy as np
+
 import math
 
 
@@ -7,55 +9,188 @@ def get_correlation(a, b):
 	Calculates the Pearson correlation coefficient for the populations given.
 	Returns 0 if the populations cannot be correlated.
 	The return value is rounded to 5 digits after the decimal point.
+	The populations can be lists or numpy arrays.
 	"""
 	try:
 		assert len(a) == len(b) > 0
 	except AssertionError:
 		return 0
 	
-	size = len(a)
-	
-	mean_a = math.fsum(a) / size
-	mean_b = math.fsum(b) / size
+	a = np.asarray(a, dtype=np.float64)
+	b = np.asarray(b, dtype=np.float64)
 	
 	"""
 	cov(X, Y) = E[(X - µX)(Y - µY)]
 	var(X) = E[(X - µ)^2]
 	In our case the probablities = 1/size.
 	"""
-	cov = 0
-	
-	var_a = 0
-	var_b = 0
-	
-	for i in range(0, size):
-		cov += (a[i] - mean_a) * (b[i] - mean_b)
-		var_a += math.pow(a[i] - mean_a, 2)
-		var_b += math.pow(b[i] - mean_b, 2)
-	
-	cov = cov / size
+	a = a - a.mean()
+	b = b - b.mean()
 	
-	var_a = var_a / size
-	var_b = var_b / size
+	return make_correlation(
+		np.dot(a, b) / len(a), np.dot(a, a) / len(a), np.dot(b, b) / len(b)
+	)
+
+
+def make_correlation(cov, var_a, var_b):
+	"""
+	Calculates the Pearson correlation coefficient out of the covariance and
+	the variances given, sharing the semantics of get_correlation().
+	"""
 	
 	"""
 	σ(X) = sqrt(var(X))
 	When 0, there is no correlation.
 	"""
-	sigma_a = math.sqrt(var_a)
-	sigma_b = math.sqrt(var_b)
+	sigma = math.sqrt(max(var_a, 0)) * math.sqrt(max(var_b, 0))
 	
 	try:
-		assert sigma_a > 0
-		assert sigma_b > 0
+		assert sigma > 0
 	except AssertionError:
 		return 0
 	
 	"""
 	p(X, Y) = cov(X, Y) / σ(X)σ(Y)
 	"""
-	p = cov / (sigma_a * sigma_b)
-	return round(p, 5)
+	p = float(cov) / sigma
+	return round(min(max(p, -1.0), 1.0), 5)
+
+
+def get_correlations(groups_a, groups_b):
+	"""
+	Batched get_correlation(): calculates the correlation coefficient for each
+	pair of populations (groups_a[i], groups_b[i]) in one go. The populations
+	may differ in size (including being empty). Returns [] of coefficients.
+	"""
+	try:
+		assert len(groups_a) == len(groups_b)
+	except AssertionError:
+		raise ValueError('The number of groups differs.')
+	
+	sizes = np.array([len(group) for group in groups_a], dtype=np.intp)
+	valid = sizes == np.array([len(group) for group in groups_b], dtype=np.intp)
+	sizes[~valid] = 0
+	
+	if sizes.sum() == 0:
+		return [0] * len(sizes)
+	
+	a = np.concatenate([
+		np.asarray(group, dtype=np.float64)
+		for key, group in enumerate(groups_a) if valid[key]
+	] + [np.empty(0)])
+	b = np.concatenate([
+		np.asarray(group, dtype=np.float64)
+		for key, group in enumerate(groups_b) if valid[key]
+	] + [np.empty(0)])
+	
+	labels = np.repeat(np.arange(len(sizes)), sizes)
+	n = np.maximum(sizes, 1)
+	
+	a = a - (np.bincount(labels, a, len(sizes)) / n)[labels]
+	b = b - (np.bincount(labels, b, len(sizes)) / n)[labels]
+	
+	cov = np.bincount(labels, a * b, len(sizes)) / n
+	var_a = np.bincount(labels, a * a, len(sizes)) / n
+	var_b = np.bincount(labels, b * b, len(sizes)) / n
+	
+	return [
+		make_correlation(cov[i], var_a[i], var_b[i]) if sizes[i] else 0
+		for i in range(len(sizes))
+	]
+
+
+
+class SlidingCorrelation:
+	"""
+	Pearson correlation of populations which change by pairs (x, y) being
+	added and removed, e.g. as a circle moves from a honeycomb cell to the
+	next. Keeps the sufficient statistics n, Σx, Σy, Σxy, Σx², and Σy². The
+	values are expected to be rounded to that many decimal places and are
+	scaled to integers, so the sums are exact: the result does not depend on
+	the order of the changes and there is no cancellation.
+	"""
+	
+	def __init__(self, precision):
+		"""
+		Constructor.
+		"""
+		self.scale = 10 ** precision
+		self.reset()
+	
+	
+	def reset(self):
+		"""
+		Empties the populations.
+		"""
+		self.n = 0
+		self.sums = [0, 0, 0, 0, 0]  # Σx, Σy, Σxy, Σx², Σy²
+	
+	
+	def get_sums(self, a, b):
+		"""
+		Returns the size and the sums of the populations given, scaled.
+		"""
+		a = np.rint(np.asarray(a, dtype=np.float64) * self.scale)
+		b = np.rint(np.asarray(b, dtype=np.float64) * self.scale)
+		
+		"""
+		The sums are done in int64 if no sum of products can overflow it, and
+		in Python's (unbounded) ints otherwise.
+		"""
+		bound = max(np.abs(a).max(), np.abs(b).max()) if len(a) else 0
+		
+		if bound ** 2 * len(a) < 2 ** 62:
+			a, b = a.astype(np.int64), b.astype(np.int64)
+		else:
+			a = np.array([int(x) for x in a.tolist()], dtype=object)
+			b = np.array([int(x) for x in b.tolist()], dtype=object)
+		
+		return len(a), [
+			int(a.sum()), int(b.sum()), int(np.dot(a, b)), int(np.dot(a, a)), int(np.dot(b, b))
+		]
+	
+	
+	def add(self, a, b):
+		"""
+		Adds the pairs (a[i], b[i]) to the populations.
+		"""
+		n, sums = self.get_sums(a, b)
+		
+		self.n += n
+		self.sums = [x + y for x, y in zip(self.sums, sums)]
+	
+	
+	def remove(self, a, b):
+		"""
+		Removes the pairs (a[i], b[i]), which must have been added before.
+		"""
+		n, sums = self.get_sums(a, b)
+		
+		self.n -= n
+		self.sums = [x - y for x, y in zip(self.sums, sums)]
+	
+	
+	def get_correlation(self):
+		"""
+		Returns the correlation coefficient of the current populations, with
+		the semantics of get_correlation().
+		"""
+		if self.n == 0:
+			return 0
+		
+		n = self.n
+		sum_a, sum_b, sum_ab, sum_aa, sum_bb = self.sums
+		
+		"""
+		n²·cov(X, Y) = nΣxy - ΣxΣy, in integers; likewise for the variances.
+		"""
+		norm = (n * self.scale) ** 2
+		
+		return make_correlation(
+			(n * sum_ab - sum_a * sum_b) / norm,
+			(n * sum_aa - sum_a * sum_a) / norm,
+			(n * sum_bb - sum_b * sum_b) / norm
+		)
 
 
 
@@ -1,4 +1,4 @@
-from app.ling.map import Map
+from app.ling.map import Map, get_map
 from app.ling.math import get_correlation
 
 
@@ -25,30 +25,26 @@ class Point:
 		"""
 		Calculates the swadeshness within the radius given with respect to the
 		word matrix given.
+		Raises MapError if the point's coords are invalid.
 		"""
-		globe = Map()
+		Map.check_coords(self.latitude, self.longitude)
 		
-		languages = globe.get_in_radius(self.latitude, self.longitude, radius)
+		globe = get_map()
 		
+		languages = globe.get_in_radius_cached(
+			[(self.latitude, self.longitude)], radius
+		)[0]
+		
+		ids = word_matrix.get_ids(languages)
+		rows, cols, global_d, local_d = word_matrix.gather(ids)
+		
+		codes = word_matrix.codes
 		d = {}
-		global_d, local_d = [], []
 		
-		for lang_a in languages:
-			for lang_b in languages:
-				if lang_a == lang_b:
-					continue
-				
-				if lang_a > lang_b:
-					continue
-				
-				if (lang_a, lang_b) not in word_matrix.d:
-					continue
-				
-				key = lang_a +','+ lang_b
-				d[key] = word_matrix.d[(lang_a, lang_b)]
-				
-				global_d.append(d[key][0])
-				local_d.append(d[key][1])
+		for i, j, global_value, local_value in zip(
+			rows.tolist(), cols.tolist(), global_d.tolist(), local_d.tolist()
+		):
+			d[codes[i] +','+ codes[j]] = (global_value, local_value)
 		
 		p = get_correlation(global_d, local_d)
 		
@@ -62,9 +58,9 @@ class Point:
 		language (the origin) and each of the others are taken into account. 
 		The parameter k must be positive integer.
 		"""
-		globe = Map()
+		globe = get_map()
 		
-		languages = globe.get_nearest(self.latitude, self.longitude, k+1)
+		languages = globe.get_nearest_cached(self.latitude, self.longitude, k+1)
 		
 		if len(languages) == 0:
 			return None, {}, 0
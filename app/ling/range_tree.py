@@ -1,9 +1,17 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
 
 
 
 class RangeTree:
 	"""
-	node: {'left': node, 'right': node, 'value': 42, 'item': None}
+	Range index over (value, item) pairs. There are no nodes: the values are
+	kept sorted in a contiguous array of doubles and are binary searched, and
+	the items are kept in a list in the same order. Thus the result of a search
+	is a contiguous range of indices into both.
+	values: array('d', [1.0, 2.0, 3.0])
+	items: ['one', 'two', 'three']
 	"""
 	
 	def __init__(self, d):
@@ -18,97 +26,43 @@ class RangeTree:
 		if len(leaves) == 0:
 			raise ValueError('No values.')
 		
-		self.tree = RangeTree.create_tree(leaves)
+		try:
+			self.values = array('d', [leaf[0] for leaf in leaves])
+		except TypeError:
+			raise ValueError('Non-numeric values.')
+		
+		self.items = [leaf[1] for leaf in leaves]
 	
 	
-	@staticmethod
-	def create_tree(leaves):
+	def search_range(self, a, b):
 		"""
-		Recursively create a tree out of the leaves given.
-		The leaves must be [] of (value, item,) tuples.
+		Returns the (start, stop) indices of the items the values of which are
+		within [a, b]. The range is empty if a >= b.
 		"""
-		if len(leaves) in (1, 2,):
-			left = {
-				'value': leaves[0][0],
-				'item': leaves[0][1],
-				'left': None,
-				'right': None
-			}
-			
-			if len(leaves) == 2:
-				right = {
-					'value': leaves[1][0],
-					'item': leaves[1][1],
-					'left': None,
-					'right': None
-				}
-			else:
-				right = None
-			
-			value = leaves[0][0]
+		if not a < b:
+			return 0, 0
 		
-		else:
-			half = int(len(leaves) / 2)
-			
-			left = RangeTree.create_tree(leaves[:half])
-			right = RangeTree.create_tree(leaves[half:])
-			
-			value = left['value']
-			node = left['right']
-			
-			while node is not None:
-				if node['value'] > value:
-					value = node['value']
-				node = node['right']
+		start = bisect_left(self.values, a)
+		stop = bisect_right(self.values, b, start)
 		
-		return {
-			'left': left,
-			'right': right,
-			'value': value
-		}
+		return start, stop
 	
 	
-	@staticmethod
-	def search_tree(tree, a, b):
+	def iter_search(self, a, b):
 		"""
-		Recursively search the tree given.
+		Returns an iterator over the items the values of which are within
+		[a, b], in the order of their values.
 		"""
-		if tree['value'] < a:
-			if tree['right'] is None:
-				return set()
-			return RangeTree.search_tree(tree['right'], a, b)
-		
-		if tree['value'] > b:
-			if tree['left'] is None:
-				return set()
-			return RangeTree.search_tree(tree['left'], a, b)
-		
-		
-		if tree['left'] is None and tree['right'] is None:
-			return set([tree['item']])
-		
-		
-		items_left = set()
-		if tree['left'] is not None:
-			items_left = RangeTree.search_tree(tree['left'], a, b)
-		
-		items_right = set()
-		if tree['right'] is not None:
-			items_right = RangeTree.search_tree(tree['right'], a, b)
-		
-		return items_left.union(items_right)
+		start, stop = self.search_range(a, b)
+		return islice(self.items, start, stop)
 	
 	
 	def search(self, a, b):
 		"""
-		Wrapper for the static method.
+		Returns the set of items the values of which are within [a, b].
 		"""
-		try:
-			assert a < b
-		except AssertionError:
-			return set()
-		
-		return RangeTree.search_tree(self.tree, a, b)
+		start, stop = self.search_range(a, b)
+		return set(self.items[start:stop])
 
 
 
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.core.cache import cache
+
+import mmap
+import os
+import re
+import tempfile
+
+
+"""
+Storage keys are used as file names, so these are restricted.
+"""
+KEY_RE = re.compile(r'^[\w-]{1,200}$', re.ASCII)
+
+
+
+class CacheStore:
+	"""
+	Stores the encoded word matrices in the Django cache, where these expire
+	after the cache's default timeout.
+	"""
+	
+	@property
+	def timeout(self):
+		"""
+		The number of seconds the stored matrices live for.
+		"""
+		return cache.default_timeout
+	
+	
+	def get(self, key):
+		"""
+		Returns the data stored under the key or None.
+		"""
+		return cache.get(key)
+	
+	
+	def set(self, key, data):
+		"""
+		Stores the data under the key, replacing whatever is there and thus
+		renewing its timeout.
+		"""
+		cache.set(key, data)
+	
+	
+	def delete(self, key):
+		"""
+		Removes the key, if it is there.
+		"""
+		cache.delete(key)
+
+
+
+class FileStore:
+	"""
+	Stores the encoded word matrices as files in the directory given, one file
+	per key. The files are memory-mapped when read, so all the processes on
+	the host share one copy of a matrix (the page cache's) instead of each
+	having its own. The files do not expire.
+	"""
+	
+	def __init__(self, root):
+		"""
+		Constructor. Creates the directory if needed.
+		"""
+		self.root = root
+		self.timeout = None
+		
+		os.makedirs(root, exist_ok=True)
+	
+	
+	def get_path(self, key):
+		"""
+		Returns the path of the key's file.
+		Raises ValueError if the key is not fit for a file name.
+		"""
+		if not KEY_RE.match(key):
+			raise ValueError('Invalid key.')
+		
+		return os.path.join(self.root, key + '.bin')
+	
+	
+	def get(self, key):
+		"""
+		Returns the read-only mmap of the key's file or None.
+		"""
+		try:
+			path = self.get_path(key)
+		except ValueError:
+			return None
+		
+		try:
+			with open(path, 'rb') as f:
+				return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (OSError, ValueError):  # missing or empty
+			return None
+	
+	
+	def set(self, key, data):
+		"""
+		Stores the data under the key, replacing whatever is there. The file is
+		written under a temporary name and then renamed, so that readers never
+		see it half-written (and the ones which have the old one mapped keep
+		it).
+		"""
+		path = self.get_path(key)
+		
+		fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+		
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			os.replace(temp_path, path)
+		except Exception:
+			os.unlink(temp_path)
+			raise
+	
+	
+	def delete(self, key):
+		"""
+		Removes the key, if it is there.
+		"""
+		try:
+			os.unlink(self.get_path(key))
+		except (OSError, ValueError):
+			pass
+
+
+
+"""
+The process-wide stores, created on demand, by WORD_MATRIX_ROOT; so the
+directory is not looked at on every load and save.
+"""
+_stores = {}
+
+
+def get_store():
+	"""
+	Returns the store which the WORD_MATRIX_ROOT setting asks for: FileStore if
+	it names a directory, CacheStore if it is None.
+	"""
+	root = settings.WORD_MATRIX_ROOT or None
+	
+	if root not in _stores:
+		_stores[root] = FileStore(root) if root else CacheStore()
+	
+	return _stores[root]
+
+
+
@@ -0,0 +1,139 @@
+from django.conf import settings
+
+from app.ling.honeycomb import Honeycomb
+
+import numpy as np
+
+from math import atan, degrees, pi, sinh
+import os
+import tempfile
+
+
+
+def get_tile_cells(z, x, y, size):
+	"""
+	Returns the list of the [latitude, longitude] of the centres of the
+	size × size samples of the XYZ tile given, row by row from the north west
+	corner, in Web Mercator (as the slippy map tiles are).
+	"""
+	n = 2 ** z
+	cells = []
+	
+	for row in range(size):
+		latitude = degrees(atan(sinh(pi * (1 - 2 * (y + (row + 0.5) / size) / n))))
+		
+		for col in range(size):
+			longitude = (x + (col + 0.5) / size) / n * 360 - 180
+			cells.append([latitude, longitude])
+	
+	return cells
+
+
+def calculate_tile(word_matrix, method, parameter, z, x, y, size):
+	"""
+	Returns the size × size float32 numpy array of the swadeshness of the XYZ
+	tile's samples. The method is either circle or neighbourhood.
+	"""
+	cells = get_tile_cells(z, x, y, size)
+	temperatures = Honeycomb(cells).calculate(method, word_matrix, parameter)
+	
+	return np.array(temperatures, dtype=np.float32).reshape((size, size))
+
+
+
+class TileStore:
+	"""
+	The precomputed tiles of the built-in berg.tsv, in the directory given.
+	Each method and parameter has a directory of its own with one file per zoom
+	level, <z>.npy, which holds the float32 numpy array of shape
+	(2^z, 2^z, size, size): the tiles by y and x. The files are memory-mapped
+	both when read and when (re)written by the precompute_tiles command.
+	"""
+	
+	def __init__(self, root):
+		"""
+		Constructor.
+		"""
+		self.root = root
+	
+	
+	def get_path(self, method, parameter, z):
+		"""
+		Returns the path of the zoom level's file.
+		"""
+		return os.path.join(
+			self.root, '{}_{}'.format(method, parameter), '{}.npy'.format(z)
+		)
+	
+	
+	def get(self, method, parameter, z, x, y):
+		"""
+		Returns the float32 numpy array of the tile or None if the tile has not
+		been precomputed.
+		"""
+		try:
+			level = np.load(self.get_path(method, parameter, z), mmap_mode='r')
+			assert level.shape[:2] == (2 ** z, 2 ** z)
+		except (AssertionError, OSError, ValueError):
+			return None
+		
+		return np.array(level[y, x], dtype=np.float32)
+	
+	
+	def save(self, method, parameter, z, tiles, size):
+		"""
+		Stores the zoom level's tiles, an iterable of the 2^z × 2^z size × size
+		arrays by y and then by x. These are written into the memory-mapped file
+		one by one, so the level is never held in memory. The file is written
+		under a temporary name and then renamed, so that readers never see it
+		half-written. Raises ValueError if the number of tiles is wrong.
+		"""
+		n = 2 ** z
+		path = self.get_path(method, parameter, z)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		
+		fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+		os.close(fd)
+		
+		try:
+			level = np.lib.format.open_memmap(
+				temp_path, mode='w+', dtype=np.float32, shape=(n, n, size, size)
+			)
+			
+			count = 0
+			for tile in tiles:
+				try:
+					assert count < n * n
+				except AssertionError:
+					raise ValueError('Too many tiles.')
+				
+				level[count // n, count % n] = tile
+				count += 1
+			
+			try:
+				assert count == n * n
+			except AssertionError:
+				raise ValueError('Too few tiles.')
+			
+			level.flush()
+			del level
+			
+			os.replace(temp_path, path)
+		except Exception:
+			os.unlink(temp_path)
+			raise
+
+
+
+def get_tile_store():
+	"""
+	Returns the TileStore of the HONEYCOMB_TILES_ROOT setting or None if the
+	setting is None.
+	"""
+	if settings.HONEYCOMB_TILES_ROOT:
+		return TileStore(settings.HONEYCOMB_TILES_ROOT)
+	
+	return None
+
+
+
@@ -0,0 +1,175 @@
+import numpy as np
+
+import codecs
+
+
+"""
+The size of the chunks read out of file handlers which are not Django's
+uploaded files (these give their own chunks).
+"""
+CHUNK_SIZE = 64 * 1024
+
+
+
+class TsvParser:
+	"""
+	Incremental parser of .tsv files of word distances, the ones that look like
+		
+		langdist	conceptdist	word1	word2
+		0.3487	0.4035	sjd:KANT	sms:KYUDES
+	
+	The input is fed in chunks (bytes, decoded as UTF-8, or str) which need not
+	end on line boundaries. The rows go into preallocated columnar buffers
+	(two code ids and two float32 distances per row) which are doubled when
+	full, so the whole file is never held in memory, neither as text nor as
+	Python objects. The first line is the header and is skipped.
+	"""
+	
+	def __init__(self, capacity=1024):
+		"""
+		Constructor.
+		"""
+		self.decoder = codecs.getincrementaldecoder('utf-8')()
+		self.tail = ''
+		self.line = 0
+		
+		self.codes = {}  # code: id, in the order of appearance
+		
+		self.size = 0
+		self.code_a = np.empty(capacity, dtype=np.int32)
+		self.code_b = np.empty(capacity, dtype=np.int32)
+		self.global_d = np.empty(capacity, dtype=np.float32)
+		self.real_d = np.empty(capacity, dtype=np.float32)
+	
+	
+	def feed(self, chunk):
+		"""
+		Parses the complete lines of the chunk given, keeping the incomplete
+		last one until the next chunk arrives.
+		Raises ValueError if the input does not conform to the format.
+		"""
+		if isinstance(chunk, bytes):
+			try:
+				chunk = self.decoder.decode(chunk)
+			except UnicodeDecodeError as error:
+				line = self.line + 1 + error.object[:error.start].count(b'\n')
+				raise ValueError('File is not UTF-8 (line {}).'.format(line))
+		
+		lines = (self.tail + chunk).split('\n')
+		self.tail = lines.pop()
+		
+		for line in lines:
+			self.parse_line(line)
+	
+	
+	def close(self):
+		"""
+		Parses whatever is left and returns (codes, code_a, code_b, global_d,
+		real_d), where the codes are sorted and the other four are numpy arrays
+		with one item per row, the code ids being indices into the codes.
+		Raises ValueError if the input does not conform to the format.
+		"""
+		try:
+			self.tail += self.decoder.decode(b'', final=True)
+		except UnicodeDecodeError:
+			raise ValueError('File is not UTF-8 (line {}).'.format(self.line + 1))
+		
+		if self.tail:
+			self.parse_line(self.tail)
+			self.tail = ''
+		
+		codes = sorted(self.codes)
+		
+		"""
+		Re-number the ids so that these follow the sorted codes.
+		"""
+		ids = np.empty(len(codes), dtype=np.int32)
+		for key, code in enumerate(codes):
+			ids[self.codes[code]] = key
+		
+		return (
+			codes,
+			ids[self.code_a[:self.size]],
+			ids[self.code_b[:self.size]],
+			self.global_d[:self.size],
+			self.real_d[:self.size],
+		)
+	
+	
+	def parse_line(self, line):
+		"""
+		Adds the line's row to the buffers.
+		Raises ValueError if the line does not conform to the format.
+		"""
+		self.line += 1
+		
+		line = line.rstrip('\r')
+		if self.line == 1 or not line:
+			return
+		
+		row = line.split('\t')
+		
+		try:
+			assert len(row) >= 4
+			assert row[2].find(':') > 0
+			assert row[3].find(':') > 0
+			global_value = float(row[0])
+			real_value = float(row[1])
+		except (AssertionError, ValueError):
+			raise ValueError(
+				'File does not conform to format (line {}).'.format(self.line)
+			)
+		
+		if self.size == len(self.global_d):
+			self.grow()
+		
+		self.code_a[self.size] = self.intern(row[2].split(':')[0])
+		self.code_b[self.size] = self.intern(row[3].split(':')[0])
+		self.global_d[self.size] = global_value
+		self.real_d[self.size] = real_value
+		
+		self.size += 1
+	
+	
+	def intern(self, code):
+		"""
+		Returns the id of the code given, assigning a new one if needed.
+		"""
+		try:
+			return self.codes[code]
+		except KeyError:
+			self.codes[code] = len(self.codes)
+			return self.codes[code]
+	
+	
+	def grow(self):
+		"""
+		Doubles the capacity of the buffers.
+		"""
+		capacity = max(2 * len(self.global_d), 1)
+		
+		for name in ('code_a', 'code_b', 'global_d', 'real_d'):
+			old = getattr(self, name)
+			new = np.empty(capacity, dtype=old.dtype)
+			new[:len(old)] = old
+			setattr(self, name, new)
+	
+	
+	def parse(self, file_handler):
+		"""
+		Feeds the whole of the file handler given and returns what close()
+		does. The file handler can be Django's UploadedFile or a file object
+		opened in either text or binary mode.
+		"""
+		if hasattr(file_handler, 'chunks'):
+			chunks = file_handler.chunks()
+		else:
+			chunks = iter(lambda: file_handler.read(CHUNK_SIZE), file_handler.read(0))
+		
+		for chunk in chunks:
+			self.feed(chunk)
+		
+		return self.close()
+
+
+
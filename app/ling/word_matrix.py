@@ -1,113 +1,436 @@
-from django.core.cache import cache
+from django.conf import settings
 
-import codecs
-import csv
-import uuid
+from app.ling.storage import get_store
+from app.ling.tsv_parser import TsvParser
+
+from utils.lru import LruCache
+
+import numpy as np
+
+from collections.abc import Mapping
+import hashlib
+import lzma
+import struct
+import time
+import zlib
 
 
 PREFIX = 'matrix_'
+UPLOAD_PREFIX = 'upload_'
+
+"""
+The distances are stored as float32, i.e. with about 7 significant digits;
+when handed out as Python floats these are rounded to PRECISION digits after
+the decimal point, so that they equal the values in the .tsv file.
+"""
+PRECISION = 6
+
+"""
+The binary format in which the matrices are stored:
+* header: magic, version, compression, (padding), number of codes, creation
+  unix time; little-endian;
+* payload, compressed as the header says: the byte length of the codes table,
+  the table itself (the codes joined by newlines, UTF-8), zero padding up to
+  a multiple of 4 bytes, and the global and real matrices as float32 arrays
+  in C order.
+The header's size being a multiple of 4, the arrays of an uncompressed payload
+can be used in place, without copying.
+"""
+MAGIC = b'KKWM'
+VERSION = 1
+HEADER = struct.Struct('<4sBBxxId')
+TABLE = struct.Struct('<I')
+
+COMPRESSIONS = {
+	None: (0, None, None),
+	'zlib': (1, zlib.compress, zlib.decompress),
+	'lzma': (2, lzma.compress, lzma.decompress),
+}
+
+"""
+The matrices loaded or saved by this process, decoded, so that the requests
+which follow do not fetch and decode these again. The keys are storage ids,
+the sizes are in bytes, and the entries expire together with the respective
+entries of the store.
+"""
+matrix_cache = LruCache(
+	settings.WORD_MATRIX_CACHE_SIZE,
+	get_size=lambda matrix: matrix.global_d.nbytes + matrix.real_d.nbytes
+)
+
+
+
+class Distances(Mapping):
+	"""
+	Read-only dict-like view of a WordMatrix, in which:
+	* the keys are tuples of ISO codes ordered alphabetically;
+	* the values are tuples of the respective (global, real) distances.
+	This is what WordMatrix.d used to be before the matrices went dense.
+	"""
+	
+	def __init__(self, matrix):
+		"""
+		Constructor.
+		"""
+		self.matrix = matrix
+	
+	
+	def __getitem__(self, key):
+		try:
+			assert len(key) == 2
+			assert key[0] <= key[1]
+			i, j = self.matrix.ids[key[0]], self.matrix.ids[key[1]]
+		except (AssertionError, KeyError, TypeError):
+			raise KeyError(key)
+		
+		value = self.matrix.get_pair(i, j)
+		if value is None:
+			raise KeyError(key)
+		
+		return value
+	
+	
+	def __iter__(self):
+		codes = self.matrix.codes
+		for i, j in zip(*np.nonzero(self.matrix.get_mask())):
+			yield (codes[i], codes[j])
+	
+	
+	def __len__(self):
+		return self.matrix.size
+
 
 
 class WordMatrix:
 	"""
 	Wrapper for the information of a .tsv file.
 	Also handles between-requests storage.
+	The language codes are interned: self.codes is the sorted list of codes and
+	self.ids maps them to their indices. The distances are kept in two dense
+	symmetric float32 matrices indexed by these ids, self.global_d and
+	self.real_d, in which NaN stands for a missing pair.
 	"""
 	
 	def __init__(self):
 		"""
 		Constructor.
 		"""
-		self.d = {}
+		self.set_data([], np.empty((0, 0)), np.empty((0, 0)))
 		self.storage_id = None
+		self.created = None
+	
+	
+	def set_data(self, codes, global_d, real_d):
+		"""
+		Sets the matrix contents. The codes must be sorted and the matrices must
+		be square with a side of len(codes).
+		Raises ValueError if that is not the case.
+		"""
+		global_d = np.asarray(global_d, dtype=np.float32)
+		real_d = np.asarray(real_d, dtype=np.float32)
+		
+		try:
+			assert list(codes) == sorted(codes)
+			assert global_d.shape == real_d.shape == (len(codes), len(codes))
+		except AssertionError:
+			raise ValueError('Invalid matrix data.')
+		
+		self.codes = list(codes)
+		self.ids = {code: key for key, code in enumerate(self.codes)}
+		
+		self.global_d = global_d
+		self.real_d = real_d
+		
+		self.size = int(np.count_nonzero(self.get_mask()))
+		self.d = Distances(self)
+	
+	
+	def get_mask(self):
+		"""
+		Returns the boolean matrix which is True for the pairs (i, j) with
+		i <= j that have distances.
+		"""
+		return np.triu(~np.isnan(self.global_d))
+	
+	
+	def get_pair(self, i, j):
+		"""
+		Returns the (global, real) distance tuple for the pair of ids given or
+		None if the pair is missing.
+		"""
+		if np.isnan(self.global_d[i, j]):
+			return None
+		
+		return (
+			round(float(self.global_d[i, j]), PRECISION),
+			round(float(self.real_d[i, j]), PRECISION),
+		)
+	
+	
+	def get_ids(self, languages):
+		"""
+		Returns the sorted numpy array of the ids of those of the languages
+		given which are in the matrix.
+		"""
+		return np.array(sorted([
+			self.ids[language] for language in languages if language in self.ids
+		]), dtype=np.intp)
+	
+	
+	def gather(self, ids):
+		"""
+		Gathers the distances between each two of the ids given in one go.
+		Expects a sorted numpy array of ids, e.g. as returned by get_ids().
+		Returns (rows, cols, global, real) numpy arrays, one item per pair of
+		ids i < j which has distances; the distances are float64, rounded in
+		the same way as these handed out by self.d.
+		"""
+		rows, cols = np.triu_indices(len(ids), 1)
+		
+		return self.gather_pairs(ids[rows], ids[cols])
+	
+	
+	def gather_between(self, ids_a, ids_b):
+		"""
+		Like gather(), but for the pairs (i, j) with i from ids_a and j from
+		ids_b; the two numpy arrays of ids must not overlap.
+		"""
+		ids_a = np.asarray(ids_a, dtype=np.intp)
+		ids_b = np.asarray(ids_b, dtype=np.intp)
+		
+		return self.gather_pairs(
+			np.repeat(ids_a, len(ids_b)), np.tile(ids_b, len(ids_a))
+		)
+	
+	
+	def gather_pairs(self, rows, cols):
+		"""
+		Returns the (rows, cols, global, real) numpy arrays of those of the
+		pairs (rows[k], cols[k]) which have distances; see gather().
+		"""
+		global_d = self.global_d[rows, cols]
+		mask = ~np.isnan(global_d)
+		
+		rows, cols = rows[mask], cols[mask]
+		
+		return (
+			rows, cols,
+			np.round(global_d[mask].astype(np.float64), PRECISION),
+			np.round(self.real_d[rows, cols].astype(np.float64), PRECISION),
+		)
 	
 	
 	def load_raw(self, file_handler):
 		"""
-		Parses the file into a dictionary in which:
-		* the keys are tuples of ISO codes ordered alphabetically;
-		* the values are tuples of the respective (global, real) distances.
-		Raises ValueError if the file does not conform to expected format.
+		Parses the file and populates the matrices. The file handler can be
+		Django's UploadedFile or a file object in either text or binary mode.
+		Raises ValueError if the file does not conform to expected format or
+		has more than WORD_MATRIX_MAX_LANGUAGES languages.
 		"""
-		if hasattr(file_handler, 'encoding'):  # 'rt'
-			reader = csv.reader(file_handler, delimiter='\t')
-		else:  # 'rb' --- this is what django's UploadedFile gives
-			reader = csv.reader(codecs.iterdecode(file_handler, 'utf-8'), delimiter='\t')
+		codes, code_a, code_b, global_values, real_values = TsvParser().parse(file_handler)
 		
-		count = -1
+		try:
+			assert len(codes) <= settings.WORD_MATRIX_MAX_LANGUAGES
+		except AssertionError:
+			raise ValueError('The file exceeds the {} languages limit.'.format(
+				settings.WORD_MATRIX_MAX_LANGUAGES
+			))
 		
-		for row in reader:
-			count += 1
-			if count == 0:
-				continue
-			
-			try:
-				assert row[2].find(':') > 0
-				assert row[3].find(':') > 0
-			except AssertionError:
-				self.d = None
-				raise ValueError('File does not conform to format.')
+		"""
+		If a pair occurs more than once, the last row wins.
+		"""
+		pairs = np.minimum(code_a, code_b).astype(np.int64) * len(codes) \
+			+ np.maximum(code_a, code_b)
+		_, last = np.unique(pairs[::-1], return_index=True)
+		last = len(pairs) - 1 - last
+		
+		code_a, code_b = code_a[last], code_b[last]
+		
+		global_d = np.full((len(codes), len(codes)), np.nan, dtype=np.float32)
+		real_d = np.full((len(codes), len(codes)), np.nan, dtype=np.float32)
+		
+		global_d[code_a, code_b] = global_d[code_b, code_a] = global_values[last]
+		real_d[code_a, code_b] = real_d[code_b, code_a] = real_values[last]
+		
+		self.set_data(codes, global_d, real_d)
+	
+	
+	def to_bytes(self, compression=None):
+		"""
+		Returns the matrix encoded in the binary format; the compression is one
+		of the keys of COMPRESSIONS.
+		Sets self.created.
+		"""
+		try:
+			flag, compress, _ = COMPRESSIONS[compression]
+		except KeyError:
+			raise ValueError('Unknown compression.')
+		
+		self.created = time.time()
+		
+		table = '\n'.join(self.codes).encode('utf-8')
+		padding = b'\0' * (-(TABLE.size + len(table)) % 4)
+		
+		payload = b''.join([
+			TABLE.pack(len(table)), table, padding,
+			np.ascontiguousarray(self.global_d, dtype='<f4').tobytes(),
+			np.ascontiguousarray(self.real_d, dtype='<f4').tobytes(),
+		])
+		
+		if compress:
+			payload = compress(payload)
+		
+		return HEADER.pack(MAGIC, VERSION, flag, len(self.codes), self.created) + payload
+	
+	
+	def from_bytes(self, data):
+		"""
+		Populates the matrices out of the binary format. The matrices of
+		uncompressed data are read-only views into the latter.
+		Raises ValueError if the data cannot be decoded.
+		"""
+		data = memoryview(data)
+		
+		try:
+			magic, version, flag, n, created = HEADER.unpack_from(data)
+			assert magic == MAGIC
+			assert version == VERSION
+		except (AssertionError, struct.error):
+			raise ValueError('Unknown format.')
+		
+		try:
+			decompress = [value[2] for value in COMPRESSIONS.values() if value[0] == flag][0]
+		except IndexError:
+			raise ValueError('Unknown compression.')
+		
+		payload = data[HEADER.size:]
+		
+		try:
+			if decompress:
+				payload = memoryview(decompress(payload))
 			
-			key = [
-				row[2].split(':')[0],
-				row[3].split(':')[0],
-			]
-			key.sort()
-			key = tuple(key)
+			size, = TABLE.unpack_from(payload)
+			table = bytes(payload[TABLE.size:TABLE.size+size]).decode('utf-8')
+			codes = table.split('\n') if n else []
+			assert len(codes) == n
 			
-			value = (
-				float(row[0]),
-				float(row[1]),
-			)
+			offset = TABLE.size + size
+			offset += -offset % 4
 			
-			self.d[key] = value
+			global_d = np.frombuffer(payload, dtype='<f4', count=n*n, offset=offset)
+			real_d = np.frombuffer(payload, dtype='<f4', count=n*n, offset=offset+4*n*n)
+		except (AssertionError, struct.error, UnicodeDecodeError, ValueError,
+				zlib.error, lzma.LZMAError):
+			raise ValueError('Corrupt data.')
+		
+		self.set_data(codes, global_d.reshape((n, n)), real_d.reshape((n, n)))
+		self.created = created
 	
 	
 	def load(self, storage_id):
 		"""
-		Retrieves the word matrix corresponding to the id given.
+		Retrieves the word matrix corresponding to the id given, from the
+		process' matrix_cache if it is there and from the store otherwise.
 		Raises ValueError if there is nothing in storage.
 		"""
-		self.d = cache.get(storage_id)
-		if self.d is None:
-			self.d = {}
+		cached = matrix_cache.get(storage_id)
+		if cached is not None:
+			self.share_data(cached)
+			self.storage_id = storage_id
+			return
+		
+		data = get_store().get(storage_id)
+		if data is None:
 			raise ValueError('Matrix not found.')
 		
 		try:
-			assert type(self.d) is dict
-		except AssertionError:
-			self.d = {}
+			self.from_bytes(data)
+		except (TypeError, ValueError):
 			raise ValueError('Matrix found but useless.')
+		
+		self.storage_id = storage_id
+		self.remember()
 	
 	
 	def save(self):
 		"""
-		Stores the word matrix for later retrieval.
+		Stores the word matrix for later retrieval (see app.ling.storage), in
+		the binary format and compressed as the WORD_MATRIX_COMPRESSION setting
+		says. The storage id is derived from the content hash, so the same
+		matrix is stored once; storing it again renews it.
 		Sets self.storage_id.
 		"""
-		while True:
-			key = PREFIX + str(uuid.uuid4())
-			if cache.get(key) is None:
-				break
+		self.storage_id = PREFIX + self.get_hash()
 		
-		cache.set(key, self.d)
+		get_store().set(self.storage_id, self.to_bytes(settings.WORD_MATRIX_COMPRESSION))
+		self.remember()
 		
-		self.storage_id = key
 		return self.storage_id
 	
 	
-	def get_distances(self, lang_one, lang_two):
+	def get_hash(self):
 		"""
-		Returns the (global, real) distance tuple for the language pair.
+		Returns the hex SHA-256 digest of the matrix' contents. As these are
+		normalised (sorted codes, dense symmetric matrices), the row order and
+		the formatting of the .tsv file do not matter.
+		"""
+		digest = hashlib.sha256()
+		
+		digest.update('\n'.join(self.codes).encode('utf-8') + b'\0')
+		digest.update(np.ascontiguousarray(self.global_d, dtype='<f4').data)
+		digest.update(np.ascontiguousarray(self.real_d, dtype='<f4').data)
+		
+		return digest.hexdigest()
+	
+	
+	def remember(self):
+		"""
+		Puts the matrix into matrix_cache, for as long as it lives in the
+		store. The matrices become read-only, as these are shared.
 		"""
-		key = [lang_one, lang_two]
-		key.sort()
-		key = tuple(key)
+		timeout = get_store().timeout
 		
-		if key in self.d:
-			return self.d[key]
+		if timeout is None:
+			ttl = None
 		else:
+			ttl = self.created + timeout - time.time()
+			if ttl <= 0:
+				return
+		
+		self.global_d.setflags(write=False)
+		self.real_d.setflags(write=False)
+		
+		shared = WordMatrix()
+		shared.share_data(self)
+		shared.storage_id = self.storage_id
+		
+		matrix_cache.set(self.storage_id, shared, ttl)
+	
+	
+	def share_data(self, other):
+		"""
+		Makes the matrix share the contents of the other one, without copying
+		or re-validating these.
+		"""
+		self.codes = other.codes
+		self.ids = other.ids
+		self.global_d = other.global_d
+		self.real_d = other.real_d
+		self.size = other.size
+		self.d = Distances(self)
+		self.created = other.created
+	
+	
+	def get_distances(self, lang_one, lang_two):
+		"""
+		Returns the (global, real) distance tuple for the language pair.
+		"""
+		try:
+			i, j = self.ids[lang_one], self.ids[lang_two]
+		except KeyError:
 			return None
+		
+		return self.get_pair(i, j)
 
 
 
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.ling.distances import get_index
+from app.ling.tiles import calculate_tile, get_tile_store
+
+
+
+class Command(BaseCommand):
+	
+	help = (
+		"Precomputes the honeycomb tiles of the built-in berg.tsv "
+		"for the radii and neighbourhood sizes given, "
+		"from zoom level 0 up to the zoom level given, "
+		"and stores these in the HONEYCOMB_TILES_ROOT directory. "
+		"Re-run this command whenever berg.tsv or the languages' locations change."
+	)
+	
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--zoom',
+			type = int,
+			default = 3,
+			help = "The highest zoom level, at most HONEYCOMB_TILES_MAX_PRECOMPUTE_ZOOM; defaults to 3."
+		)
+		parser.add_argument(
+			'--radii',
+			type = str,
+			default = '500,1000,1500,2000',
+			help = "Comma-separated circle radii in kilometres."
+		)
+		parser.add_argument(
+			'--sizes',
+			type = str,
+			default = '5,10,20',
+			help = "Comma-separated neighbourhood sizes."
+		)
+	
+	
+	def handle(self, *args, **options):
+		"""
+		The command's main.
+		"""
+		try:
+			assert 0 <= options['zoom'] <= settings.HONEYCOMB_TILES_MAX_ZOOM
+			radii = [int(radius) for radius in options['radii'].split(',') if radius]
+			sizes = [int(size) for size in options['sizes'].split(',') if size]
+			assert all([parameter > 0 for parameter in radii + sizes])
+		except (AssertionError, ValueError):
+			raise CommandError("Please refer to --help")
+		
+		if options['zoom'] > settings.HONEYCOMB_TILES_MAX_PRECOMPUTE_ZOOM:
+			raise CommandError(
+				"Zoom levels above {} are too many tiles to precompute; "
+				"these are calculated on request".format(
+					settings.HONEYCOMB_TILES_MAX_PRECOMPUTE_ZOOM
+				)
+			)
+		
+		store = get_tile_store()
+		if store is None:
+			raise CommandError("Please set HONEYCOMB_TILES_ROOT")
+		
+		matrix = get_index().matrix
+		size = settings.HONEYCOMB_TILE_SIZE
+		
+		for method, parameters in [('circle', radii), ('neighbourhood', sizes)]:
+			for parameter in parameters:
+				for z in range(options['zoom'] + 1):
+					tiles = (
+						calculate_tile(matrix, method, parameter, z, x, y, size)
+						for y in range(2 ** z) for x in range(2 ** z)
+					)
+					
+					store.save(method, parameter, z, tiles, size)
+					
+					self.stdout.write("Done: {} {}, zoom {}".format(method, parameter, z))
+
+
+
@@ -3,9 +3,17 @@ from django.core.management import call_command
 from django.test import TestCase
 from django.utils.six import StringIO
 
+from app.ling.distances import get_index
+from app.ling.tiles import calculate_tile, get_tile_store
 from app.management.commands import extract_languages
 from app.models import Language
 
+import numpy as np
+
+import os
+import shutil
+import tempfile
+
 
 
 class ExtractLanguagesTestCase(TestCase):
@@ -154,3 +162,57 @@ class HarvestLanguageLocationsTestCase(TestCase):
 
 
 
+class PrecomputeTilesTestCase(TestCase):
+	fixtures = ['languages.json']
+	
+	def setUp(self):
+		self.stdout = StringIO()
+		self.stderr = StringIO()
+		
+		self.opts = {'stdout': self.stdout, 'stderr': self.stderr}
+		
+		self.root = tempfile.mkdtemp()
+	
+	def tearDown(self):
+		shutil.rmtree(self.root)
+	
+	def test_bad_options(self):
+		with self.settings(HONEYCOMB_TILES_ROOT=self.root):
+			for opts in ({'zoom': -1}, {'radii': 'far'}, {'sizes': '10,0'}):
+				opts.update(self.opts)
+				with self.assertRaises(CommandError):
+					call_command('precompute_tiles', **opts)
+		
+		with self.settings(HONEYCOMB_TILES_ROOT=None):
+			with self.assertRaises(CommandError):
+				call_command('precompute_tiles', **self.opts)
+		
+		with self.settings(HONEYCOMB_TILES_ROOT=self.root):
+			with self.assertRaises(CommandError):
+				call_command('precompute_tiles', zoom=9, **self.opts)
+		self.assertEqual(os.listdir(self.root), [])
+	
+	def test_command(self):
+		with self.settings(HONEYCOMB_TILES_ROOT=self.root, HONEYCOMB_TILE_SIZE=4):
+			call_command(
+				'precompute_tiles', zoom=1, radii='1000', sizes='10', **self.opts
+			)
+			self.assertEqual('', self.stderr.getvalue())
+			self.assertIn('Done: neighbourhood 10, zoom 1', self.stdout.getvalue())
+			
+			store = get_tile_store()
+			matrix = get_index().matrix
+			
+			for method, parameter in [('circle', 1000), ('neighbourhood', 10)]:
+				for z, x, y in [(0, 0, 0), (1, 0, 0), (1, 1, 0), (1, 1, 1)]:
+					tile = store.get(method, parameter, z, x, y)
+					self.assertEqual(tile.shape, (4, 4))
+					np.testing.assert_array_equal(
+						tile, calculate_tile(matrix, method, parameter, z, x, y, 4)
+					)
+			
+			self.assertIsNone(store.get('circle', 1000, 2, 0, 0))
+			self.assertIsNone(store.get('circle', 500, 0, 0, 0))
+
+
+
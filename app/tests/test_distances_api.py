@@ -0,0 +1,182 @@
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, TransactionTestCase
+
+from app.ling.distances import DistancesIndex, get_index
+from app.models import Language
+from utils.json import read_json
+
+import os
+import shutil
+import tempfile
+
+
+
+class DistancesApiTestCase(TransactionTestCase):
+	"""
+	TransactionTestCase, as the map is only invalidated once a change to the
+	languages is committed.
+	"""
+	fixtures = ['languages.json']
+	
+	def tearDown(self):
+		cache.clear()
+	
+	
+	def get_expected(self, iso_639_3):
+		"""
+		Reads berg.tsv the way the view used to.
+		"""
+		language = Language.objects.get(iso_639_3=iso_639_3)
+		codes = set(filter(None, [language.iso_639_1, language.iso_639_3]))
+		
+		d = {}
+		
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			for line in f.readlines()[1:]:
+				row = line.strip().split('\t')
+				code_one = row[2].split(':')[0]
+				code_two = row[3].split(':')[0]
+				
+				if code_one in codes:
+					another = code_two
+				elif code_two in codes:
+					another = code_one
+				else:
+					continue
+				
+				field = 'iso_639_1' if len(another) == 2 else 'iso_639_3'
+				try:
+					another = Language.objects.get(**{field: another})
+				except Language.DoesNotExist:
+					continue
+				
+				d[another.iso_639_3] = float(row[1])
+		
+		return d
+	
+	
+	def test_good(self):
+		for iso_code in ['fin', 'rus', 'ady']:
+			response = self.client.get(reverse('distances_api', args=[iso_code]))
+			self.assertEqual(response.status_code, 200)
+			
+			content = read_json(response.content)
+			self.assertEqual(content['distances'], self.get_expected(iso_code))
+			self.assertTrue(content['distances'])
+	
+	
+	def test_bad(self):
+		response = self.client.get(reverse('distances_api', args=['xxx']))
+		self.assertEqual(response.status_code, 404)
+		self.assertEqual(read_json(response.content)['error'], 'Language not found.')
+	
+	
+	def test_uppercase(self):
+		response = self.client.get(reverse('distances_api', args=['FIN']))
+		self.assertEqual(response.status_code, 200)
+	
+	
+	def test_new_language(self):
+		response = self.client.get(reverse('distances_api', args=['fin']))
+		self.assertNotIn('zzz', read_json(response.content)['distances'])
+		
+		Language.objects.filter(iso_639_3='est').update(iso_639_3='zzz')
+		Language.objects.get(iso_639_3='zzz').save()  # signals the change
+		
+		response = self.client.get(reverse('distances_api', args=['fin']))
+		self.assertIn('zzz', read_json(response.content)['distances'])
+
+
+
+class DistancesBatchApiTestCase(TestCase):
+	fixtures = ['languages.json']
+	
+	def tearDown(self):
+		cache.clear()
+	
+	
+	def test_codes(self):
+		response = self.client.get(
+			reverse('distances_batch_api'), {'codes': 'fin,est,RUS,fin,xal'}
+		)
+		self.assertEqual(response.status_code, 200)
+		
+		content = read_json(response.content)
+		self.assertEqual(content['languages'][:3], ['fin', 'est', 'rus'])
+		
+		n = len(content['languages'])
+		self.assertEqual(len(content['distances']), n * (n - 1) // 2)
+		
+		k = 0
+		for i in range(n):
+			response = self.client.get(
+				reverse('distances_api', args=[content['languages'][i]])
+			)
+			single = read_json(response.content)['distances']
+			
+			for j in range(i + 1, n):
+				self.assertEqual(
+					content['distances'][k], single.get(content['languages'][j])
+				)
+				k += 1
+	
+	
+	def test_bbox(self):
+		response = self.client.get(
+			reverse('distances_batch_api'), {'bbox': '55,20,70,35'}
+		)
+		self.assertEqual(response.status_code, 200)
+		
+		content = read_json(response.content)
+		self.assertIn('fin', content['languages'])
+		self.assertIn('lit', content['languages'])
+		self.assertEqual(content['languages'], sorted(content['languages']))
+		
+		n = len(content['languages'])
+		self.assertEqual(len(content['distances']), n * (n - 1) // 2)
+	
+	
+	def test_bad(self):
+		for get in [{}, {'codes': 'fin', 'bbox': '0,0,1,1'}, {'bbox': '0,0,1'},
+				{'bbox': 'a,b,c,d'}, {'bbox': '10,0,0,10'}]:
+			response = self.client.get(reverse('distances_batch_api'), get)
+			self.assertEqual(response.status_code, 400)
+		
+		response = self.client.get(reverse('distances_batch_api'), {'codes': 'fin,xxx'})
+		self.assertEqual(response.status_code, 404)
+
+
+
+class DistancesIndexTestCase(TestCase):
+	
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		self.file_path = os.path.join(self.temp_dir, 'berg.tsv')
+		shutil.copy('app/fixtures/berg.tsv', self.file_path)
+	
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+	
+	
+	def test_index(self):
+		index = DistancesIndex(self.file_path)
+		self.assertEqual(index.get_distances('sjd')['sms'], 0.4035)
+		self.assertEqual(index.get_distances('sms')['sjd'], 0.4035)
+		self.assertEqual(index.get_distances('xxx'), {})
+	
+	
+	def test_reload(self):
+		index = get_index(self.file_path)
+		self.assertIs(get_index(self.file_path), index)
+		
+		with open(self.file_path, 'a') as f:
+			f.write('0.1\t0.2\txxx:A\tyyy:B\n')
+		os.utime(self.file_path, (0, index.mtime + 1))
+		
+		new_index = get_index(self.file_path)
+		self.assertIsNot(new_index, index)
+		self.assertEqual(new_index.get_distances('xxx'), {'yyy': 0.2})
+
+
+
@@ -1,10 +1,13 @@
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from app.ling.word_matrix import WordMatrix
 from utils.json import read_json
 
+from unittest.mock import patch
+import io
+
 
 
 class FileApiTestCase(TestCase):
@@ -35,6 +38,74 @@ class FileApiTestCase(TestCase):
 		matrix.load(d['id'])
 		self.assertEqual(len(matrix.d), 2346)
 	
+	def test_same_upload(self):
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			response = self.client.post(reverse('file_api'), {'file': f})
+		storage_id = read_json(response.content)['id']
+		
+		with patch.object(WordMatrix, 'load_raw') as load_raw:
+			with open('app/fixtures/berg.tsv', 'r') as f:
+				response = self.client.post(reverse('file_api'), {'file': f})
+			self.assertFalse(load_raw.called)
+		
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(read_json(response.content)['id'], storage_id)
+		
+		"""
+		Same contents, different bytes.
+		"""
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			lines = f.readlines()
+		f = io.BytesIO(''.join(lines[:1] + lines[:0:-1]).replace('\n', '\r\n').encode())
+		f.name = 'reversed.tsv'
+		
+		response = self.client.post(reverse('file_api'), {'file': f})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(read_json(response.content)['id'], storage_id)
+		self.assertEqual(read_json(response.content)['name'], 'reversed.tsv')
+	
+	@override_settings(WORD_MATRIX_MAX_UPLOAD_SIZE=1024)
+	def test_big_upload(self):
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			response = self.client.post(
+				reverse('file_api'),
+				{'file': f}
+			)
+		
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(
+			read_json(response.content)['error'],
+			'The file exceeds the 1 KB limit.'
+		)
+	
+	@override_settings(WORD_MATRIX_MAX_LANGUAGES=10)
+	def test_too_many_languages(self):
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			response = self.client.post(
+				reverse('file_api'),
+				{'file': f}
+			)
+		
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(
+			read_json(response.content)['error'],
+			'The file exceeds the 10 languages limit.'
+		)
+	
+	@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+	def test_spooled_upload(self):
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			response = self.client.post(
+				reverse('file_api'),
+				{'file': f}
+			)
+		
+		self.assertEqual(response.status_code, 200)
+		
+		matrix = WordMatrix()
+		matrix.load(read_json(response.content)['id'])
+		self.assertEqual(len(matrix.d), 2346)
+	
 	def test_bad_upload(self):
 		with open('app/fixtures/languages.json', 'r') as f:
 			response = self.client.post(
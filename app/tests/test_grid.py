@@ -0,0 +1,130 @@
+from django.test import TestCase
+
+from hypothesis.strategies import floats, integers
+from hypothesis import given
+
+from app.ling.grid import HexGrid
+
+
+
+class HexGridTestCase(TestCase):
+	
+	def setUp(self):
+		self.spec = {
+			'north': 70, 'west': -30, 'zoom': 3,
+			'width': 800, 'height': 600, 'side': 20, 'orientation': 'flat'
+		}
+	
+	
+	def test_count_cells(self):
+		grid = HexGrid(self.spec)
+		self.assertEqual(grid.count_cells(), 36 * 15)
+		self.assertEqual(len(grid.get_cells()), 36 * 15)
+		
+		self.spec['orientation'] = 'pointy'
+		self.spec['width'], self.spec['height'] = 600, 800
+		grid = HexGrid(self.spec)
+		self.assertEqual(grid.count_cells(), 36 * 15)
+		self.assertEqual(len(grid.get_cells()), 36 * 15)
+	
+	
+	def test_get_cells(self):
+		cells = HexGrid(self.spec).get_cells()
+		
+		self.assertAlmostEqual(cells[0][0], 70)
+		self.assertAlmostEqual(cells[0][1], -30)
+		
+		"""
+		Along a flat row the latitude stays and the longitude grows by 3·side
+		pixels, i.e. 60 / 2048 of the world.
+		"""
+		for cell in cells[1:15]:
+			self.assertAlmostEqual(cell[0], 70)
+		
+		self.assertAlmostEqual(cells[1][1], -30 + 360 * 60 / 2048)
+		
+		"""
+		The odd rows start 1.5·side to the left and are further south.
+		"""
+		self.assertAlmostEqual(cells[15][1], -30 - 360 * 30 / 2048)
+		self.assertLess(cells[15][0], 70)
+		self.assertLess(cells[-1][0], cells[15][0])
+	
+	
+	def test_pointy(self):
+		self.spec['orientation'] = 'pointy'
+		cells = HexGrid(self.spec).get_cells()
+		
+		for cell in cells[1:10]:
+			self.assertAlmostEqual(cell[1], -30)
+			self.assertLess(cell[0], 70)
+	
+	
+	def test_beyond_the_map(self):
+		"""
+		Past ±180° the grid is that of the wrapped corner.
+		"""
+		cells = HexGrid(self.spec).get_cells()
+		
+		for west in (330, -390, 690):
+			self.spec['west'] = west
+			for cell, other in zip(HexGrid(self.spec).get_cells(), cells):
+				self.assertAlmostEqual(cell[0], other[0])
+				self.assertAlmostEqual(cell[1], other[1])
+		
+		"""
+		Past ±85.05° the corner is still a point of the projection, so the
+		rows which are on the map are where the frontend draws them.
+		"""
+		self.spec.update({'north': 89.5, 'west': 170, 'zoom': 0})
+		grid = HexGrid(self.spec)
+		self.assertLess(grid.origin[1], 0)
+		
+		for latitude, longitude in grid.get_cells():
+			self.assertTrue(-180 <= longitude < 180)
+			x, y = grid.project(latitude, longitude)
+			self.assertGreaterEqual(y - grid.origin[1], -1e-6)
+		
+		self.spec['north'] = 90
+		self.assertEqual(HexGrid(self.spec).count_cells(), grid.count_cells())
+	
+	
+	def test_bad_spec(self):
+		for key, value in [
+			('north', 91), ('north', 'north'), ('zoom', -1), ('width', 0),
+			('height', None), ('side', 0.5), ('west', float('inf'))
+		]:
+			spec = dict(self.spec)
+			spec[key] = value
+			with self.assertRaisesRegex(ValueError, 'Invalid grid.'):
+				HexGrid(spec)
+		
+		spec = dict(self.spec)
+		spec['orientation'] = 'round'
+		with self.assertRaisesRegex(ValueError, 'Invalid grid orientation.'):
+			HexGrid(spec)
+		
+		spec = dict(self.spec)
+		del spec['side']
+		with self.assertRaisesRegex(ValueError, 'Invalid grid.'):
+			HexGrid(spec)
+		
+		with self.assertRaisesRegex(ValueError, 'Invalid grid.'):
+			HexGrid([70, -30])
+	
+	
+	@given(
+		floats(min_value=-89.0, max_value=89.0),
+		floats(min_value=-180.0, max_value=180.0),
+		integers(min_value=0, max_value=18)
+	)
+	def test_project_unproject(self, latitude, longitude, zoom):
+		self.spec['zoom'] = zoom
+		grid = HexGrid(self.spec)
+		
+		result = grid.unproject(*grid.project(latitude, longitude))
+		self.assertAlmostEqual(result[0], latitude, places=6)
+		self.assertAlmostEqual(result[1], longitude, places=6)
+
+
+
@@ -1,12 +1,18 @@
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from hypothesis.strategies import floats, integers, lists, tuples
 from hypothesis import given
 
-from app.ling.honeycomb import Honeycomb
+from app.ling.honeycomb import Honeycomb, cell_cache, get_cell_size
+from app.ling.map import Map, get_map
+from app.ling.point import Point
 from app.ling.word_matrix import WordMatrix
 
+import numpy as np
+
+import threading
+
 
 
 class HoneycombTestCase(TestCase):
@@ -37,6 +43,43 @@ class HoneycombTestCase(TestCase):
 			self.assertLessEqual(cell[2], 1)
 	
 	
+	def test_sliding_circles(self):
+		cells = [
+			[latitude / 2, longitude / 2]
+			for latitude in range(80, 141, 3) for longitude in range(0, 121, 4)
+		]
+		
+		temperatures = Honeycomb(cells).calculate('circle', self.matrix, 1000)
+		self.assertTrue(any(temperatures))
+		
+		planet = get_map()
+		
+		for cell, temperature in zip(cells, temperatures):
+			if len(planet.get_in_radius(cell[0], cell[1], 1000)) < 6:
+				self.assertEqual(temperature, 0)
+				continue
+			
+			_, p = Point(*cell).get_swadeshness_in_radius(self.matrix, 1000)
+			self.assertAlmostEqual(temperature, p, places=4)
+		
+		"""
+		The result does not depend on the way the circles have slid.
+		"""
+		self.assertEqual(
+			Honeycomb(cells[::-1]).calculate('circle', self.matrix, 1000),
+			temperatures[::-1]
+		)
+	
+	
+	def test_impossible_cells(self):
+		cells = [[95, 50], [55, 500], [float('nan'), 50], [55, 50]]
+		
+		for method, parameter in [('circle', 1000), ('neighbourhood', 10)]:
+			temperatures = Honeycomb(cells).calculate(method, self.matrix, parameter)
+			self.assertEqual(temperatures[:3], [0, 0, 0])
+			self.assertNotEqual(temperatures[3], 0)
+	
+	
 	def test_calculate_on_neighbourhoods(self):
 		honeycomb = Honeycomb(self.cells)
 		
@@ -51,6 +94,168 @@ class HoneycombTestCase(TestCase):
 			self.assertLessEqual(cell[2], 1)
 	
 	
+	def test_results_cache(self):
+		cell_cache.clear()
+		self.matrix.save()
+		
+		cells = [[65, -22], [55, 50], [43, 42]]
+		expected = Honeycomb(cells).calculate('circle', self.matrix, 1000)
+		self.assertEqual(len(cell_cache), 3)
+		
+		stats = cell_cache.get_stats()
+		self.assertEqual(stats['size'], sum([get_cell_size(value) for value in expected]))
+		
+		cells = [[43.00001, 42.00001], [0, 0], [55, 50]]
+		temperatures = Honeycomb(cells).calculate('circle', self.matrix, 1000)
+		self.assertEqual(temperatures, [expected[2], 0, expected[1]])
+		
+		self.assertEqual(cell_cache.get_stats()['hits'], stats['hits'] + 2)
+		self.assertEqual(cell_cache.get_stats()['misses'], stats['misses'] + 1)
+		self.assertEqual(len(cell_cache), 4)
+		
+		Honeycomb(cells).calculate('circle', self.matrix, 500)
+		Honeycomb(cells).calculate('neighbourhood', self.matrix, 1000)
+		self.assertEqual(len(cell_cache), 10)
+	
+	
+	def test_calculate_in_parallel(self):
+		cells = [
+			[latitude, longitude]
+			for latitude in range(-60, 80, 10) for longitude in range(-180, 180, 15)
+		]
+		
+		for method, parameter in [('circle', 1000), ('neighbourhood', 10)]:
+			expected = Honeycomb(cells).calculate(method, self.matrix, parameter)
+			self.assertEqual(len(expected), len(cells))
+			self.assertTrue(any(expected))
+			
+			with override_settings(HONEYCOMB_WORKERS=3, HONEYCOMB_CHUNK_SIZE=25):
+				honeycomb = Honeycomb(cells)
+				self.assertEqual(
+					honeycomb.calculate(method, self.matrix, parameter), expected
+				)
+				
+				honeycomb = Honeycomb([list(cell) for cell in cells[:2]])
+				self.assertEqual(
+					honeycomb.calculate(method, self.matrix, parameter), expected[:2]
+				)
+				
+				results = []
+				thread = threading.Thread(target=lambda: results.append(
+					Honeycomb(cells).calculate(method, self.matrix, parameter)
+				))
+				thread.start()
+				thread.join()
+				self.assertEqual(results, [expected])
+	
+	
+	def test_get_curve_order(self):
+		"""
+		With 2 bits the plane is split into 4 × 4 squares and the curve visits
+		each of them once, moving to an adjacent square at each step.
+		"""
+		cells = [
+			[latitude, longitude]
+			for latitude in (-67.5, -22.5, 22.5, 67.5)
+			for longitude in (-135, -45, 45, 135)
+		]
+		
+		order = Honeycomb.get_curve_order(cells, bits=2)
+		self.assertEqual(sorted(order), list(range(16)))
+		self.assertEqual(cells[order[0]], [-67.5, -135])
+		self.assertEqual(cells[order[-1]], [-67.5, 135])
+		
+		for one, two in zip(order, order[1:]):
+			self.assertEqual(
+				abs(cells[one][0] - cells[two][0]) / 45 + abs(cells[one][1] - cells[two][1]) / 90, 1
+			)
+		
+		self.assertEqual(Honeycomb.get_curve_order([]), [])
+		self.assertEqual(Honeycomb.get_curve_order([['a', 'b'], [0, 0]]), [0, 1])
+		self.assertEqual(
+			sorted(Honeycomb.get_curve_order([[float('nan'), 0], [90, 180], [-90, -180]])),
+			[0, 1, 2]
+		)
+	
+	
+	def test_calculate_in_curve_order(self):
+		cells = [
+			[latitude, longitude]
+			for latitude in range(-60, 80, 10) for longitude in range(-180, 180, 15)
+		]
+		shuffled = [cells[key] for key in np.random.RandomState(42).permutation(len(cells))]
+		
+		for method, parameter in [('circle', 1000), ('neighbourhood', 10)]:
+			expected = {
+				tuple(cell): temperature for cell, temperature in zip(
+					cells, Honeycomb(cells).calculate(method, self.matrix, parameter)
+				)
+			}
+			
+			temperatures = Honeycomb(shuffled).calculate(method, self.matrix, parameter)
+			self.assertEqual(temperatures, [expected[tuple(cell)] for cell in shuffled])
+	
+	
+	@override_settings(HONEYCOMB_STREAM_BATCH_SIZE=4)
+	def test_iter_calculate(self):
+		cells = [
+			[latitude, longitude]
+			for latitude in range(40, 71, 5) for longitude in range(20, 61, 10)
+		]
+		
+		honeycomb = Honeycomb([list(cell) for cell in cells])
+		honeycomb.calculate_on_circles(self.matrix, 1000)
+		expected = {tuple(cell[:2]): cell[2] for cell in honeycomb.cells}
+		
+		for method, expected in [
+			('circle', expected),
+			('neighbourhood', {
+				tuple(cell[:2]): cell[2]
+				for cell in Honeycomb([list(cell) for cell in cells])
+					.calculate_on_neighbourhoods(self.matrix, 10)
+			}),
+		]:
+			honeycomb = Honeycomb([list(cell) for cell in cells])
+			
+			if method == 'circle':
+				batches = list(honeycomb.iter_on_circles(self.matrix, 1000))
+			else:
+				batches = list(honeycomb.iter_on_neighbourhoods(self.matrix, 10))
+			
+			self.assertEqual([len(batch) for batch in batches], [4] * 8 + [3])
+			self.assertEqual(
+				{tuple(cell[:2]): cell[2] for batch in batches for cell in batch},
+				expected
+			)
+			
+			self.assertEqual(batches[0][0][:2], [55, 40])
+			self.assertEqual(len(honeycomb.cells[0]), 3)
+	
+	
+	def test_get_order(self):
+		cells = [[0, 0], [10, 10], [5, 5], [0, 10], [5, 6]]
+		order = Honeycomb(cells).get_order()
+		
+		self.assertEqual(sorted(order), list(range(5)))
+		self.assertEqual(order[:2], [2, 4])
+		
+		distances = [Map.great_circle((5, 5), cells[key]) for key in order]
+		self.assertEqual(distances, sorted(distances))
+		
+		self.assertEqual(Honeycomb([]).get_order(), [])
+		self.assertEqual(Honeycomb([['a', 'b'], [0, 0]]).get_order(), [0, 1])
+		
+		"""
+		Across the antimeridian the centre is at ±180, not at 0.
+		"""
+		cells = [[0, 170], [0, -170], [0, 179], [0, -175], [10, 175]]
+		order = Honeycomb(cells).get_order()
+		self.assertEqual(order[0], 2)
+		
+		distances = [Map.great_circle((5, 180), cells[key]) for key in order]
+		self.assertEqual(distances, sorted(distances))
+	
+	
 	@given(
 		lists(
 			elements=tuples(
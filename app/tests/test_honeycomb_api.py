@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
@@ -5,9 +6,19 @@ from django.test import TestCase
 from hypothesis.strategies import floats, integers, lists, sampled_from, tuples
 from hypothesis import given
 
-from app.ling.word_matrix import WordMatrix
+from app.ling.grid import HexGrid
+from app.ling.map import VERSION_KEY
+from app.ling.tiles import TileStore
+from app.ling.word_matrix import WordMatrix, matrix_cache
 from utils.json import make_json, read_json
 
+import numpy as np
+
+from urllib.parse import urlencode
+import shutil
+import tempfile
+import time
+
 
 
 class HoneycombApiTestCase(TestCase):
@@ -77,6 +88,354 @@ class HoneycombApiTestCase(TestCase):
 			self.assertLessEqual(cell[2], 1)
 	
 	
+	def test_stream(self):
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		cells = read_json(response.content)['cells']
+		
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream',
+			HTTP_ACCEPT='application/x-ndjson'
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+		self.assertIn('ETag', response)
+		
+		content = b''.join(response.streaming_content).decode()
+		self.assertTrue(content.endswith('\n'))
+		
+		streamed = [
+			cell for line in content.splitlines() for cell in read_json(line)
+		]
+		self.assertEqual(sorted(streamed), sorted(cells))
+	
+	
+	def test_binary(self):
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		temperatures = [cell[2] for cell in read_json(response.content)['cells']]
+		
+		url = reverse('honeycomb_api') + '?' + urlencode({
+			'id': self.post['id'],
+			'method': self.post['method'],
+			'parameter': self.post['parameter']
+		})
+		
+		for content_type, dtype in [
+			('application/x-honeycomb-float32', '<f4'),
+			('application/x-honeycomb-float64', '<f8'),
+		]:
+			response = self.client.post(
+				url,
+				np.array(self.post['cells'], dtype=dtype).tobytes(),
+				content_type=content_type
+			)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response['Content-Type'], 'application/x-honeycomb-temperatures')
+			
+			received = np.frombuffer(response.content, dtype='<f4')
+			self.assertTrue(np.allclose(received, temperatures, atol=1e-6))
+			
+			etag = response['ETag']
+		
+		response = self.client.post(
+			url,
+			np.array(self.post['cells'], dtype='<f8').tobytes(),
+			content_type='application/x-honeycomb-float64',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 304)
+		
+		"""
+		An expired matrix is a 404, whatever the tag.
+		"""
+		cache.clear()
+		matrix_cache.clear()
+		
+		response = self.client.post(
+			url,
+			np.array(self.post['cells'], dtype='<f8').tobytes(),
+			content_type='application/x-honeycomb-float64',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 404)
+	
+	
+	def test_binary_bad(self):
+		good = {'id': self.post['id'], 'method': 'circle', 'parameter': 1000}
+		cells = np.array(self.post['cells'], dtype='<f4').tobytes()
+		
+		for query, body in [
+			(dict(good, method='nonsense'), cells),
+			(dict(good, parameter='-1'), cells),
+			(dict(good, parameter='a'), cells),
+			(dict(good, extra='1'), cells),
+			({'id': self.post['id']}, cells),
+			(good, cells[:-1]),
+			(good, np.array([[np.nan, 0]], dtype='<f4').tobytes()),
+			(good, np.zeros((10001, 2), dtype='<f4').tobytes()),
+		]:
+			response = self.client.post(
+				reverse('honeycomb_api') + '?' + urlencode(query),
+				body,
+				content_type='application/x-honeycomb-float32'
+			)
+			self.assertEqual(response.status_code, 400)
+			self.assertIn('error', read_json(response.content))
+		
+		response = self.client.post(
+			reverse('honeycomb_api') + '?' + urlencode(dict(good, id='matrix_nonsense')),
+			cells,
+			content_type='application/x-honeycomb-float32'
+		)
+		self.assertEqual(response.status_code, 404)
+	
+	
+	def test_grid(self):
+		grid = {
+			'north': 70, 'west': 20, 'zoom': 3,
+			'width': 300, 'height': 200, 'side': 20, 'orientation': 'flat'
+		}
+		cells = HexGrid(grid).get_cells()
+		
+		del self.post['cells']
+		self.post['grid'] = grid
+		
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 200)
+		
+		content = read_json(response.content)
+		self.assertEqual(len(content['cells']), len(cells))
+		
+		for key, cell in enumerate(content['cells']):
+			self.assertAlmostEqual(cell[0], cells[key][0])
+			self.assertAlmostEqual(cell[1], cells[key][1])
+			self.assertGreaterEqual(cell[2], -1)
+			self.assertLessEqual(cell[2], 1)
+		
+		self.assertTrue(any([cell[2] != 0 for cell in content['cells']]))
+		
+		self.post['cells'] = cells
+		del self.post['grid']
+		
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(read_json(response.content), content)
+	
+	
+	def test_grid_bad(self):
+		grid = {
+			'north': 70, 'west': 20, 'zoom': 3,
+			'width': 300, 'height': 200, 'side': 20, 'orientation': 'flat'
+		}
+		
+		self.post['grid'] = grid
+		response = self.client.post(
+			reverse('honeycomb_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 400)
+		
+		del self.post['cells']
+		
+		for key, value in [
+			('orientation', 'round'), ('side', 0), ('width', -1), ('zoom', None)
+		]:
+			self.post['grid'] = dict(grid)
+			self.post['grid'][key] = value
+			
+			response = self.client.post(
+				reverse('honeycomb_api'),
+				make_json(self.post),
+				content_type='application/octet-stream'
+			)
+			self.assertEqual(response.status_code, 400)
+			self.assertIn('grid', read_json(response.content)['error'])
+		
+		self.post['grid'] = grid
+		with self.settings(HONEYCOMB_MAX_GRID_CELLS=10):
+			response = self.client.post(
+				reverse('honeycomb_api'),
+				make_json(self.post),
+				content_type='application/octet-stream'
+			)
+		self.assertEqual(response.status_code, 400)
+	
+	
+	def test_jobs(self):
+		response = self.client.post(
+			reverse('honeycomb_jobs_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 202)
+		
+		job_id = read_json(response.content)['id']
+		url = reverse('honeycomb_job_api', args=[job_id])
+		
+		for i in range(600):
+			content = read_json(self.client.get(url).content)
+			if content['status'] != 'running':
+				break
+			time.sleep(0.1)
+		
+		self.assertEqual(content['status'], 'done')
+		self.assertEqual(content['total'], 3)
+		self.assertEqual(content['done'], 3)
+		self.assertEqual(len(content['cells']), 3)
+		
+		response = self.client.get(url, {'since': 2})
+		self.assertEqual(read_json(response.content)['cells'], content['cells'][2:])
+		
+		response = self.client.delete(url)
+		self.assertEqual(response.status_code, 200)
+		
+		response = self.client.get(reverse('honeycomb_job_api', args=['abc']))
+		self.assertEqual(response.status_code, 404)
+		
+		response = self.client.delete(reverse('honeycomb_job_api', args=['abc']))
+		self.assertEqual(response.status_code, 404)
+	
+	
+	def test_jobs_bad(self):
+		self.post['method'] = 'nonsense'
+		response = self.client.post(
+			reverse('honeycomb_jobs_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 400)
+		
+		self.post['method'] = 'circle'
+		self.post['id'] = 'matrix_nonsense'
+		response = self.client.post(
+			reverse('honeycomb_jobs_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 404)
+		
+		response = self.client.post(
+			reverse('honeycomb_jobs_api'),
+			np.array([65, -22], dtype='<f4').tobytes(),
+			content_type='application/x-honeycomb-float32'
+		)
+		self.assertEqual(response.status_code, 415)
+		self.assertIn('error', read_json(response.content))
+	
+	
+	def test_tile(self):
+		root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, root)
+		
+		url = reverse('honeycomb_tile_api', args=['circle', 1000, 1, 1, 0])
+		
+		with self.settings(HONEYCOMB_TILES_ROOT=root, HONEYCOMB_TILE_SIZE=4):
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response['Content-Type'], 'application/x-honeycomb-temperatures')
+			self.assertEqual(response['Cache-Control'], 'public, no-cache')
+			
+			live = np.frombuffer(response.content, dtype='<f4')
+			self.assertEqual(live.shape, (16,))
+			self.assertTrue(np.any(live != 0))
+			
+			response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+			self.assertEqual(response.status_code, 304)
+			
+			response = self.client.get(url, {'id': self.post['id']})
+			self.assertEqual(response.status_code, 200)
+			self.assertTrue(np.allclose(np.frombuffer(response.content, dtype='<f4'), live))
+			
+			level = np.zeros((2, 2, 4, 4))
+			level[0, 1] = 0.5
+			TileStore(root).save('circle', 1000, 1, level.reshape((-1, 4, 4)), 4)
+			
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+			self.assertEqual(np.frombuffer(response.content, dtype='<f4').tolist(), [0.5] * 16)
+			
+			etag = response['ETag']
+			response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(response.status_code, 304)
+			
+			"""
+			Changing the languages changes the tags of the precomputed tiles too.
+			"""
+			cache.delete(VERSION_KEY)
+			response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(response.status_code, 200)
+			self.assertNotEqual(response['ETag'], etag)
+			
+			"""
+			Uploaded matrices are always calculated.
+			"""
+			response = self.client.get(url, {'id': self.post['id']})
+			self.assertTrue(np.allclose(np.frombuffer(response.content, dtype='<f4'), live))
+	
+	
+	def test_tile_bad(self):
+		for args in [
+			['circle', 0, 1, 0, 0], ['circle', 1000, 1, 2, 0], ['circle', 1000, 1, 0, 2],
+			['neighbourhood', 10, 19, 0, 0]
+		]:
+			response = self.client.get(reverse('honeycomb_tile_api', args=args))
+			self.assertEqual(response.status_code, 400)
+		
+		url = reverse('honeycomb_tile_api', args=['circle', 1000, 1, 1, 0])
+		
+		response = self.client.get(url, {'id': ''})
+		self.assertEqual(response.status_code, 400)
+		
+		response = self.client.get(url, {'id': 'matrix_nonsense'})
+		self.assertEqual(response.status_code, 404)
+	
+	
+	def test_stats(self):
+		for i in range(2):
+			self.client.post(
+				reverse('honeycomb_api'),
+				make_json(self.post),
+				content_type='application/octet-stream'
+			)
+		
+		response = self.client.get(reverse('honeycomb_stats_api'))
+		self.assertEqual(response.status_code, 200)
+		
+		content = read_json(response.content)
+		self.assertIn('cells', content)
+		for key in ('entries', 'size', 'max_size', 'hits', 'misses', 'evictions'):
+			self.assertIn(key, content['cells'])
+		self.assertGreaterEqual(content['cells']['hits'], len(self.post['cells']))
+		self.assertEqual(content['cells']['max_size'], settings.HONEYCOMB_CACHE_BYTES)
+		self.assertGreater(content['cells']['size'], content['cells']['entries'])
+		
+		self.assertIn('matrices', content)
+		self.assertGreaterEqual(content['matrices']['hits'], 2)
+		self.assertGreaterEqual(content['matrices']['entries'], 1)
+		
+		self.assertIn('candidates', content)
+		self.assertGreaterEqual(content['candidates']['entries'], 1)
+	
+	
 	@given(
 		lists(max_size=500, elements=tuples(
 			floats(min_value=-90.0, max_value=90.0),
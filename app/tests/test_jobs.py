@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from app.ling.honeycomb import Honeycomb
+from app.ling.jobs import HoneycombJob
+from app.ling.word_matrix import WordMatrix
+
+from unittest.mock import patch
+
+
+
+class HoneycombJobTestCase(TestCase):
+	fixtures = ['languages.json']
+	
+	def setUp(self):
+		self.matrix = WordMatrix()
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			self.matrix.load_raw(f)
+		
+		self.cells = [[65, -22], [55, 50], [-15, -70], [43, 42], [60, 25]]
+	
+	def tearDown(self):
+		cache.clear()
+	
+	
+	@override_settings(HONEYCOMB_JOB_BATCH_SIZE=2)
+	def test_submit(self):
+		for method, parameter in [('circle', 1000), ('neighbourhood', 10)]:
+			job = HoneycombJob.submit(self.matrix, self.cells, method, parameter)
+			job.future.result(timeout=60)
+			
+			honeycomb = Honeycomb([list(cell) for cell in self.cells])
+			if method == 'circle':
+				honeycomb.calculate_on_circles(self.matrix, parameter)
+			else:
+				honeycomb.calculate_on_neighbourhoods(self.matrix, parameter)
+			
+			state = job.get_state()
+			self.assertEqual(state['status'], 'done')
+			self.assertEqual(state['total'], 5)
+			self.assertEqual(state['done'], 5)
+			self.assertEqual(state['batch_size'], 2)
+			self.assertNotIn('cells', state)
+			
+			self.assertEqual(job.get_cells(state), honeycomb.cells)
+			for since in range(7):
+				self.assertEqual(job.get_cells(state, since), honeycomb.cells[since:])
+			
+			self.assertEqual(len(cache.get(job.get_batch_key(2))), 1)
+			cache.delete(job.get_batch_key(1))
+			self.assertEqual(job.get_cells(state, 1), honeycomb.cells[1:2])
+			self.assertEqual(job.get_cells(state, 4), honeycomb.cells[4:])
+		
+		self.assertEqual(self.cells[0], [65, -22])
+	
+	
+	@override_settings(HONEYCOMB_JOB_BATCH_SIZE=2)
+	def test_progress_and_cancel(self):
+		job = HoneycombJob('42')
+		self.assertIsNone(job.get_state())
+		self.assertFalse(job.cancel())
+		
+		state = {'status': 'running', 'total': 5, 'done': 0, 'batch_size': 2}
+		job.set_state(state)
+		
+		states = []
+		
+		def is_cancelled():
+			states.append(job.get_state()['done'])
+			return len(states) == 3
+		
+		with patch.object(job, 'is_cancelled', is_cancelled):
+			job.run(state, self.matrix, self.cells, 'circle', 1000)
+		
+		self.assertEqual(states, [0, 2, 4])
+		
+		state = job.get_state()
+		self.assertEqual(state['status'], 'cancelled')
+		self.assertEqual(state['done'], 4)
+		self.assertEqual(len(job.get_cells(state)), 4)
+		
+		self.assertTrue(job.cancel())
+		self.assertTrue(job.is_cancelled())
+	
+	
+	def test_failure(self):
+		job = HoneycombJob('42')
+		state = {'status': 'running', 'total': 5, 'done': 0, 'batch_size': 2}
+		
+		with patch.object(Honeycomb, 'calculate', side_effect=RuntimeError):
+			with self.assertLogs('kalakukko.error'):
+				job.run(state, self.matrix, self.cells, 'circle', 1000)
+		
+		self.assertEqual(job.get_state()['status'], 'failed')
+
+
+
@@ -0,0 +1,95 @@
+from django.test import TestCase
+
+from hypothesis.strategies import floats, integers, lists, tuples
+from hypothesis import given, assume
+
+from app.ling.kd_tree import KdTree
+from app.ling.map import Map
+
+
+
+class KdTreeTestCase(TestCase):
+	def setUp(self):
+		self.data = [
+			((0, 0, 1), 'north'), ((0, 0, -1), 'south'),
+			((1, 0, 0), 'zero'), ((-1, 0, 0), 'antimeridian'),
+			((0, 1, 0), 'east'), ((0, -1, 0), 'west')
+		]
+	
+	def test_init(self):
+		tree = KdTree(self.data)
+		self.assertIn('points', tree.tree)
+		
+		tree = KdTree(self.data * 2)
+		self.assertIn('axis', tree.tree)
+		self.assertIn('points', tree.tree['left'])
+		self.assertIn('points', tree.tree['right'])
+		
+		with self.assertRaises(ValueError):
+			KdTree([])
+		
+		with self.assertRaises(ValueError):
+			KdTree([((0, 0), 'flat')])
+		
+		with self.assertRaises(ValueError):
+			KdTree([1, 'one'])
+	
+	def test_search(self):
+		tree = KdTree(self.data)
+		
+		self.assertEqual(tree.search((0, 0, 1), 0.1), set(['north']))
+		self.assertEqual(tree.search((0, 0, 1), 1.5), set([
+			'north', 'zero', 'antimeridian', 'east', 'west'
+		]))
+		self.assertEqual(tree.search((0, 0, 1), 2), set([
+			i[1] for i in self.data
+		]))
+		self.assertEqual(tree.search((0, 0, 1), -1), set())
+	
+	def test_nearest(self):
+		tree = KdTree(self.data)
+		
+		self.assertEqual(tree.nearest((0.1, 0, 0.9), 2), ['north', 'zero'])
+		self.assertEqual(tree.nearest((0.1, 0, 0.9), 2, 0.5), ['north'])
+		self.assertEqual(tree.nearest((0.1, 0, 0.9), 0), [])
+		self.assertEqual(len(tree.nearest((0.1, 0, 0.9), 42)), 6)
+	
+	@given(
+		lists(elements=tuples(
+			floats(min_value=-90.0, max_value=90.0),
+			floats(min_value=-180.0, max_value=180.0)
+		)),
+		floats(min_value=-90.0, max_value=90.0),
+		floats(min_value=-180.0, max_value=180.0),
+		floats(min_value=1e-6, max_value=2.0),
+		integers(min_value=1, max_value=42)
+	)
+	def test_against_brute_force(self, coords, latitude, longitude, r, k):
+		"""
+		The radius is kept away from 0, where it underflows when squared; the
+		nearest are compared by distance, as points may be duplicated.
+		"""
+		assume(len(coords) > 0)
+		
+		points = [Map.to_cartesian(*i) for i in coords]
+		tree = KdTree([(point, key) for key, point in enumerate(points)])
+		
+		centre = Map.to_cartesian(latitude, longitude)
+		distances = sorted([
+			(KdTree.distance(point, centre), key)
+			for key, point in enumerate(points)
+		])
+		
+		self.assertEqual(
+			tree.search(centre, r),
+			set([key for d, key in distances if d <= r ** 2])
+		)
+		
+		nearest = tree.nearest(centre, k)
+		self.assertEqual(len(nearest), len(distances[:k]))
+		
+		for key, (d, _) in zip(nearest, distances[:k]):
+			self.assertAlmostEqual(KdTree.distance(points[key], centre), d, places=12)
+
+
+
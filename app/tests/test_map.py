@@ -1,11 +1,16 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
 
 from geopy.distance import great_circle
 
 from hypothesis.strategies import floats, integers, tuples
 from hypothesis import given, assume
 
-from app.ling.map import Map, MapError
+from app.ling.map import Map, MapError, get_lookup_size, get_map, get_map_version
+from app.models import Language
+
+import numpy as np
 
 
 
@@ -27,6 +32,28 @@ class MapStaticTestCase(TestCase):
 		)
 	
 	
+	def test_great_circle_of_identical_points(self):
+		for a in [(0, 0), (42.01, 42.01), (-89.99, 179.99), (55.75, 37.616667)]:
+			self.assertEqual(Map.great_circle(a, a), 0)
+	
+	
+	@given(
+		tuples(
+			floats(min_value=-90.0, max_value=90.0), floats(min_value=-180.0, max_value=180)
+		),
+		tuples(
+			floats(min_value=-90.0, max_value=90.0), floats(min_value=-180.0, max_value=180)
+		)
+	)
+	def test_haversine(self, a, b):
+		d = Map.haversine(
+			np.radians([a[0]]), np.radians([a[1]]), np.cos(np.radians([a[0]])),
+			np.radians([b[0]]), np.radians([b[1]]), np.cos(np.radians([b[0]]))
+		)
+		self.assertEqual(d.shape, (1,))
+		self.assertAlmostEqual(d[0], Map.great_circle(a, b), places=6)
+	
+	
 	@given(
 		tuples(
 			floats(min_value=-90.0, max_value=90.0), floats(min_value=-180.0, max_value=180)
@@ -123,6 +150,34 @@ class MapTestCase(TestCase):
 		self.assertEqual(elbrus, [
 			'ab', 'os', 'ka', 'ady', 'ddo', 'ce', 'hy', 'dar'
 		])
+		
+		andes = self.map.get_nearest(-15, -70, 5)
+		self.assertEqual(len(andes), 5)
+		
+		everything = self.map.get_nearest(0, 0, 420)
+		self.assertEqual(len(everything), len(self.map.languages))
+	
+	
+	@given(
+		floats(min_value=-90.0, max_value=90.0),
+		floats(min_value=-180.0, max_value=180.0),
+		integers(min_value=1, max_value=42)
+	)
+	def test_get_nearest_is_exact(self, latitude, longitude, k):
+		origin = (latitude, longitude)
+		distances = sorted([
+			(Map.great_circle(origin, coords), iso_code)
+			for iso_code, coords in self.map.languages.items()
+		])
+		
+		nearest = self.map.get_nearest(latitude, longitude, k)
+		self.assertEqual(len(nearest), min(k, len(distances)))
+		
+		for key, iso_code in enumerate(nearest):
+			self.assertAlmostEqual(
+				Map.great_circle(origin, self.map.languages[iso_code]),
+				distances[key][0], places=6
+			)
 	
 	
 	@given(
@@ -186,6 +241,140 @@ class MapTestCase(TestCase):
 		self.assertEqual(andes, set())
 	
 	
+	def test_get_in_bounds(self):
+		for south, west, north, east in [
+			(40, 40, 45, 50), (-90, -180, 90, 180), (60, 170, 75, -170), (0, 0, 0, 0)
+		]:
+			self.assertEqual(
+				self.map.get_in_bounds(south, west, north, east),
+				set([
+					iso_code for iso_code, (latitude, longitude) in self.map.languages.items()
+					if south <= latitude <= north and (
+						west <= longitude <= east if west <= east
+						else longitude >= west or longitude <= east
+					) and south < north and west != east
+				])
+			)
+		
+		for bounds in [(50, 0, 40, 10), (-91, 0, 0, 10), (0, 0, 10, 181)]:
+			with self.assertRaises(MapError):
+				self.map.get_in_bounds(*bounds)
+	
+	
+	def test_get_distances(self):
+		origins = [(43, 42), (65, -22), (-15, -70), (89.9, 0)]
+		
+		distances = self.map.get_distances(origins)
+		self.assertEqual(distances.shape, (4, len(self.map.codes)))
+		
+		for i, origin in enumerate(origins):
+			for j, iso_code in enumerate(self.map.codes):
+				self.assertAlmostEqual(
+					distances[i, j],
+					Map.great_circle(origin, self.map.languages[iso_code]),
+					places=6
+				)
+		
+		distances = self.map.get_distances([self.map.languages['is']], ['is', 'fi'])
+		self.assertEqual(distances.shape, (1, 2))
+		self.assertEqual(distances[0, 0], 0)
+		
+		distances = self.map.get_distances([(43, 42)], [])
+		self.assertEqual(distances.shape, (1, 0))
+	
+	
+	def test_get_in_radius_near_poles(self):
+		for latitude, longitude, radius in [
+			(85, 0, 3000), (-89, 42, 5000), (65, 179, 2500), (43, 42, 19000)
+		]:
+			origin = (latitude, longitude)
+			self.assertEqual(
+				self.map.get_in_radius(latitude, longitude, radius),
+				set([
+					iso_code for iso_code, coords in self.map.languages.items()
+					if Map.great_circle(origin, coords) <= radius
+				])
+			)
+	
+	
+	def test_invalid_coords(self):
+		for latitude, longitude in [(95, 0), (-90.5, 0), (0, -200), (0, 1000), (float('nan'), 0)]:
+			with self.assertRaises(MapError):
+				self.map.get_in_radius(latitude, longitude, 1000)
+			
+			with self.assertRaises(MapError):
+				self.map.get_nearest(latitude, longitude, 5)
+			
+			with self.assertRaises(MapError):
+				self.map.get_single_nearest(latitude, longitude)
+			
+			self.assertEqual(self.map.get_in_radius_all([(latitude, longitude)], 1000), [set()])
+	
+	
+	def test_get_in_radius_all(self):
+		origins = [
+			(65, -22), (55, 50), (55.5, 50.5), (-15, -70), (85, 0), (85.3, 179.9),
+			(43, 42), (43.2, 41.8), (float('nan'), 0)
+		]
+		
+		for radius in (1, 500, 1000, 3000):
+			circles = self.map.get_in_radius_all(origins, radius)
+			self.assertEqual(len(circles), len(origins))
+			
+			for origin, languages in zip(origins[:-1], circles):
+				self.assertEqual(languages, self.map.get_in_radius(*origin, radius))
+			
+			self.assertEqual(circles[-1], set())
+		
+		self.assertEqual(self.map.get_in_radius_all([], 1000), [])
+	
+	
+	def test_get_nearest_cached(self):
+		for latitude, longitude, k in [(65, -22, 5), (55, 50, 10), (-15, -70, 1)]:
+			nearest = self.map.get_nearest_cached(latitude, longitude, k)
+			self.assertEqual(nearest, tuple(self.map.get_nearest(latitude, longitude, k)))
+			self.assertIs(self.map.get_nearest_cached(latitude, longitude, k), nearest)
+			self.assertIs(self.map.get_nearest_cached(latitude, longitude + 1e-6, k), nearest)
+		
+		stats = self.map.candidates.get_stats()
+		self.assertEqual(stats['entries'], 3)
+		self.assertEqual(stats['size'], sum([
+			get_lookup_size(self.map.get_nearest_cached(latitude, longitude, k))
+			for latitude, longitude, k in [(65, -22, 5), (55, 50, 10), (-15, -70, 1)]
+		]))
+		
+		self.assertEqual(
+			self.map.get_nearest_cached(65, -22, 6),
+			tuple(self.map.get_nearest(65, -22, 6))
+		)
+	
+	
+	def test_get_in_radius_cached(self):
+		origins = [(65, -22), (55, 50), (-15, -70)]
+		
+		circles = self.map.get_in_radius_cached(origins, 1000)
+		self.assertEqual(circles, self.map.get_in_radius_all(origins, 1000))
+		self.assertEqual(self.map.candidates.get_stats()['misses'], 3)
+		
+		again = self.map.get_in_radius_cached(origins[::-1] + [(43, 42)], 1000)
+		self.assertEqual(again[:3], circles[::-1])
+		self.assertEqual(again[3], self.map.get_in_radius(43, 42, 1000))
+		self.assertEqual(self.map.candidates.get_stats()['hits'], 3)
+		
+		self.assertEqual(
+			self.map.get_in_radius_cached(origins, 2000),
+			self.map.get_in_radius_all(origins, 2000)
+		)
+		
+		with self.settings(MAP_CACHE_SIZE=2000):
+			small = Map()
+		
+		small.get_in_radius_cached(origins, 2000)
+		stats = small.candidates.get_stats()
+		self.assertLessEqual(stats['size'], 2000)
+		self.assertGreater(stats['evictions'], 0)
+	
+	
 	@given(
 		floats(min_value=-90.0, max_value=90.0),
 		floats(min_value=-180.0, max_value=180.0),
@@ -201,3 +390,75 @@ class MapTestCase(TestCase):
 
 
 
+class SharedMapTestCase(TransactionTestCase):
+	"""
+	The map is invalidated when the transaction commits, hence not TestCase,
+	which wraps each test in a transaction.
+	"""
+	fixtures = ['languages.json']
+	
+	def tearDown(self):
+		cache.clear()
+	
+	def test_get_map(self):
+		planet = get_map()
+		self.assertIsInstance(planet, Map)
+		self.assertIs(get_map(), planet)
+		self.assertEqual(planet.get_single_nearest(65, -22, 500), 'is')
+	
+	def test_invalidation_on_save(self):
+		planet = get_map()
+		
+		language = Language.objects.get(iso_639_3='isl')
+		language.latitude = -15
+		language.longitude = -70
+		language.save()
+		
+		self.assertIsNot(get_map(), planet)
+		self.assertEqual(get_map().get_single_nearest(-15, -70, 500), 'is')
+		self.assertIs(get_map(), get_map())
+	
+	def test_invalidation_on_commit(self):
+		planet = get_map()
+		version = get_map_version()
+		
+		with transaction.atomic():
+			language = Language.objects.get(iso_639_3='isl')
+			language.latitude = -15
+			language.save()
+			
+			self.assertEqual(get_map_version(), version)
+			self.assertIs(get_map(), planet)
+		
+		self.assertNotEqual(get_map_version(), version)
+		self.assertIsNot(get_map(), planet)
+		self.assertEqual(get_map().languages['is'][0], -15)
+		
+		planet = get_map()
+		
+		try:
+			with transaction.atomic():
+				Language.objects.get(iso_639_3='isl').delete()
+				raise RuntimeError
+		except RuntimeError:
+			pass
+		
+		self.assertIs(get_map(), planet)
+		self.assertIn('is', get_map().languages)
+	
+	def test_invalidation_on_delete(self):
+		planet = get_map()
+		self.assertIn('is', planet.languages)
+		
+		Language.objects.get(iso_639_3='isl').delete()
+		
+		self.assertIsNot(get_map(), planet)
+		self.assertNotIn('is', get_map().languages)
+	
+	def test_invalidation_on_cache_clear(self):
+		planet = get_map()
+		cache.clear()
+		self.assertIsNot(get_map(), planet)
+
+
+
@@ -3,7 +3,9 @@ from django.test import TestCase
 from hypothesis.strategies import floats, lists, tuples
 from hypothesis import given
 
-from app.ling.math import get_correlation
+from app.ling.math import get_correlation, get_correlations, SlidingCorrelation
+
+import numpy as np
 
 
 
@@ -45,6 +47,106 @@ class CorrelationsTestCase(TestCase):
 		self.assertIn(type(p), (int, float))
 		self.assertGreaterEqual(p, -1)
 		self.assertLessEqual(p, 1)
+	
+	def test_numpy_arrays(self):
+		a = np.array([1, 2, 3], dtype=np.float32)
+		b = np.array([0, 1, 0.5])
+		
+		p = get_correlation(a, b)
+		self.assertIs(type(p), float)
+		self.assertEqual(p, 0.5)
+		
+		self.assertEqual(get_correlation(np.empty(0), np.empty(0)), 0)
+	
+	def test_sliding(self):
+		correlation = SlidingCorrelation(6)
+		self.assertEqual(correlation.get_correlation(), 0)
+		
+		correlation.add([42], [42])
+		self.assertEqual(correlation.get_correlation(), 0)
+		
+		correlation.add([1, 2, 3], [0, 1, 0.5])
+		correlation.remove([42], [42])
+		self.assertEqual(correlation.get_correlation(), 0.5)
+		
+		correlation.add([4, 5], [2, 3])
+		correlation.remove([1, 3], [0, 0.5])
+		self.assertEqual(correlation.get_correlation(), get_correlation([2, 4, 5], [1, 2, 3]))
+		
+		correlation.reset()
+		self.assertEqual(correlation.get_correlation(), 0)
+	
+	def test_sliding_does_not_overflow(self):
+		random = np.random.RandomState(42)
+		a = np.round(random.uniform(0, 3000, 840), 6)
+		b = np.round(a + random.uniform(0, 15000, 840), 6)
+		
+		correlation = SlidingCorrelation(6)
+		correlation.add(a, b)
+		self.assertAlmostEqual(correlation.get_correlation(), get_correlation(a, b), places=4)
+		self.assertNotEqual(correlation.get_correlation(), 0)
+		
+		correlation.remove(a[:420], b[:420])
+		self.assertAlmostEqual(
+			correlation.get_correlation(), get_correlation(a[420:], b[420:]), places=4
+		)
+	
+	def test_batched(self):
+		self.assertEqual(get_correlations([], []), [])
+		self.assertEqual(get_correlations([[], [42]], [[], [42]]), [0, 0])
+		
+		self.assertEqual(get_correlations(
+			[[1, 2, 3, 4, 5, 6, 7], [], [1, 2, 3], [42], [1, 2]],
+			[[2, 3, 4, 5, 6, 7, 8], [], [0, 1, 0.5], [], [2, 1]]
+		), [1, 0, 0.5, 0, -1])
+		
+		with self.assertRaises(ValueError):
+			get_correlations([[1, 2]], [])
+	
+	@given(lists(lists(tuples(
+		floats(min_value=0.0, max_value=1.0),
+		floats(min_value=0.0, max_value=1.0)
+	)), max_size=20))
+	def test_engines_agree(self, groups):
+		"""
+		Nearly constant populations are left out: whether these count as
+		degenerate depends on the rounding errors of each engine.
+		"""
+		groups = [
+			group for group in groups if len(group) == 0 or (
+				np.var([i[0] for i in group]) > 1e-9
+				and np.var([i[1] for i in group]) > 1e-9
+			) or (
+				np.var([i[0] for i in group]) == 0
+				and np.var([i[1] for i in group]) == 0
+			)
+		]
+		groups_a = [[i[0] for i in group] for group in groups]
+		groups_b = [[i[1] for i in group] for group in groups]
+		
+		expected = [get_correlation(a, b) for a, b in zip(groups_a, groups_b)]
+		
+		for p, q in zip(get_correlations(groups_a, groups_b), expected):
+			self.assertAlmostEqual(p, q, places=4)
+		
+		"""
+		The sliding engine is exact for values rounded to its precision; the
+		groups are added one after the other and all but the last removed.
+		"""
+		correlation = SlidingCorrelation(6)
+		
+		for a, b in zip(groups_a, groups_b):
+			correlation.add(np.round(a, 6), np.round(b, 6))
+		
+		for a, b in zip(groups_a[:-1], groups_b[:-1]):
+			correlation.remove(np.round(a, 6), np.round(b, 6))
+		
+		if groups:
+			self.assertAlmostEqual(
+				correlation.get_correlation(),
+				get_correlation(np.round(groups_a[-1], 6), np.round(groups_b[-1], 6)),
+				places=4
+			)
 
 
 
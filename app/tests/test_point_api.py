@@ -1,16 +1,21 @@
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.test import TransactionTestCase
 
 from hypothesis.strategies import floats, integers, sampled_from
 from hypothesis import given
 
-from app.ling.word_matrix import WordMatrix
+from app.ling.word_matrix import WordMatrix, matrix_cache
+from app.models import Language
 from utils.json import make_json, read_json
 
 
 
-class PointApiTestCase(TestCase):
+class PointApiTestCase(TransactionTestCase):
+	"""
+	TransactionTestCase, as the map is only invalidated once a change to the
+	languages is committed.
+	"""
 	fixtures = ['languages.json']
 	
 	def setUp(self):
@@ -61,6 +66,89 @@ class PointApiTestCase(TestCase):
 		self.assertGreaterEqual(content['p'], -1)
 	
 	
+	def test_bad_coords(self):
+		for method, parameter in [('circle', 500), ('neighbourhood', 4)]:
+			for latitude, longitude, error in [
+				(95, 42, 'Avoid the (ant)arctic chill.'),
+				(43, -200, 'Invalid coords.'),
+				(43, 1000, 'Invalid coords.'),
+				(float('nan'), 42, 'Invalid coords.')
+			]:
+				self.post.update({
+					'latitude': latitude, 'longitude': longitude,
+					'method': method, 'parameter': parameter
+				})
+				
+				response = self.client.post(
+					reverse('point_api'),
+					make_json(self.post),
+					content_type='application/octet-stream'
+				)
+				self.assertEqual(response.status_code, 400)
+				self.assertEqual(read_json(response.content), {'error': error})
+	
+	
+	def test_etag(self):
+		response = self.client.post(
+			reverse('point_api'),
+			make_json(self.post),
+			content_type='application/octet-stream'
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('ETag', response)
+		self.assertIn('no-cache', response['Cache-Control'])
+		
+		etag = response['ETag']
+		
+		response = self.client.post(
+			reverse('point_api'),
+			make_json(self.post),
+			content_type='application/octet-stream',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+		
+		self.post['parameter'] = 600
+		response = self.client.post(
+			reverse('point_api'),
+			make_json(self.post),
+			content_type='application/octet-stream',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+		
+		"""
+		Moving a language invalidates the ETags.
+		"""
+		self.post['parameter'] = 500
+		Language.objects.first().save()
+		
+		response = self.client.post(
+			reverse('point_api'),
+			make_json(self.post),
+			content_type='application/octet-stream',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 200)
+		
+		"""
+		An expired matrix is a 404, whatever the tag.
+		"""
+		etag = response['ETag']
+		cache.clear()
+		matrix_cache.clear()
+		
+		response = self.client.post(
+			reverse('point_api'),
+			make_json(self.post),
+			content_type='application/octet-stream',
+			HTTP_IF_NONE_MATCH=etag
+		)
+		self.assertEqual(response.status_code, 404)
+	
+	
 	def test_good_neighbourhood(self):
 		self.post['method'] = 'neighbourhood'
 		self.post['parameter'] = 4
@@ -5,110 +5,76 @@ from hypothesis import given, assume
 
 from app.ling.range_tree import RangeTree
 
+from array import array
+
 
 
 class RangeTreeTestCase(TestCase):
 	def test_init(self):
 		data_raw = [(3, 'three'), (1, 'one'), (2, 'two')]
-		data_gut = [(1, 'one'), (2, 'two'), (3, 'three')]
 		tree = RangeTree(data_raw)
-		self.assertEqual(tree.tree, RangeTree.create_tree(data_gut))
+		self.assertEqual(tree.values, array('d', [1, 2, 3]))
+		self.assertEqual(tree.items, ['one', 'two', 'three'])
 		
 		data_raw = [(42.0, 'float'), (-42, 'negative'), (0, 'zero')]
-		data_gut = [(-42, 'negative'), (0, 'zero'), (42.0, 'float')]
 		tree = RangeTree(data_raw)
-		self.assertEqual(tree.tree, RangeTree.create_tree(data_gut))
+		self.assertEqual(tree.values, array('d', [-42, 0, 42]))
+		self.assertEqual(tree.items, ['negative', 'zero', 'float'])
 		
 		with self.assertRaises(ValueError):
 			tree = RangeTree([])
 		
 		with self.assertRaises(ValueError):
 			tree = RangeTree([1, 'one'])
-	
-	def test_create_tree_of_three(self):
-		data = [(1, 'one'), (2, 'two'), (3, 'three')]
-		tree = RangeTree.create_tree(data)
 		
-		self.assertEqual(tree['left']['left'], {
-			'left': None, 'right': None, 'value': 1, 'item': 'one'
-		})
-		
-		self.assertEqual(tree['right']['left'], {
-			'left': None, 'right': None, 'value': 2, 'item': 'two'
-		})
-		self.assertEqual(tree['right']['right'], {
-			'left': None, 'right': None, 'value': 3, 'item': 'three'
-		})
-		self.assertEqual(tree['right'], {
-			'left': tree['right']['left'],
-			'right': tree['right']['right'],
-			'value': 2
-		})
+		with self.assertRaises(ValueError):
+			tree = RangeTree([('one', 1)])
+	
+	def test_search_range(self):
+		data = [(1, 'one'), (2, 'two'), (2, 'deux'), (3, 'three'), (4, 'four')]
+		tree = RangeTree(data)
 		
-		self.assertEqual(tree, {
-			'left': tree['left'],
-			'right': tree['right'],
-			'value': 1
-		})
+		self.assertEqual(tree.search_range(1.5, 2.5), (1, 3))
+		self.assertEqual(tree.search_range(2, 3), (1, 4))
+		self.assertEqual(tree.search_range(0, 42), (0, 5))
+		self.assertEqual(tree.search_range(42, 60), (5, 5))
+		self.assertEqual(tree.search_range(-60, -42), (0, 0))
+		self.assertEqual(tree.search_range(3, 1), (0, 0))
 	
-	def test_create_tree_of_four(self):
+	def test_iter_search(self):
 		data = [(1, 'one'), (2, 'two'), (3, 'three'), (4, 'four')]
-		tree = RangeTree.create_tree(data)
-		
-		self.assertEqual(tree['left']['left'], {
-			'left': None, 'right': None, 'value': 1, 'item': 'one'
-		})
-		self.assertEqual(tree['left']['right'], {
-			'left': None, 'right': None, 'value': 2, 'item': 'two'
-		})
-		self.assertEqual(tree['left'], {
-			'left': tree['left']['left'],
-			'right': tree['left']['right'],
-			'value': 1
-		})
-		
-		self.assertEqual(tree['right']['left'], {
-			'left': None, 'right': None, 'value': 3, 'item': 'three'
-		})
-		self.assertEqual(tree['right']['right'], {
-			'left': None, 'right': None, 'value': 4, 'item': 'four'
-		})
-		self.assertEqual(tree['right'], {
-			'left': tree['right']['left'],
-			'right': tree['right']['right'],
-			'value': 3
-		})
+		tree = RangeTree(data)
 		
-		self.assertEqual(tree, {
-			'left': tree['left'],
-			'right': tree['right'],
-			'value': 2
-		})
+		self.assertEqual(list(tree.iter_search(1.5, 3.5)), ['two', 'three'])
+		self.assertEqual(list(tree.iter_search(1, 4)), [
+			'one', 'two', 'three', 'four'
+		])
+		self.assertEqual(list(tree.iter_search(42, 60)), [])
 	
-	def test_search_tree_of_three(self):
+	def test_search_of_three(self):
 		data = [(1, 'one'), (2, 'two'), (3, 'three')]
-		tree = RangeTree.create_tree(data)
+		tree = RangeTree(data)
 		
-		items = RangeTree.search_tree(tree, 1.5, 2.5)
+		items = tree.search(1.5, 2.5)
 		self.assertEqual(items, set(['two']))
 		
-		items = RangeTree.search_tree(tree, 0, 4)
+		items = tree.search(0, 4)
 		self.assertEqual(items, set(['one', 'two', 'three']))
 		
-		items = RangeTree.search_tree(tree, 42, 60)
+		items = tree.search(42, 60)
 		self.assertEqual(items, set())
 	
-	def test_search_tree_of_four(self):
+	def test_search_of_four(self):
 		data = [(1, 'one'), (2, 'two'), (3, 'three'), (4, 'four')]
-		tree = RangeTree.create_tree(data)
+		tree = RangeTree(data)
 		
-		items = RangeTree.search_tree(tree, 1.5, 2.5)
+		items = tree.search(1.5, 2.5)
 		self.assertEqual(items, set(['two']))
 		
-		items = RangeTree.search_tree(tree, 1, 4)
+		items = tree.search(1, 4)
 		self.assertEqual(items, set(['one', 'two', 'three', 'four']))
 		
-		items = RangeTree.search_tree(tree, 42, 60)
+		items = tree.search(42, 60)
 		self.assertEqual(items, set())
 	
 	@given(lists(elements=tuples(
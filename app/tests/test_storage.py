@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from app.ling.storage import CacheStore, FileStore, get_store
+from app.ling.word_matrix import WordMatrix, matrix_cache
+
+from unittest.mock import patch
+import mmap
+import os
+import shutil
+import tempfile
+
+
+
+class StorageTestCase(TestCase):
+	
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+	
+	def tearDown(self):
+		shutil.rmtree(self.root)
+		matrix_cache.clear()
+		cache.clear()
+	
+	
+	def test_get_store(self):
+		self.assertIsInstance(get_store(), CacheStore)
+		self.assertIs(get_store(), get_store())
+		self.assertEqual(get_store().timeout, cache.default_timeout)
+		
+		with override_settings(WORD_MATRIX_ROOT=self.root):
+			store = get_store()
+			self.assertIsInstance(store, FileStore)
+			self.assertEqual(store.root, self.root)
+			self.assertIsNone(store.timeout)
+			
+			with patch('os.makedirs') as makedirs:
+				self.assertIs(get_store(), store)
+			makedirs.assert_not_called()
+	
+	
+	def test_file_store(self):
+		store = FileStore(os.path.join(self.root, 'matrices'))
+		self.assertIsNone(store.get('a'))
+		
+		store.set('a', b'42')
+		data = store.get('a')
+		self.assertIsInstance(data, mmap.mmap)
+		self.assertEqual(data[:], b'42')
+		
+		store.set('a', b'43')
+		self.assertEqual(store.get('a')[:], b'43')
+		self.assertEqual(data[:], b'42')
+		
+		store.delete('a')
+		self.assertIsNone(store.get('a'))
+		store.delete('a')
+		
+		store.set('b', b'')
+		self.assertIsNone(store.get('b'))
+		
+		self.assertEqual(os.listdir(store.root), ['b.bin'])
+		
+		for key in ('../a', 'a/b', '', '.'):
+			self.assertIsNone(store.get(key))
+			with self.assertRaises(ValueError):
+				store.set(key, b'42')
+	
+	
+	def test_word_matrix(self):
+		matrix = WordMatrix()
+		with open('app/fixtures/berg.tsv', 'r') as f:
+			matrix.load_raw(f)
+		
+		with override_settings(WORD_MATRIX_ROOT=self.root):
+			storage_id = matrix.save()
+			matrix_cache.clear()
+			
+			self.assertTrue(os.path.exists(os.path.join(self.root, storage_id + '.bin')))
+			self.assertIsNone(cache.get(storage_id))
+			
+			loaded = WordMatrix()
+			loaded.load(storage_id)
+			self.assertEqual(dict(loaded.d), dict(matrix.d))
+			self.assertFalse(loaded.global_d.flags.writeable)
+			self.assertIsNone(matrix_cache.data[storage_id][2])
+			
+			matrix_cache.clear()
+			with open(os.path.join(self.root, storage_id + '.bin'), 'wb') as f:
+				f.write(b'KKWM')
+			
+			with self.assertRaises(ValueError):
+				loaded.load(storage_id)
+		
+		with self.assertRaises(ValueError):
+			WordMatrix().load(storage_id)
+
+
+
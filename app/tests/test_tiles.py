@@ -0,0 +1,63 @@
+from django.test import TestCase
+
+from app.ling.tiles import TileStore, get_tile_cells
+
+import numpy as np
+
+import os
+import shutil
+import tempfile
+
+
+
+class TilesTestCase(TestCase):
+	
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+	
+	def tearDown(self):
+		shutil.rmtree(self.root)
+	
+	
+	def test_get_tile_cells(self):
+		cells = get_tile_cells(0, 0, 0, 2)
+		self.assertEqual(len(cells), 4)
+		
+		self.assertAlmostEqual(cells[0][1], -90)
+		self.assertAlmostEqual(cells[1][1], 90)
+		self.assertAlmostEqual(cells[0][0], cells[1][0])
+		self.assertAlmostEqual(cells[0][0], -cells[2][0])
+		self.assertAlmostEqual(cells[0][0], 66.51326044311186)
+		
+		"""
+		The tile (2, 3, 1) spans the longitudes 90–180 and the latitudes 0–66.5.
+		"""
+		for latitude, longitude in get_tile_cells(2, 3, 1, 4):
+			self.assertGreater(longitude, 90)
+			self.assertLess(longitude, 180)
+			self.assertGreater(latitude, 0)
+			self.assertLess(latitude, 66.51326044311186)
+	
+	
+	def test_store(self):
+		store = TileStore(self.root)
+		self.assertIsNone(store.get('circle', 1000, 1, 0, 0))
+		
+		level = np.arange(2 * 2 * 3 * 3).reshape((2, 2, 3, 3)) / 36
+		store.save('circle', 1000, 1, iter(level.reshape((-1, 3, 3))), 3)
+		
+		tile = store.get('circle', 1000, 1, 1, 0)
+		self.assertEqual(tile.dtype, np.float32)
+		np.testing.assert_array_equal(tile, level[0, 1].astype(np.float32))
+		
+		self.assertIsNone(store.get('circle', 1000, 2, 0, 0))
+		self.assertIsNone(store.get('neighbourhood', 1000, 1, 0, 0))
+		
+		for tiles in (level.reshape((-1, 3, 3)), np.zeros((17, 3, 3))):
+			with self.assertRaises(ValueError):
+				store.save('circle', 1000, 2, tiles, 3)
+			self.assertIsNone(store.get('circle', 1000, 2, 0, 0))
+		
+		self.assertEqual(os.listdir(os.path.join(self.root, 'circle_1000')), ['1.npy'])
+
+
@@ -0,0 +1,74 @@
+from django.test import TestCase
+
+from app.ling.tsv_parser import TsvParser
+
+import numpy as np
+
+import io
+
+
+
+class TsvParserTestCase(TestCase):
+	
+	def setUp(self):
+		self.text = (
+			'langdist\tconceptdist\tword1\tword2\n'
+			'0.3487\t0.4035\tsjd:KANT\tsms:KYUDES\n'
+			'0.5\t0.25\tfi:KÄSI\tsjd:KANT\r\n'
+			'\n'
+			'1.0\t0.125\tfi:SILMÄ\tsms:ČALMM'
+		)
+	
+	
+	def check(self, result):
+		codes, code_a, code_b, global_d, real_d = result
+		
+		self.assertEqual(codes, ['fi', 'sjd', 'sms'])
+		self.assertEqual(code_a.tolist(), [1, 0, 0])
+		self.assertEqual(code_b.tolist(), [2, 1, 2])
+		self.assertEqual(global_d.dtype, np.float32)
+		self.assertTrue(np.array_equal(global_d, np.float32([0.3487, 0.5, 1.0])))
+		self.assertTrue(np.array_equal(real_d, np.float32([0.4035, 0.25, 0.125])))
+	
+	
+	def test_parse(self):
+		self.check(TsvParser().parse(io.StringIO(self.text)))
+		self.check(TsvParser().parse(io.BytesIO(self.text.encode('utf-8'))))
+	
+	
+	def test_chunks(self):
+		data = self.text.encode('utf-8')
+		
+		for size in range(1, 12):
+			parser = TsvParser(capacity=1)
+			for i in range(0, len(data), size):
+				parser.feed(data[i:i+size])
+			self.check(parser.close())
+	
+	
+	def test_empty(self):
+		codes, code_a, code_b, global_d, real_d = TsvParser().parse(io.StringIO(''))
+		self.assertEqual(codes, [])
+		self.assertEqual(len(global_d), 0)
+	
+	
+	def test_errors(self):
+		header = 'langdist\tconceptdist\tword1\tword2\n'
+		
+		for text, line in [
+			(header + '0.1\t0.2\tsjd:A\n', 2),
+			(header + '0.1\t0.2\tsjd:A\tsms:B\nx\t0.2\tsjd:A\tsms:B\n', 3),
+			(header + '\n\n0.1\t0.2\tsjdA\tsms:B\n', 4),
+			(header + '0.1\t0.2\t:A\tsms:B', 2),
+		]:
+			with self.assertRaisesRegex(ValueError, r'\(line {}\)'.format(line)):
+				TsvParser().parse(io.StringIO(text))
+		
+		with self.assertRaisesRegex(ValueError, r'UTF-8 \(line 2\)'):
+			TsvParser().parse(io.BytesIO(header.encode('utf-8') + b'\xff\xfe'))
+		
+		with self.assertRaisesRegex(ValueError, r'UTF-8 \(line 1\)'):
+			TsvParser().parse(io.BytesIO('langdist ä'.encode('utf-8')[:-1]))
+
+
+
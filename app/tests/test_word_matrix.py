@@ -1,7 +1,12 @@
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from app.ling.word_matrix import WordMatrix
+from app.ling.word_matrix import WordMatrix, matrix_cache
+
+import numpy as np
+
+from unittest.mock import patch
+import time
 
 
 
@@ -30,6 +35,31 @@ class WordMatrixTestCase(TestCase):
 		
 		self.assertEqual(len(matrix.d), 2346)
 	
+	def test_dense_storage(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		
+		self.assertEqual(len(matrix.codes), 69)
+		self.assertEqual(matrix.codes, sorted(matrix.codes))
+		self.assertEqual(matrix.codes[matrix.ids['sjd']], 'sjd')
+		
+		for m in (matrix.global_d, matrix.real_d):
+			self.assertEqual(m.dtype, np.float32)
+			self.assertEqual(m.shape, (69, 69))
+			self.assertTrue(np.allclose(m, m.T, equal_nan=True))
+		
+		i, j = matrix.ids['sjd'], matrix.ids['sms']
+		self.assertAlmostEqual(matrix.global_d[i, j], 0.3487, places=6)
+		self.assertAlmostEqual(matrix.global_d[j, i], 0.3487, places=6)
+		self.assertAlmostEqual(matrix.real_d[j, i], 0.4035, places=6)
+		self.assertTrue(np.isnan(matrix.global_d[i, i]))
+		
+		self.assertIn(('sjd', 'sms'), matrix.d)
+		self.assertNotIn(('sms', 'sjd'), matrix.d)
+		self.assertNotIn(('sjd', 'sjd'), matrix.d)
+		self.assertNotIn(('sjd', 'xxx'), matrix.d)
+		self.assertEqual(len(list(matrix.d)), len(matrix.d))
+	
 	def test_load_raw_error(self):
 		matrix = WordMatrix()
 		f = open('app/fixtures/languages.tab', 'r')
@@ -41,6 +71,8 @@ class WordMatrixTestCase(TestCase):
 		matrix = WordMatrix()
 		matrix.load_raw(self.f)
 		storage_id = matrix.save()
+		self.assertEqual(storage_id, 'matrix_' + matrix.get_hash())
+		self.assertEqual(matrix.save(), storage_id)
 		
 		matrix = WordMatrix()
 		self.assertEqual(len(matrix.d), 0)
@@ -49,12 +81,129 @@ class WordMatrixTestCase(TestCase):
 		self.assertEqual(len(matrix.d), 2346)
 		
 		cache.clear()
+		matrix_cache.clear()
 		self.assertEqual(len(matrix.d), 2346)
 		
 		matrix = WordMatrix()
 		with self.assertRaises(ValueError):
 			matrix.load(storage_id)
 	
+	def test_save_renews(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		storage_id = matrix.save()
+		
+		with patch('time.time', return_value=matrix.created + 3600):
+			self.assertEqual(matrix.save(), storage_id)
+		
+		loaded = WordMatrix()
+		loaded.from_bytes(cache.get(storage_id))
+		self.assertEqual(loaded.created, matrix.created)
+		self.assertGreaterEqual(loaded.created, time.time() + 3000)
+	
+	def test_matrix_cache(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		storage_id = matrix.save()
+		
+		self.assertIn(storage_id, matrix_cache)
+		self.assertFalse(matrix.global_d.flags.writeable)
+		
+		hits = matrix_cache.get_stats()['hits']
+		
+		loaded = WordMatrix()
+		loaded.load(storage_id)
+		self.assertEqual(matrix_cache.get_stats()['hits'], hits + 1)
+		self.assertIs(loaded.global_d, matrix.global_d)
+		self.assertEqual(dict(loaded.d), dict(matrix.d))
+		self.assertEqual(loaded.storage_id, storage_id)
+		
+		"""
+		The cache is filled on load too.
+		"""
+		matrix_cache.clear()
+		loaded = WordMatrix()
+		loaded.load(storage_id)
+		self.assertIn(storage_id, matrix_cache)
+		self.assertIsNot(loaded.global_d, matrix.global_d)
+		
+		"""
+		Re-using the instance does not affect the cached matrix.
+		"""
+		loaded.set_data([], np.empty((0, 0)), np.empty((0, 0)))
+		loaded.load(storage_id)
+		self.assertEqual(len(loaded.d), 2346)
+	
+	def test_matrix_cache_ttl(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		
+		with patch.object(cache, 'default_timeout', 60):
+			storage_id = matrix.save()
+		self.assertIn(storage_id, matrix_cache)
+		
+		expires = matrix_cache.data[storage_id][2]
+		self.assertAlmostEqual(expires, matrix.created + 60, places=2)
+		
+		with patch.object(cache, 'default_timeout', None):
+			storage_id = matrix.save()
+		self.assertIsNone(matrix_cache.data[storage_id][2])
+	
+	def test_binary_format(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		
+		for compression in (None, 'zlib', 'lzma'):
+			data = matrix.to_bytes(compression)
+			self.assertIs(type(data), bytes)
+			self.assertEqual(data[:4], b'KKWM')
+			
+			loaded = WordMatrix()
+			loaded.from_bytes(data)
+			
+			self.assertEqual(loaded.codes, matrix.codes)
+			self.assertEqual(loaded.created, matrix.created)
+			np.testing.assert_array_equal(loaded.global_d, matrix.global_d)
+			np.testing.assert_array_equal(loaded.real_d, matrix.real_d)
+			self.assertEqual(dict(loaded.d), dict(matrix.d))
+		
+		self.assertLess(len(matrix.to_bytes('zlib')), len(matrix.to_bytes()))
+		
+		loaded = WordMatrix()
+		loaded.from_bytes(matrix.to_bytes())
+		self.assertFalse(loaded.global_d.flags.owndata)
+		
+		empty = WordMatrix()
+		empty.from_bytes(WordMatrix().to_bytes())
+		self.assertEqual(empty.codes, [])
+		self.assertEqual(len(empty.d), 0)
+		
+		with self.assertRaises(ValueError):
+			matrix.to_bytes('gzip')
+		
+		data = matrix.to_bytes('zlib')
+		for bad in [b'', b'KKWM', b'XXXX' + data[4:], data[:-10], data[:30]]:
+			with self.assertRaises(ValueError):
+				WordMatrix().from_bytes(bad)
+	
+	@override_settings(WORD_MATRIX_COMPRESSION='lzma')
+	def test_save_and_load_compressed(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		storage_id = matrix.save()
+		
+		self.assertEqual(cache.get(storage_id)[5], 2)
+		matrix_cache.clear()
+		
+		loaded = WordMatrix()
+		loaded.load(storage_id)
+		self.assertEqual(dict(loaded.d), dict(matrix.d))
+		
+		cache.set(storage_id, {'codes': []})
+		matrix_cache.clear()
+		with self.assertRaises(ValueError):
+			loaded.load(storage_id)
+	
 	def test_get_distances(self):
 		matrix = WordMatrix()
 		matrix.load_raw(self.f)
@@ -70,6 +219,53 @@ class WordMatrixTestCase(TestCase):
 		
 		self.assertEqual(matrix.get_distances('ddo', 'sq'), (1.0000, 0.1144))
 		self.assertEqual(matrix.get_distances('sq', 'ddo'), (1.0000, 0.1144))
+	
+	def test_gather(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		
+		languages = ['sms', 'sjd', 'xxx', 'kv', 'mhr', 'udm']
+		ids = matrix.get_ids(languages)
+		self.assertEqual([matrix.codes[i] for i in ids], sorted(languages[:2] + languages[3:]))
+		
+		rows, cols, global_d, real_d = matrix.gather(ids)
+		self.assertEqual(len(rows), 5*4/2)
+		
+		for i, j, global_value, real_value in zip(rows, cols, global_d, real_d):
+			key = (matrix.codes[i], matrix.codes[j])
+			self.assertIn(key, matrix.d)
+			self.assertEqual(matrix.d[key], (global_value, real_value))
+		
+		rows, cols, global_d, real_d = matrix.gather(matrix.get_ids(['sjd', 'xxx']))
+		self.assertEqual(len(rows), 0)
+		self.assertEqual(len(global_d), 0)
+	
+	
+	def test_gather_between(self):
+		matrix = WordMatrix()
+		matrix.load_raw(self.f)
+		
+		ids_a = matrix.get_ids(['sms', 'kv'])
+		ids_b = matrix.get_ids(['sjd', 'mhr', 'udm'])
+		
+		rows, cols, global_d, real_d = matrix.gather_between(ids_a, ids_b)
+		self.assertEqual(len(rows), 2*3)
+		
+		for i, j, global_value, real_value in zip(rows, cols, global_d, real_d):
+			self.assertIn(i, ids_a)
+			self.assertIn(j, ids_b)
+			self.assertEqual(matrix.get_pair(i, j), (global_value, real_value))
+		
+		"""
+		Together with the pairs within each, these are the pairs of the union.
+		"""
+		union = matrix.gather(np.union1d(ids_a, ids_b))
+		self.assertEqual(
+			len(union[0]), len(rows) + len(matrix.gather(ids_a)[0]) + len(matrix.gather(ids_b)[0])
+		)
+		
+		rows, cols, global_d, real_d = matrix.gather_between(ids_a, [])
+		self.assertEqual(len(rows), 0)
 
 
 
@@ -1,9 +1,11 @@
 from django.http import JsonResponse
 from django.views.generic.base import View
 
-from app.models import Language
+from app.ling.distances import get_codes, get_index
+from app.ling.map import MapError, get_map
+
+import numpy as np
 
-import csv
 
 
 class DistancesApiView(View):
@@ -11,71 +13,114 @@ class DistancesApiView(View):
 		"""
 		Renders {} of language: distance; the distances being from the language
 		requested to all the other languages.
-		Reads berg.tsv each time (for the time being).
+		Served from the in-memory index of berg.tsv.
 		"""
-		try:
-			language = Language.objects.get(
-				iso_639_3 = slug.lower()
-			)
-		except Language.DoesNotExist:
+		codes = get_codes()
+		
+		iso_639_3 = slug.lower()
+		
+		if iso_639_3 not in codes.iso_639_1:
 			return JsonResponse({
 				'error': "Language not found."
 			}, status=404)
 		
-		d = {}
+		index = get_index()
 		
-		file_path = 'app/fixtures/berg.tsv'
+		d = {}
 		
-		with open(file_path, 'r') as f:
-			reader = csv.reader(f, delimiter='\t')
-			count = -1
-			
-			for row in reader:
-				count += 1
-				if count == 0:
-					continue
-				
-				another = self.extract(language, row)
-				if another:
-					d[another] = float(row[1])
+		for code in codes.get_tsv_codes(iso_639_3):
+			for another, distance in index.get_distances(code).items():
+				if another in codes.iso_639_3:
+					d[codes.iso_639_3[another]] = distance
 		
 		return JsonResponse({
 			'distances': d
 		}, status=200)
+
+
+
+class DistancesBatchApiView(View):
+	
+	def get(self, request):
+		"""
+		Returns the pairwise distances between a group of languages in one go.
+		
+		GET
+			codes,		# comma-separated ISO 639-3 codes
+			or bbox		# south,west,north,east in degrees
+		
+		200:
+			languages: [] of the ISO 639-3 codes of those languages which are
+				in berg.tsv, in the order requested (bbox: alphabetical);
+			distances: [] of the distances between languages[i] and
+				languages[j] for each i < j, in row-major order; null if the
+				pair is missing
+		
+		400: error
+		404: error		# language not found
+		"""
+		codes = get_codes()
+		
+		try:
+			languages = self.validate_get(request.GET, codes)
+		except ValueError as error:
+			return JsonResponse({'error': str(error)}, status=400)
+		except LookupError as error:
+			return JsonResponse({'error': str(error)}, status=404)
+		
+		index = get_index()
+		
+		found, tsv_codes = [], []
+		
+		for iso_639_3 in languages:
+			for code in codes.get_tsv_codes(iso_639_3):
+				if code in index.matrix.ids:
+					found.append(iso_639_3)
+					tsv_codes.append(code)
+					break
+		
+		distances = index.get_submatrix(tsv_codes)
+		
+		return JsonResponse({
+			'languages': found,
+			'distances': [
+				None if np.isnan(distance) else distance
+				for distance in distances.tolist()
+			]
+		}, status=200)
 	
-	def extract(self, language, row):
-		code_one = row[2].split(':')[0]
-		code_two = row[3].split(':')[0]
-		
-		another_lang = None
-		
-		if language.iso_639_1 == code_one:
-			another_lang = self.find_language(code_two)
-		elif language.iso_639_1 == code_two:
-			another_lang = self.find_language(code_one)
-		elif language.iso_639_3 == code_one:
-			another_lang = self.find_language(code_two)
-		elif language.iso_639_3 == code_two:
-			another_lang = self.find_language(code_one)
-		
-		if another_lang:
-			return another_lang.iso_639_3
-		else:
-			return None
 	
-	def find_language(self, code):
-		if len(code) == 2:
-			try:
-				language = Language.objects.get(iso_639_1=code)
-			except Language.DoesNotExist:
-				return None
-		else:
-			try:
-				language = Language.objects.get(iso_639_3=code)
-			except Language.DoesNotExist:
-				return None
-		
-		return language
+	def validate_get(self, get, codes):
+		"""
+		Returns the list of ISO 639-3 codes requested. Raises ValueError if
+		the request is invalid and LookupError if a language is not found.
+		"""
+		try:
+			assert ('codes' in get) != ('bbox' in get)
+		except AssertionError:
+			raise ValueError('Either codes or bbox expected.')
+		
+		if 'codes' in get:
+			languages = []
+			
+			for iso_639_3 in get['codes'].lower().split(','):
+				if iso_639_3 not in codes.iso_639_1:
+					raise LookupError('Language not found.')
+				if iso_639_3 not in languages:
+					languages.append(iso_639_3)
+			
+			return languages
+		
+		try:
+			bounds = [float(value) for value in get['bbox'].split(',')]
+			assert len(bounds) == 4
+			in_bounds = get_map().get_in_bounds(*bounds)
+		except (AssertionError, ValueError, MapError):
+			raise ValueError('Invalid bbox.')
+		
+		return sorted([
+			codes.iso_639_3[code] for code in in_bounds if code in codes.iso_639_3
+		])
 
 
 
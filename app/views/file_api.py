@@ -1,8 +1,12 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.views.generic.base import View
 
-from app.models import Language
-from app.ling.word_matrix import WordMatrix
+from app.ling.storage import get_store
+from app.ling.word_matrix import UPLOAD_PREFIX, WordMatrix
+
+import hashlib
 
 
 
@@ -10,7 +14,8 @@ class FileApiView(View):
 	def post(self, request):
 		"""
 		Creates a new word matrix and stores it for subsequent API calls.
-		Returns the ID of the matrix.
+		Returns the ID of the matrix, which is derived from its contents. Files
+		uploaded before (byte for byte) are not parsed again.
 		
 		POST
 			file	# the .tsv file
@@ -27,16 +32,22 @@ class FileApiView(View):
 		except ValueError as error:
 			return JsonResponse({'error': str(error)}, status=400)
 		
+		alias = UPLOAD_PREFIX + self.hash_file(f)
+		
 		matrix = WordMatrix()
 		
 		try:
-			matrix.load_raw(f)
-		except ValueError as error:
-			return JsonResponse({'error': str(error)}, status=400)
-		except Exception as error:  # csv.Error
-			return JsonResponse({'error': 'File unreadable.'}, status=400)
-		
-		matrix.save()
+			matrix.load(cache.get(alias, ''))
+		except ValueError:
+			try:
+				matrix.load_raw(f)
+			except ValueError as error:
+				return JsonResponse({'error': str(error)}, status=400)
+			except Exception as error:
+				return JsonResponse({'error': 'File unreadable.'}, status=400)
+			
+			matrix.save()
+			cache.set(alias, matrix.storage_id, get_store().timeout)
 		
 		return JsonResponse({
 			'id': matrix.storage_id,
@@ -63,11 +74,25 @@ class FileApiView(View):
 			raise ValueError('The file is empty.')
 		
 		try:
-			assert f.size <= 1024 * 500
+			assert f.size <= settings.WORD_MATRIX_MAX_UPLOAD_SIZE
 		except AssertionError:
-			raise ValueError('The file exceeds the 100 KB limit.')
+			raise ValueError('The file exceeds the {} KB limit.'.format(
+				settings.WORD_MATRIX_MAX_UPLOAD_SIZE // 1024
+			))
 		
 		return f
+	
+	
+	def hash_file(self, f):
+		"""
+		Returns the hex SHA-256 digest of the UploadedFile's raw contents.
+		"""
+		digest = hashlib.sha256()
+		
+		for chunk in f.chunks():
+			digest.update(chunk)
+		
+		return digest.hexdigest()
 
 
 
@@ -1,10 +1,39 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.generic.base import View
 
-from app.ling.honeycomb import Honeycomb
-from app.ling.word_matrix import WordMatrix
+from app.ling.distances import get_index
+from app.ling.grid import HexGrid
+from app.ling.honeycomb import Honeycomb, cell_cache
+from app.ling.jobs import HoneycombJob
+from app.ling.map import get_map, get_map_version
+from app.ling.tiles import calculate_tile, get_tile_store
+from app.ling.word_matrix import WordMatrix, matrix_cache
 
-from utils.json import read_json
+from utils.http import add_etag, is_not_modified, make_etag, make_not_modified
+from utils.json import make_json, read_json
+
+import numpy as np
+
+import hashlib
+
+
+"""
+The most cells a request can have.
+"""
+MAX_CELLS = 10000
+
+"""
+The binary transport: the request body is the packed little-endian array of
+the cells' (latitude, longitude) pairs, of the dtype which the content type
+names, and the response body is the packed little-endian float32 array of
+the cells' temperatures, in the same order.
+"""
+CELL_TYPES = {
+	'application/x-honeycomb-float32': '<f4',
+	'application/x-honeycomb-float64': '<f8',
+}
+TEMPERATURES_TYPE = 'application/x-honeycomb-temperatures'
 
 
 
@@ -13,20 +42,32 @@ class HoneycombApiView(View):
 	def post(self, request):
 		"""
 		Returns two-dimensional array of temperatures.
+		If the request accepts application/x-ndjson, the cells are streamed as
+		they are done, in lines of JSON arrays of cells, from the centre of the
+		viewport outward.
 		
 		POST
 			id,			# word matrix id
-			cells,		# [] of [latitude, longitude]
+			cells,		# [] of [latitude, longitude]; or instead:
+			grid,		# {north, west, zoom, width, height, side, orientation}
 			method,		# circle or neighbourhood
 			parameter	# circle radius or neighbourhood size
 		
 		200:
 			cells: [] of [latitude, longitude, temperature]
 		
+		If a grid is given, the cells are its hexagons' centres, see HexGrid.
+		
+		304:			# If-None-Match has the response's ETag
 		400: error
 		404: error		# file not found
+		
+		See post_binary() for the binary alternative.
 		"""
 		
+		if request.content_type in CELL_TYPES:
+			return self.post_binary(request)
+		
 		try:
 			post = self.validate_post(request.body)
 		except ValueError as error:
@@ -43,14 +84,142 @@ class HoneycombApiView(View):
 			}, status=404)
 		
 		
+		stream = 'application/x-ndjson' in request.META.get('HTTP_ACCEPT', '')
+		etag = make_etag(get_map_version(), post, stream)
+		
+		if is_not_modified(request, etag):
+			return make_not_modified(etag)
+		
+		
+		if 'grid' in post:
+			post['cells'] = HexGrid(post['grid']).get_cells()
+		
 		honeycomb = Honeycomb(post['cells'])
 		
+		if stream:
+			if post['method'] == 'circle':
+				batches = honeycomb.iter_on_circles(matrix, post['parameter'])
+			else:
+				batches = honeycomb.iter_on_neighbourhoods(matrix, post['parameter'])
+			
+			response = StreamingHttpResponse(
+				(make_json(cells) + '\n' for cells in batches),
+				content_type='application/x-ndjson'
+			)
+			return add_etag(response, etag)
+		
 		if post['method'] == 'circle':
 			honeycomb.calculate_on_circles(matrix, post['parameter'])
 		else:
 			honeycomb.calculate_on_neighbourhoods(matrix, post['parameter'])
 		
-		return JsonResponse({'cells': honeycomb.cells}, status=200)
+		response = JsonResponse({'cells': honeycomb.cells}, status=200)
+		return add_etag(response, etag)
+	
+	
+	def post_binary(self, request):
+		"""
+		Returns the temperatures of the cells given, as a packed array.
+		
+		POST
+			body		# packed [latitude, longitude, ...], see CELL_TYPES
+		
+		GET
+			id,			# word matrix id
+			method,		# circle or neighbourhood
+			parameter	# circle radius or neighbourhood size
+		
+		200:
+			body		# packed float32 [temperature, ...]
+		
+		304:			# If-None-Match has the response's ETag
+		400: error
+		404: error		# file not found
+		"""
+		
+		try:
+			post = self.validate_binary(request)
+		except ValueError as error:
+			return JsonResponse({'error': str(error)}, status=400)
+		
+		
+		matrix = WordMatrix()
+		
+		try:
+			matrix.load(post['id'])
+		except ValueError:
+			return JsonResponse({
+				'error': 'The file has expired. Please re-upload.'
+			}, status=404)
+		
+		
+		etag = make_etag(
+			get_map_version(), post['id'], post['method'], post['parameter'],
+			hashlib.sha256(post['cells'].tobytes()).hexdigest()
+		)
+		
+		if is_not_modified(request, etag):
+			return make_not_modified(etag)
+		
+		
+		temperatures = Honeycomb(post['cells']).calculate(
+			post['method'], matrix, post['parameter']
+		)
+		
+		response = HttpResponse(
+			np.asarray(temperatures, dtype='<f4').tobytes(),
+			content_type=TEMPERATURES_TYPE
+		)
+		return add_etag(response, etag)
+	
+	
+	def validate_binary(self, request):
+		"""
+		Returns the validated query string params and the cells (as a float64
+		numpy array of shape (n, 2)) or raises ValueError.
+		"""
+		get = request.GET
+		
+		try:
+			assert sorted(get.keys()) == ['id', 'method', 'parameter']
+		except AssertionError:
+			raise ValueError('You cannot pass!')
+		
+		post = {}
+		
+		try:
+			post['id'] = get['id']
+			assert len(post['id']) > 0
+			assert len(post['id']) < 200
+		except AssertionError:
+			raise ValueError('Invalid id.')
+		
+		try:
+			post['method'] = get['method']
+			assert post['method'] in ('circle', 'neighbourhood',)
+		except AssertionError:
+			raise ValueError('Invalid method.')
+		
+		try:
+			post['parameter'] = int(get['parameter'])
+			assert post['parameter'] > 0
+		except (AssertionError, ValueError):
+			raise ValueError('Invalid parameter.')
+		
+		dtype = np.dtype(CELL_TYPES[request.content_type])
+		body = request.body
+		
+		try:
+			assert len(body) % (2 * dtype.itemsize) == 0
+			assert len(body) // (2 * dtype.itemsize) <= MAX_CELLS
+			cells = np.frombuffer(body, dtype=dtype).reshape((-1, 2)).astype(np.float64)
+			assert np.isfinite(cells).all()
+		except AssertionError:
+			raise ValueError('Invalid cells.')
+		
+		post['cells'] = cells
+		
+		return post
 	
 	
 	def validate_post(self, request_body):
@@ -72,15 +241,29 @@ class HoneycombApiView(View):
 		except AssertionError:
 			raise ValueError('Invalid id.')
 		
-		try:
-			assert 'cells' in post
-			assert type(post['cells']) is list
-			assert len(post['cells']) <= 10000
-			for cell in post['cells']:
-				assert type(cell) is list
-				assert len(cell) == 2
-		except AssertionError:
-			raise ValueError('Invalid cells.')
+		if 'grid' in post:
+			"""
+			The grid's cells are generated by the server and are checked
+			against HONEYCOMB_MAX_GRID_CELLS instead of MAX_CELLS.
+			"""
+			grid = HexGrid(post['grid'])
+			
+			try:
+				assert 'cells' not in post
+				assert grid.count_cells() <= settings.HONEYCOMB_MAX_GRID_CELLS
+			except AssertionError:
+				raise ValueError('Invalid grid.')
+		
+		else:
+			try:
+				assert 'cells' in post
+				assert type(post['cells']) is list
+				assert len(post['cells']) <= MAX_CELLS
+				for cell in post['cells']:
+					assert type(cell) is list
+					assert len(cell) == 2
+			except AssertionError:
+				raise ValueError('Invalid cells.')
 		
 		try:
 			assert 'method' in post
@@ -100,3 +283,215 @@ class HoneycombApiView(View):
 
 
 
+class HoneycombJobsApiView(HoneycombApiView):
+	
+	def post(self, request):
+		"""
+		Submits a honeycomb job and returns at once.
+		
+		POST
+			id,			# word matrix id
+			cells,		# [] of [latitude, longitude]; or instead:
+			grid,		# {north, west, zoom, width, height, side, orientation}
+			method,		# circle or neighbourhood
+			parameter	# circle radius or neighbourhood size
+		
+		202:
+			id			# job id
+		
+		400: error
+		404: error		# file not found
+		415: error		# the binary cells of CELL_TYPES are not accepted
+		"""
+		
+		if request.content_type in CELL_TYPES:
+			return JsonResponse({
+				'error': 'Jobs take JSON only.'
+			}, status=415)
+		
+		try:
+			post = self.validate_post(request.body)
+		except ValueError as error:
+			return JsonResponse({'error': str(error)}, status=400)
+		
+		
+		matrix = WordMatrix()
+		
+		try:
+			matrix.load(post['id'])
+		except ValueError:
+			return JsonResponse({
+				'error': 'The file has expired. Please re-upload.'
+			}, status=404)
+		
+		
+		if 'grid' in post:
+			post['cells'] = HexGrid(post['grid']).get_cells()
+		
+		job = HoneycombJob.submit(
+			matrix, post['cells'], post['method'], post['parameter']
+		)
+		
+		return JsonResponse({'id': job.job_id}, status=202)
+
+
+
+class HoneycombJobApiView(View):
+	
+	def get(self, request, job_id):
+		"""
+		Returns the job's progress and the cells finished so far.
+		
+		GET
+			since		# optional; the number of cells already received
+		
+		200:
+			status,		# running, done, cancelled, or failed
+			total,		# number of cells
+			done,		# number of cells finished
+			cells		# [] of [latitude, longitude, temperature], from since on
+		
+		404: error		# job not found
+		"""
+		job = HoneycombJob(job_id)
+		state = job.get_state()
+		
+		if state is None:
+			return JsonResponse({'error': 'Job not found.'}, status=404)
+		
+		try:
+			since = max(int(request.GET.get('since', 0)), 0)
+		except ValueError:
+			since = 0
+		
+		return JsonResponse({
+			'status': state['status'],
+			'total': state['total'],
+			'done': state['done'],
+			'cells': job.get_cells(state, since)
+		}, status=200)
+	
+	
+	def delete(self, request, job_id):
+		"""
+		Cancels the job; the cells finished so far are kept.
+		
+		200:
+			id			# job id
+		
+		404: error		# job not found
+		"""
+		if not HoneycombJob(job_id).cancel():
+			return JsonResponse({'error': 'Job not found.'}, status=404)
+		
+		return JsonResponse({'id': job_id}, status=200)
+
+
+class HoneycombTileApiView(View):
+	
+	def get(self, request, method, parameter, z, x, y):
+		"""
+		Returns the XYZ tile's temperatures as a packed array of the tile's
+		HONEYCOMB_TILE_SIZE × HONEYCOMB_TILE_SIZE samples, row by row from the
+		north west corner. Without an id, the tile is of the built-in berg.tsv
+		and is served from the precomputed tiles if these have it; otherwise
+		it is calculated.
+		
+		GET
+			id			# optional; word matrix id
+		
+		200:
+			body		# packed float32 [temperature, ...]
+		
+		304:			# If-None-Match has the response's ETag
+		400: error
+		404: error		# file not found
+		"""
+		parameter, z, x, y = int(parameter), int(z), int(x), int(y)
+		
+		try:
+			assert parameter > 0
+			assert z <= settings.HONEYCOMB_TILES_MAX_ZOOM
+			assert x < 2 ** z and y < 2 ** z
+		except AssertionError:
+			return JsonResponse({'error': 'Invalid tile.'}, status=400)
+		
+		file_id = request.GET.get('id')
+		
+		try:
+			assert file_id is None or 0 < len(file_id) < 200
+		except AssertionError:
+			return JsonResponse({'error': 'Invalid id.'}, status=400)
+		
+		
+		if file_id is None:
+			store = get_tile_store()
+			tile = None if store is None else store.get(method, parameter, z, x, y)
+			
+			if tile is not None:
+				etag = make_etag(
+					get_map_version(), 'tile', method, parameter, z, x, y, tile.tolist()
+				)
+				
+				if is_not_modified(request, etag):
+					response = make_not_modified(etag)
+				else:
+					response = add_etag(HttpResponse(
+						tile.astype('<f4').tobytes(), content_type=TEMPERATURES_TYPE
+					), etag)
+				
+				response['Cache-Control'] = settings.HONEYCOMB_TILES_CACHE_CONTROL
+				return response
+		
+		
+		if file_id is None:
+			index = get_index()
+			matrix, source = index.matrix, index.mtime
+		else:
+			matrix, source = WordMatrix(), file_id
+			
+			try:
+				matrix.load(file_id)
+			except ValueError:
+				return JsonResponse({
+					'error': 'The file has expired. Please re-upload.'
+				}, status=404)
+		
+		etag = make_etag(get_map_version(), 'tile', source, method, parameter, z, x, y)
+		
+		if is_not_modified(request, etag):
+			return make_not_modified(etag)
+		
+		tile = calculate_tile(
+			matrix, method, parameter, z, x, y, settings.HONEYCOMB_TILE_SIZE
+		)
+		
+		response = HttpResponse(
+			tile.astype('<f4').tobytes(), content_type=TEMPERATURES_TYPE
+		)
+		return add_etag(response, etag)
+
+
+
+class HoneycombStatsApiView(View):
+	
+	def get(self, request):
+		"""
+		Returns the counters of the serving process' honeycomb caches, meant
+		for monitoring. The sizes are in bytes: max_size is the respective
+		HONEYCOMB_CACHE_BYTES, WORD_MATRIX_CACHE_SIZE, or MAP_CACHE_SIZE
+		setting.
+		
+		200:
+			cells: {entries, size, max_size, hits, misses, evictions}
+			matrices: {entries, size, max_size, hits, misses, evictions}
+			candidates: {entries, size, max_size, hits, misses, evictions}
+		"""
+		return JsonResponse({
+			'cells': cell_cache.get_stats(),
+			'matrices': matrix_cache.get_stats(),
+			'candidates': get_map().candidates.get_stats()
+		}, status=200)
+
+
+
@@ -1,10 +1,11 @@
 from django.http import JsonResponse
 from django.views.generic.base import View
 
-from app.ling.map import MapError
+from app.ling.map import MapError, get_map_version
 from app.ling.point import Point
 from app.ling.word_matrix import WordMatrix
 
+from utils.http import add_etag, is_not_modified, make_etag, make_not_modified
 from utils.json import read_json
 
 
@@ -27,6 +28,7 @@ class PointApiView(View):
 			d, 			# {} of (global, real)
 			p 			# pearson coefficient (the swadeshness)
 		
+		304: 			# If-None-Match has the response's ETag
 		400: error
 		404: error 		# word matrix not found
 		"""
@@ -45,6 +47,11 @@ class PointApiView(View):
 				'error': 'The file has expired. Please re-upload.'
 			}, status=404)
 		
+		etag = make_etag(get_map_version(), post)
+		
+		if is_not_modified(request, etag):
+			return make_not_modified(etag)
+		
 		
 		point = Point(post['latitude'], post['longitude'])
 		
@@ -55,7 +62,7 @@ class PointApiView(View):
 			except MapError as error:
 				return JsonResponse({'error': str(error)}, status=400)
 			
-			return JsonResponse({'d': d, 'p': p}, status=200)
+			response = JsonResponse({'d': d, 'p': p}, status=200)
 		
 		else:
 			try:
@@ -63,9 +70,11 @@ class PointApiView(View):
 			except MapError as error:
 				return JsonResponse({'error': str(error)}, status=400)
 			
-			return JsonResponse({
+			response = JsonResponse({
 				'origin': origin, 'd': d, 'p': p
 			}, status=200)
+		
+		return add_etag(response, etag)
 	
 	
 	def validate_post(self, request_body):
@@ -88,6 +88,112 @@ LOGGING = {
 }
 
 
+"""
+Word matrices
+Uploaded .tsv files are parsed chunk by chunk as these arrive, the ones bigger
+than Django's FILE_UPLOAD_MAX_MEMORY_SIZE being spooled to disk first; files
+bigger than that many bytes are rejected.
+"""
+WORD_MATRIX_MAX_UPLOAD_SIZE = 64 * 1024 * 1024
+
+"""
+The matrices are held dense, 8 bytes per pair of languages, so files with
+more than that many languages are rejected.
+"""
+WORD_MATRIX_MAX_LANGUAGES = 4000
+
+"""
+The word matrices are stored in the Django cache unless a directory is given
+here, in which case these are stored there as files (which do not expire).
+The files are memory-mapped, so the worker processes on a host share them.
+"""
+WORD_MATRIX_ROOT = None
+
+"""
+The word matrices are stored in a binary format, optionally compressed with
+'zlib' or 'lzma'; compression saves space at the cost of decompressing the
+matrix on each load (into memory which the processes do not share).
+"""
+WORD_MATRIX_COMPRESSION = None
+
+"""
+Each worker process keeps up to that many bytes of decoded word matrices.
+"""
+WORD_MATRIX_CACHE_SIZE = 256 * 1024 * 1024
+
+"""
+The point and honeycomb responses carry ETags derived from the word matrix'
+content hash, the version of the languages' locations, and the parameters;
+as the locations may change, clients and proxies should revalidate.
+"""
+API_CACHE_CONTROL = 'public, no-cache'
+
+
+"""
+Map
+Each worker process keeps up to that many bytes of language lookups (the
+languages within a radius or nearest to a point), which do not depend on the
+word matrix and are shared by all the requests until the language locations
+change; the points' coords are rounded to that many decimal places.
+"""
+MAP_CACHE_SIZE = 64 * 1024 * 1024
+MAP_CACHE_PRECISION = 4
+
+
+"""
+Honeycomb
+The cells of a honeycomb request are calculated by a pool of that many forked
+processes, in chunks of (at most) that many cells; 1 means no pool.
+"""
+HONEYCOMB_WORKERS = 1
+HONEYCOMB_CHUNK_SIZE = 500
+
+"""
+Each worker process keeps up to that many bytes of calculated cells (about
+a third of a kilobyte each), so that these are not recalculated when the map
+is panned or zoomed; the cells' coords are rounded to that many decimal
+places.
+"""
+HONEYCOMB_CACHE_BYTES = 64 * 1024 * 1024
+HONEYCOMB_CACHE_PRECISION = 4
+
+"""
+Honeycombs can also be calculated as jobs, run in that many background threads
+of the process which accepts them, in batches of that many cells; the jobs'
+states and batches are kept in the cache for that many seconds after these
+are stored, which should exceed the jobs' running time. With more than one
+worker process, the cache must be shared by these for the jobs to be polled.
+"""
+HONEYCOMB_JOB_WORKERS = 2
+HONEYCOMB_JOB_BATCH_SIZE = 250
+HONEYCOMB_JOB_TIMEOUT = 600
+
+"""
+Honeycombs requested as application/x-ndjson are streamed in batches of that
+many cells, from the centre of the viewport outward.
+"""
+HONEYCOMB_STREAM_BATCH_SIZE = 100
+
+"""
+Honeycombs requested as grid specs, the cells of which the server generates,
+can have up to that many cells.
+"""
+HONEYCOMB_MAX_GRID_CELLS = 100000
+
+"""
+Honeycombs are also served as XYZ tiles of that many × that many samples, up
+to that zoom level. The tiles of the built-in berg.tsv, as precomputed by the
+precompute_tiles command up to that zoom level, are kept in that directory
+(None to always calculate the tiles) and are served with that Cache-Control
+header.
+"""
+HONEYCOMB_TILE_SIZE = 16
+HONEYCOMB_TILES_MAX_ZOOM = 18
+HONEYCOMB_TILES_MAX_PRECOMPUTE_ZOOM = 8
+HONEYCOMB_TILES_ROOT = os.path.join(BASE_DIR, 'tiles')
+HONEYCOMB_TILES_CACHE_CONTROL = 'public, max-age=86400'
+
+
 """
 Local settings
 """
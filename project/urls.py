@@ -6,8 +6,11 @@ from app.views.landing import LandingView
 
 from app.views.file_api import FileApiView
 from app.views.point_api import PointApiView
-from app.views.honeycomb_api import HoneycombApiView
-from app.views.distances_api import DistancesApiView
+from app.views.honeycomb_api import (
+	HoneycombApiView, HoneycombJobApiView, HoneycombJobsApiView, HoneycombStatsApiView,
+	HoneycombTileApiView
+)
+from app.views.distances_api import DistancesApiView, DistancesBatchApiView
 
 import utils.js_tests.urls
 
@@ -15,10 +18,18 @@ import utils.js_tests.urls
 
 urlpatterns = [
 	url(r'^admin/', include(admin.site.urls)),
+	url(r'^api/distances/$', DistancesBatchApiView.as_view(), name='distances_batch_api'),
 	url(r'^api/distances/([\w]+)/$', DistancesApiView.as_view(), name='distances_api'),
 	url(r'^api/file/$', FileApiView.as_view(), name='file_api'),
 	url(r'^api/point/$', PointApiView.as_view(), name='point_api'),
 	url(r'^api/honeycomb/$', HoneycombApiView.as_view(), name='honeycomb_api'),
+	url(r'^api/honeycomb/jobs/$', HoneycombJobsApiView.as_view(), name='honeycomb_jobs_api'),
+	url(r'^api/honeycomb/jobs/([0-9a-f]+)/$', HoneycombJobApiView.as_view(), name='honeycomb_job_api'),
+	url(r'^api/honeycomb/stats/$', HoneycombStatsApiView.as_view(), name='honeycomb_stats_api'),
+	url(
+		r'^api/honeycomb/tiles/(circle|neighbourhood)/(\d{1,6})/(\d{1,2})/(\d{1,7})/(\d{1,7})/$',
+		HoneycombTileApiView.as_view(), name='honeycomb_tile_api'
+	),
 	url(r'^$', LandingView.as_view(), name='landing'),
 ]
 
@@ -55,6 +55,58 @@ var app = (function() {
 				}
 			}
 			return cookieValue;
+		},
+		
+		/**
+		 * POSTs the data given, remembering the ETags of the responses so that
+		 * repeating a request is answered with a 304 instead of the response.
+		 * Returns a promise which resolves with the response's data.
+		 * 
+		 * @param The URL.
+		 * @param The request body (string).
+		 */
+		post: function(url, data) {
+			var key = url + '\n' + data;
+			var cached = etags.get(key);
+			
+			return $.ajax({
+				url: url,
+				type: 'POST',
+				data: data,
+				headers: cached ? {'If-None-Match': cached.etag} : {}
+			})
+			.then(function(response, status, xhr) {
+				if(xhr.status == 304 && cached) {
+					return cached.data;
+				}
+				var etag = xhr.getResponseHeader('ETag');
+				if(etag) {
+					etags.set(key, {etag: etag, data: response});
+				}
+				return response;
+			});
+		}
+	};
+	
+	
+	/**
+	 * The ETags and data of the latest responses, keyed by request.
+	 */
+	var etags = {
+		size: 20,
+		keys: [],
+		items: {},
+		get: function(key) {
+			return etags.items.hasOwnProperty(key) ? etags.items[key] : null;
+		},
+		set: function(key, item) {
+			if(!etags.items.hasOwnProperty(key)) {
+				etags.keys.push(key);
+			}
+			etags.items[key] = item;
+			while(etags.keys.length > etags.size) {
+				delete etags.items[etags.keys.shift()];
+			}
 		}
 	};
 	
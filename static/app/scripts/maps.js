@@ -84,7 +84,8 @@ app.maps = (function() {
 		self.clicked = new signals.Signal();
 		
 		self.map.on('click', function(e) {
-			self.clicked.dispatch(e.latlng.lat, e.latlng.lng);
+			var latLng = e.latlng.wrap();
+			self.clicked.dispatch(latLng.lat, latLng.lng);
 		});
 		
 		/**
@@ -502,7 +503,7 @@ app.maps = (function() {
 				while(true) {
 					self.cells.push([x, y]);
 					
-					latLng = self.map.containerPointToLatLng([x, y]);
+					latLng = self.map.containerPointToLatLng([x, y]).wrap();
 					coords.push([latLng.lat, latLng.lng]);
 					
 					x += 3*a;
@@ -518,8 +519,24 @@ app.maps = (function() {
 				}
 			}
 			
+			/**
+			 * The server can generate the very same cells out of the grid spec.
+			 * The corner's longitude is wrapped; its latitude is left as is,
+			 * even if beyond the map's edge, so that the rows stay in place.
+			 */
+			var northWest = self.map.containerPointToLatLng([0, 0]).wrap();
+			var grid = {
+				north: northWest.lat,
+				west: northWest.lng,
+				zoom: self.map.getZoom(),
+				width: self.canvas.width,
+				height: self.canvas.height,
+				side: a,
+				orientation: 'flat'
+			};
+			
 			if(self.changedViewport) {
-				self.changedViewport.dispatch(coords);
+				self.changedViewport.dispatch(coords, grid);
 			}
 		},
 		
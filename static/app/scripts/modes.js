@@ -94,7 +94,7 @@ app.modes = (function() {
 		
 		self.clearMap();
 		
-		$.post('/api/point/', JSON.stringify({
+		app.utils.post('/api/point/', JSON.stringify({
 			id: self.fileId,
 			latitude: latitude,
 			longitude: longitude,
@@ -300,6 +300,13 @@ app.modes = (function() {
 		 */
 		self.lastCells = null;
 		
+		/**
+		 * The id of the currently running honeycomb job, if any, and how often
+		 * (ms) it is polled.
+		 */
+		self.jobId = null;
+		self.pollInterval = 250;
+		
 		/**
 		 * Fired upon receiving 404 from the server.
 		 */
@@ -323,34 +330,40 @@ app.modes = (function() {
 	
 	/**
 	 * Handles changing the viewport in honeycomb mode.
+	 * The honeycomb is calculated as a job which is polled for the finished
+	 * cells; the cells yet to come are drawn as neutral. The job of the
+	 * previous viewport, if still running, is cancelled.
+	 * 
+	 * If the grid spec is given, it is sent instead of the cells.
 	 * 
 	 * @param [] of [latitude, longitude].
+	 * @param {north, west, zoom, width, height, side, orientation}.
 	 */
-	HoneycombMode.prototype.changeViewport = function(cells) {
+	HoneycombMode.prototype.changeViewport = function(cells, grid) {
 		var self = this;
 		
 		var message = app.messages.info('Loading honeycomb&hellip;');
 		
+		self.cancelJob();
+		
 		self.firstCell = cells[0];
 		self.lastCells = cells;
+		self.lastGrid = grid;
 		
 		var method = self.methodSelect.get();
 		var parameter = self.parameterInput.get();
 		
-		$.post('/api/honeycomb/', JSON.stringify({
-			id: self.fileId,
-			cells: cells,
-			method: method,
-			parameter: parameter
-		}))
-		.done(function(data) {
-			var cells = data.cells;
-			if(self.firstCell[0] == cells[0][0] && self.firstCell[1] == cells[0][1]) {
-				self.map.updateHoneycomb(cells);
-			}
+		var firstCell = self.firstCell;
+		var finished = [];
+		
+		var isCurrent = function() {
+			return self.firstCell === firstCell;
+		};
+		
+		var fail = function(xhr) {
 			message.remove();
-		})
-		.fail(function(xhr) {
+			if(!isCurrent()) return;
+			
 			var error = "Could not connect to server!";
 			try {
 				error = xhr.responseJSON.error;
@@ -360,7 +373,70 @@ app.modes = (function() {
 			if(xhr.status == 404) {
 				self.received404.dispatch();
 			}
-		});
+		};
+		
+		var poll = function(jobId) {
+			$.get('/api/honeycomb/jobs/'+ jobId +'/', {since: finished.length})
+			.done(function(data) {
+				if(!isCurrent()) {
+					message.remove();
+					return;
+				}
+				
+				finished = finished.concat(data.cells);
+				self.map.updateHoneycomb(finished.concat(
+					cells.slice(finished.length).map(function(cell) {
+						return [cell[0], cell[1], 0];
+					})
+				));
+				
+				if(data.status == 'running') {
+					setTimeout(function() { poll(jobId); }, self.pollInterval);
+				}
+				else {
+					self.jobId = null;
+					message.remove();
+				}
+			})
+			.fail(fail);
+		};
+		
+		var post = {
+			id: self.fileId,
+			method: method,
+			parameter: parameter
+		};
+		
+		if(grid) {
+			post.grid = grid;
+		}
+		else {
+			post.cells = cells;
+		}
+		
+		$.post('/api/honeycomb/jobs/', JSON.stringify(post))
+		.done(function(data) {
+			if(!isCurrent()) {
+				$.ajax({url: '/api/honeycomb/jobs/'+ data.id +'/', type: 'DELETE'});
+				message.remove();
+				return;
+			}
+			self.jobId = data.id;
+			poll(data.id);
+		})
+		.fail(fail);
+	};
+	
+	/**
+	 * Cancels the currently running honeycomb job, if any.
+	 */
+	HoneycombMode.prototype.cancelJob = function() {
+		var self = this;
+		
+		if(self.jobId) {
+			$.ajax({url: '/api/honeycomb/jobs/'+ self.jobId +'/', type: 'DELETE'});
+			self.jobId = null;
+		}
 	};
 	
 	/**
@@ -376,6 +452,8 @@ app.modes = (function() {
 	 */
 	HoneycombMode.prototype.unbind = function() {
 		var self = this;
+		self.cancelJob();
+		self.firstCell = [null, null];
 		self.received404.removeAll();
 		self.map.changedViewport.removeAll();
 		self.clearMap();
@@ -387,7 +465,7 @@ app.modes = (function() {
 	HoneycombMode.prototype.update = function() {
 		var self = this;
 		if(self.lastCells) {
-			self.changeViewport(self.lastCells);
+			self.changeViewport(self.lastCells, self.lastGrid);
 		}
 	};
 	
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+import hashlib
+import json
+
+
+def make_etag(*parts):
+	"""
+	Returns a strong (quoted) ETag derived from the JSON-serialisable parts.
+	"""
+	content = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+	return quote_etag(hashlib.sha256(content.encode('utf-8')).hexdigest()[:32])
+
+
+def is_not_modified(request, etag):
+	"""
+	Tells whether the request's If-None-Match header matches the ETag.
+	As RFC 7232 says, the comparison is weak.
+	
+	The point and honeycomb APIs answer POST requests with 304 as well, which
+	RFC 7232 (section 3.2) reserves for GET and HEAD, asking for 412 instead:
+	these POSTs are queries, which change nothing and only do not fit into a
+	URL, so a matching tag means that the client already has the response.
+	The views check the tag once the word matrix is known to exist, so that
+	an expired matrix gets a 404 whatever the tag.
+	"""
+	header = request.META.get('HTTP_IF_NONE_MATCH')
+	if not header:
+		return False
+	
+	etags = parse_etags(header)
+	return '*' in etags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+
+def make_not_modified(etag):
+	"""
+	Returns the 304 response for the ETag.
+	"""
+	return add_etag(HttpResponseNotModified(), etag)
+
+
+def add_etag(response, etag):
+	"""
+	Sets the response's ETag and Cache-Control headers; returns the response.
+	"""
+	response['ETag'] = etag
+	response['Cache-Control'] = settings.API_CACHE_CONTROL
+	return response
+
+
+
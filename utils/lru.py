@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+import threading
+import time
+
+
+
+class LruCache:
+	"""
+	Thread-safe in-process least-recently-used cache.
+	The cache holds at most max_size units, where the size of an entry is given
+	by the get_size function (1 per entry by default). The entries can also
+	expire after ttl seconds. The hits, misses, and evictions are counted.
+	"""
+	
+	def __init__(self, max_size, get_size=None, ttl=None):
+		"""
+		Constructor.
+		"""
+		self.max_size = max_size
+		self.get_size = get_size
+		self.ttl = ttl
+		
+		self.data = OrderedDict()  # key: (value, size, expiry time)
+		self.size = 0
+		
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		
+		self.lock = threading.Lock()
+	
+	
+	def get(self, key, default=None):
+		"""
+		Returns the value stored under the key or the default if there is no
+		such value or if the latter has expired.
+		"""
+		with self.lock:
+			try:
+				value, size, expires = self.data[key]
+			except KeyError:
+				self.misses += 1
+				return default
+			
+			if expires is not None and expires <= time.time():
+				self._delete(key)
+				self.misses += 1
+				return default
+			
+			self.data.move_to_end(key)
+			self.hits += 1
+			
+			return value
+	
+	
+	def set(self, key, value, ttl=None):
+		"""
+		Stores the value under the key, evicting the least recently used
+		entries if needed. The ttl, if given, overrides the default one.
+		Values bigger than the whole cache are not stored.
+		"""
+		size = self.get_size(value) if self.get_size else 1
+		
+		if ttl is None:
+			ttl = self.ttl
+		expires = None if ttl is None else time.time() + ttl
+		
+		with self.lock:
+			if key in self.data:
+				self._delete(key)
+			
+			if size > self.max_size:
+				return
+			
+			self.data[key] = (value, size, expires)
+			self.size += size
+			
+			while self.size > self.max_size:
+				self._delete(next(iter(self.data)))
+				self.evictions += 1
+	
+	
+	def delete(self, key):
+		"""
+		Removes the key from the cache, if it is there.
+		"""
+		with self.lock:
+			if key in self.data:
+				self._delete(key)
+	
+	
+	def clear(self):
+		"""
+		Removes everything; the counters are kept.
+		"""
+		with self.lock:
+			self.data.clear()
+			self.size = 0
+	
+	
+	def get_stats(self):
+		"""
+		Returns the cache's counters as a dict.
+		"""
+		with self.lock:
+			return {
+				'entries': len(self.data),
+				'size': self.size,
+				'max_size': self.max_size,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions
+			}
+	
+	
+	def _delete(self, key):
+		"""
+		Removes the key from the cache. The lock must be held.
+		"""
+		value, size, expires = self.data.pop(key)
+		self.size -= size
+	
+	
+	def __contains__(self, key):
+		"""
+		Tells whether the key is in the cache, without counting a hit or a miss
+		and without marking it as recently used.
+		"""
+		with self.lock:
+			try:
+				value, size, expires = self.data[key]
+			except KeyError:
+				return False
+			
+			return expires is None or expires > time.time()
+	
+	
+	def __len__(self):
+		return len(self.data)
+
+
+
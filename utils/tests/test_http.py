@@ -0,0 +1,46 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from utils.http import add_etag, is_not_modified, make_etag, make_not_modified
+
+
+
+class HttpTestCase(TestCase):
+	def test_make_etag(self):
+		etag = make_etag('a', {'b': 1, 'c': [2, 3]})
+		self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+		self.assertEqual(etag, make_etag('a', {'c': [2, 3], 'b': 1}))
+		self.assertNotEqual(etag, make_etag('a', {'b': 1, 'c': [3, 2]}))
+	
+	
+	def test_is_not_modified(self):
+		factory = RequestFactory()
+		etag = make_etag(42)
+		
+		self.assertFalse(is_not_modified(factory.get('/'), etag))
+		
+		for header, result in [
+			(etag, True),
+			('"x", ' + etag, True),
+			('W/' + etag, True),
+			('*', True),
+			('"x"', False),
+			(etag[1:-1], False),
+		]:
+			request = factory.get('/', HTTP_IF_NONE_MATCH=header)
+			self.assertEqual(is_not_modified(request, etag), result)
+	
+	
+	def test_responses(self):
+		etag = make_etag(42)
+		
+		response = make_not_modified(etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+		
+		response = add_etag(HttpResponse('42'), etag)
+		self.assertEqual(response['ETag'], etag)
+		self.assertIn('Cache-Control', response)
+
+
+
@@ -0,0 +1,76 @@
+from django.test import TestCase
+
+from utils.lru import LruCache
+
+
+
+class LruCacheTestCase(TestCase):
+	def test_get_and_set(self):
+		cache = LruCache(2)
+		self.assertIsNone(cache.get('a'))
+		self.assertEqual(cache.get('a', 42), 42)
+		
+		cache.set('a', 1)
+		cache.set('b', 2)
+		self.assertEqual(cache.get('a'), 1)
+		self.assertEqual(cache.get('b'), 2)
+		self.assertEqual(len(cache), 2)
+		
+		cache.set('b', 3)
+		self.assertEqual(cache.get('b'), 3)
+		self.assertEqual(len(cache), 2)
+		
+		cache.delete('b')
+		self.assertNotIn('b', cache)
+		
+		cache.clear()
+		self.assertEqual(len(cache), 0)
+	
+	def test_eviction(self):
+		cache = LruCache(2)
+		cache.set('a', 1)
+		cache.set('b', 2)
+		cache.get('a')
+		cache.set('c', 3)
+		
+		self.assertIn('a', cache)
+		self.assertNotIn('b', cache)
+		self.assertIn('c', cache)
+	
+	def test_size_awareness(self):
+		cache = LruCache(10, get_size=len)
+		cache.set('a', 'x' * 4)
+		cache.set('b', 'x' * 4)
+		cache.set('c', 'x' * 4)
+		
+		self.assertNotIn('a', cache)
+		self.assertEqual(cache.size, 8)
+		
+		cache.set('d', 'x' * 11)
+		self.assertNotIn('d', cache)
+		self.assertEqual(cache.size, 8)
+	
+	def test_ttl(self):
+		cache = LruCache(10, ttl=60)
+		cache.set('a', 1)
+		cache.set('b', 2, ttl=-1)
+		
+		self.assertEqual(cache.get('a'), 1)
+		self.assertNotIn('b', cache)
+		self.assertIsNone(cache.get('b'))
+		self.assertEqual(len(cache), 1)
+	
+	def test_stats(self):
+		cache = LruCache(1)
+		cache.set('a', 1)
+		cache.get('a')
+		cache.get('b')
+		cache.set('b', 2)
+		
+		self.assertEqual(cache.get_stats(), {
+			'entries': 1, 'size': 1, 'max_size': 1,
+			'hits': 1, 'misses': 1, 'evictions': 1
+		})
+
+
+